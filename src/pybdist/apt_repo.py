@@ -0,0 +1,252 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Keeps a local flat apt repository up to date, without dpkg-scanpackages.
+
+APT_REPO in setup.py is the repository's directory, --dist copies the new
+.deb files into its pool/ and rewrites Packages, Packages.gz and Release:
+
+  APT_REPO = '/srv/apt/myshop'
+  # sources.list: deb [trusted=yes] file:/srv/apt/myshop ./
+
+The control stanza and checksums of every .deb are cached in
+.pybdist-cache.json in the repository, keyed by the file's mtime and size,
+so only the new or changed .deb files are opened.  An older file with the
+same package, version and architecture is dropped from the index.
+
+  python -m pybdist.apt_repo <repo dir> [file.deb ...]
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+__author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+
+POOL_DIR = 'pool'
+CACHE_FILE = '.pybdist-cache.json'
+LOCK_FILE = '.pybdist-lock'
+HASHES = [('MD5sum', 'md5'), ('SHA1', 'sha1'), ('SHA256', 'sha256')]
+RELEASE_HASHES = [('MD5Sum', 'md5'), ('SHA1', 'sha1'), ('SHA256', 'sha256')]
+
+
+class AptRepoException(Exception):
+  pass
+
+
+def hash_file(fname):
+  """Returns {algorithm: hexdigest} of HASHES, reading the file once."""
+  hashers = [(algo, hashlib.new(algo)) for _, algo in HASHES]
+  with open(fname, 'rb') as fin:
+    for block in iter(lambda: fin.read(1 << 20), b''):
+      for _, hasher in hashers:
+        hasher.update(block)
+  return dict((algo, hasher.hexdigest()) for algo, hasher in hashers)
+
+
+def control_text(deb):
+  """Returns the DEBIAN/control of `deb`, without the trailing newline."""
+  from . import deb_native
+  for name, data in deb_native.read_ar(deb, 'control.tar').items():
+    with deb_native.open_member_tar(name, data) as tar:
+      for info in tar:
+        if info.name in ('control', './control'):
+          text = tar.extractfile(info).read().decode('utf-8')
+          return text.strip('\n')
+  raise AptRepoException('No control file in %r' % deb)
+
+
+def _fields(control):
+  from . import deb_native
+  return deb_native._parse_stanzas(control.splitlines())[0]
+
+
+def _version_key(version):
+  return [int(part) if part.isdigit() else part
+          for part in re.split(r'(\d+)', version)]
+
+
+class AptRepo(object):
+  """A flat repository: pool/*.deb and the indexes at the top."""
+
+  def __init__(self, repo_dir):
+    self.repo_dir = repo_dir
+    self.pool_dir = os.path.join(repo_dir, POOL_DIR)
+    self.cache_file = os.path.join(repo_dir, CACHE_FILE)
+    # pool/<name> -> [mtime_ns, size, control, {algorithm: hexdigest}]
+    self.entries = {}
+    self.opened = 0
+
+  def load(self):
+    if os.path.exists(self.cache_file):
+      try:
+        with open(self.cache_file) as fin:
+          self.entries = json.load(fin)
+      except ValueError:
+        self.entries = {}
+
+  def _write(self, name, data):
+    fname = os.path.join(self.repo_dir, name)
+    with open(fname + '.tmp', 'wb') as fout:
+      fout.write(data)
+    os.rename(fname + '.tmp', fname)
+
+  def save(self):
+    self._write(CACHE_FILE, json.dumps(self.entries).encode('utf-8'))
+
+  def _index(self, relname, stat):
+    fname = os.path.join(self.repo_dir, relname)
+    self.entries[relname] = [stat.st_mtime_ns, stat.st_size,
+                             control_text(fname), hash_file(fname)]
+    self.opened += 1
+
+  def add(self, deb):
+    """Copy `deb` into the pool, replacing a file of the same name."""
+    from . import staging
+    relname = POOL_DIR + '/' + os.path.basename(deb)
+    dest = os.path.join(self.repo_dir, relname)
+    staging.copy_file(deb, dest + '.tmp')
+    os.rename(dest + '.tmp', dest)
+    self._index(relname, os.stat(dest))
+    return relname
+
+  def refresh(self, added=()):
+    """Sync the entries with pool/, only opening new or changed files."""
+    found = set(added)
+    with os.scandir(self.pool_dir) as entries:
+      for dir_entry in entries:
+        if not dir_entry.name.endswith('.deb') or not dir_entry.is_file():
+          continue
+        relname = POOL_DIR + '/' + dir_entry.name
+        found.add(relname)
+        if relname in added:
+          continue
+        stat = dir_entry.stat()
+        old = self.entries.get(relname)
+        if not old or old[0] != stat.st_mtime_ns or old[1] != stat.st_size:
+          self._index(relname, stat)
+    for relname in list(self.entries):
+      if relname not in found:
+        del self.entries[relname]
+
+  def _current(self, added=()):
+    """Returns the sorted [(relname, fields)] to list, newest file wins."""
+    latest = {}
+    for relname, (mtime, _, control, _) in self.entries.items():
+      fields = _fields(control)
+      key = (fields.get('Package'), fields.get('Version'),
+             fields.get('Architecture'))
+      rank = (relname in added, mtime)
+      if key not in latest or rank > latest[key][0]:
+        latest[key] = (rank, relname, fields)
+    return sorted(((relname, fields) for _, relname, fields in latest.values()),
+                  key=lambda item: (item[1].get('Package', ''),
+                                    _version_key(item[1].get('Version', '')),
+                                    item[0]))
+
+  def packages(self, added=()):
+    """Returns the text of the Packages index."""
+    stanzas = []
+    for relname, fields in self._current(added):
+      _, size, control, hashes = self.entries[relname]
+      lines = [control, 'Filename: %s' % relname, 'Size: %d' % size]
+      lines += ['%s: %s' % (field, hashes[algo]) for field, algo in HASHES]
+      stanzas.append('\n'.join(lines) + '\n')
+    return '\n'.join(stanzas)
+
+  def release(self, files):
+    """Returns the text of Release for the {name: bytes} index files."""
+    import email.utils
+    archs = set()
+    for _, fields in self._current():
+      archs.add(fields.get('Architecture', 'all'))
+    lines = ['Origin: %s' % os.path.basename(os.path.abspath(self.repo_dir)),
+             'Date: %s' % email.utils.formatdate(usegmt=True),
+             'Architectures: %s' % ' '.join(sorted(archs))]
+    for field, algo in RELEASE_HASHES:
+      lines.append('%s:' % field)
+      for name in sorted(files):
+        lines.append(' %s %16d %s' % (hashlib.new(algo, files[name]).hexdigest(),
+                                      len(files[name]), name))
+    return '\n'.join(lines) + '\n'
+
+  def write_indexes(self, added=()):
+    """Write Packages, Packages.gz and Release.
+    Returns:
+      False if Packages was already up to date.
+    """
+    text = self.packages(added).encode('utf-8')
+    packages = os.path.join(self.repo_dir, 'Packages')
+    if os.path.exists(packages) and os.path.exists(
+        os.path.join(self.repo_dir, 'Release')):
+      with open(packages, 'rb') as fin:
+        if fin.read() == text:
+          return False
+    files = {'Packages': text,
+             'Packages.gz': gzip.compress(text, 9, mtime=0)}
+    for name in sorted(files):
+      self._write(name, files[name])
+    self._write('Release', self.release(files).encode('utf-8'))
+    return True
+
+
+def _lock(repo_dir):
+  """Returns an open file holding the repository's lock, close to release."""
+  import fcntl
+  fout = open(os.path.join(repo_dir, LOCK_FILE), 'w')
+  fcntl.flock(fout, fcntl.LOCK_EX)
+  return fout
+
+
+def update(repo_dir, debs=()):
+  """Add `debs` to the repository at `repo_dir` and update its index.
+  Returns:
+    the pool names of the added files.
+  """
+  repo = AptRepo(repo_dir)
+  if not os.path.isdir(repo.pool_dir):
+    os.makedirs(repo.pool_dir)
+  lock = _lock(repo_dir)
+  try:
+    repo.load()
+    added = [repo.add(deb) for deb in debs]
+    repo.refresh(added)
+    changed = repo.write_indexes(added)
+    repo.save()
+  finally:
+    lock.close()
+  print('%s: added %s, read %d .deb files, index %s' % (
+      repo_dir, ', '.join(os.path.basename(name) for name in added) or 'none',
+      repo.opened, 'updated' if changed else 'unchanged'))
+  return added
+
+
+def main(argv=None):
+  argv = sys.argv[1:] if argv is None else argv
+  if not argv:
+    print('Usage: python -m pybdist.apt_repo <repo dir> [file.deb ...]')
+    return 2
+  update(argv[0], argv[1:])
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,149 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Stream of the files the build finishes, for --dist --upload.
+
+build_zip_tar and build_deb publish their files as soon as they're done
+(built or from the cache).  Each file then goes through the stages in
+order, ex. hashing then uploading, each stage in its own thread, so the
+tarball is uploading while the .deb is still being built.
+
+  stream = artifacts.start()
+  stream.add_stage('sha1', artifacts.add_sha1)
+  stream.add_stage('upload', upload_func)
+  ... run the build ...
+  stream.close()   # waits for the last file, raises a stage's failure
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+__author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
+
+import hashlib
+import os
+import queue
+import threading
+
+from . import timeline
+
+_DONE = None
+_stream = None
+
+
+class Artifact(object):
+  """A finished file, stages add what they learn about it."""
+
+  def __init__(self, fname):
+    self.fname = fname
+    self.name = os.path.basename(fname)
+    self.sha1 = None
+
+
+def add_sha1(artifact):
+  """Stage hashing the file once for every later stage."""
+  hasher = hashlib.sha1()
+  with open(artifact.fname, 'rb') as fin:
+    for block in iter(lambda: fin.read(1 << 20), b''):
+      hasher.update(block)
+  artifact.sha1 = hasher.hexdigest()
+  return artifact
+
+
+class ArtifactStream(object):
+  """Published files flowing through a chain of stage threads."""
+
+  def __init__(self):
+    self._stages = []
+    self._published = []
+    self._lock = threading.Lock()
+    self.failure = None
+    self.cancelled = False
+
+  def add_stage(self, name, func):
+    """func(artifact) returns the artifact for the next stage, or None."""
+    stage = dict(name=name, func=func, queue=queue.Queue())
+    stage['thread'] = threading.Thread(target=self._run_stage,
+                                       args=(len(self._stages), stage),
+                                       name='artifacts %s' % name)
+    stage['thread'].daemon = True
+    self._stages.append(stage)
+    stage['thread'].start()
+
+  def _run_stage(self, index, stage):
+    while True:
+      artifact = stage['queue'].get()
+      if artifact is _DONE:
+        break
+      if self.failure or self.cancelled:
+        continue
+      try:
+        with timeline.span('%s %s' % (stage['name'], artifact.name),
+                           'artifact'):
+          artifact = stage['func'](artifact)
+      except BaseException as err:
+        with self._lock:
+          if not self.failure:
+            self.failure = err
+        continue
+      if artifact is not None and index + 1 < len(self._stages):
+        self._stages[index + 1]['queue'].put(artifact)
+    if index + 1 < len(self._stages):
+      self._stages[index + 1]['queue'].put(_DONE)
+
+  def publish(self, fname):
+    """Send the finished file `fname` down the stages, once."""
+    with self._lock:
+      if fname in self._published:
+        return
+      self._published.append(fname)
+    if self._stages:
+      self._stages[0]['queue'].put(Artifact(fname))
+
+  @property
+  def published(self):
+    with self._lock:
+      return list(self._published)
+
+  def close(self, cancel=False):
+    """Wait for the stages to finish the published files.
+
+    With `cancel` the files not yet started are dropped.  Raises the
+    first exception a stage raised.
+    """
+    self.cancelled = cancel
+    if self._stages:
+      self._stages[0]['queue'].put(_DONE)
+      for stage in self._stages:
+        stage['thread'].join()
+    if self.failure:
+      raise self.failure
+
+
+def start():
+  """Start the stream that publish() sends to, see current()."""
+  global _stream
+  _stream = ArtifactStream()
+  return _stream
+
+
+def current():
+  """The running stream, or None."""
+  return _stream
+
+
+def stop():
+  global _stream
+  _stream = None
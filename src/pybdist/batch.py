@@ -0,0 +1,160 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Runs the same pybdist command over many projects.
+
+  python -m pybdist.batch [--jobs N] [--report FILE] dir... -- --dist
+
+Every directory holding a setup.py below the given directories is a
+project (a project's sub directories aren't searched).  The projects run
+in a pool of --jobs worker processes, each one running a project at a time
+like the pybdist server does, so the pybdist modules, the apt cache and
+the parsed .po files stay loaded from one project to the next.  All the
+projects share one build cache, --cache-dir or $PYBDIST_CACHE_DIR.
+
+Each project's output is printed once it's done, followed by a summary of
+all of them.  The exit code is 1 if any project failed.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+__author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
+
+import io
+import json
+import optparse
+import os
+import sys
+import time
+
+SKIP_DIRS = ['.git', '.hg', '.svn', '.pybdist', '.tox', 'build', 'dist',
+             'debian', 'node_modules', '__pycache__']
+
+
+class BatchException(Exception):
+  pass
+
+
+def find_projects(dirs):
+  """Returns the sorted directories below `dirs` that have a setup.py."""
+  ret = set()
+  for top in dirs:
+    if not os.path.isdir(top):
+      raise BatchException('%r is not a directory' % top)
+    for root, subdirs, files in os.walk(top):
+      if 'setup.py' in files:
+        ret.add(os.path.abspath(root))
+        subdirs[:] = []
+      else:
+        subdirs[:] = sorted(d for d in subdirs
+                            if d not in SKIP_DIRS and not d.startswith('.'))
+  return sorted(ret)
+
+
+def run_project(project_dir, argv):
+  """Run pybdist `argv` in `project_dir`, in a worker process.
+  Returns:
+    dict of project, exit, seconds and output
+  """
+  from . import server
+  out = io.StringIO()
+  start = time.time()
+  code = server.run_request(dict(cwd=project_dir, argv=argv), out)
+  return dict(project=project_dir, exit=code, seconds=time.time() - start,
+              output=out.getvalue())
+
+
+def run(projects, argv, jobs=1):
+  """Run `argv` in each project, at most `jobs` at a time.
+  Returns:
+    list of run_project() results, in the order they finished.
+  """
+  from concurrent import futures
+  results = []
+  with futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+    pending = [pool.submit(run_project, project, argv) for project in projects]
+    for future in futures.as_completed(pending):
+      result = future.result()
+      print('=== %s (%s, %.1fs)' % (result['project'],
+                                    _status(result), result['seconds']))
+      print(result['output'], end='')
+      sys.stdout.flush()
+      results.append(result)
+  return results
+
+
+def _status(result):
+  return 'ok' if result['exit'] == 0 else 'FAILED %s' % result['exit']
+
+
+def print_report(results, elapsed):
+  """Print one line per project and the totals."""
+  common = os.path.commonpath([r['project'] for r in results]) if results else ''
+  print()
+  print('%-40s %-10s %8s' % ('Project', 'Result', 'Seconds'))
+  for result in sorted(results, key=lambda r: r['project']):
+    name = os.path.relpath(result['project'], common) if len(results) > 1 \
+        else result['project']
+    print('%-40s %-10s %8.1f' % (name, _status(result), result['seconds']))
+  failed = sum(1 for result in results if result['exit'] != 0)
+  busy = sum(result['seconds'] for result in results)
+  print('%d projects, %d failed, %.1fs (%.1fs of work)' % (
+      len(results), failed, elapsed, busy))
+
+
+def main(argv=None):
+  argv = sys.argv[1:] if argv is None else argv
+  if '--' in argv:
+    index = argv.index('--')
+    argv, command = argv[:index], argv[index + 1:]
+  else:
+    command = []
+  parser = optparse.OptionParser(
+      usage='%prog [options] dir... -- <pybdist options, ex. --dist>')
+  parser.add_option('-j', '--jobs', dest='jobs', type='int',
+                    default=os.cpu_count() or 1,
+                    help='Projects to run at once, default %default.')
+  parser.add_option('--cache-dir', dest='cache_dir', metavar='DIR',
+                    help='Build cache shared by all projects.')
+  parser.add_option('--report', dest='report', metavar='FILE',
+                    help='Also write the results as json to FILE.')
+  options, dirs = parser.parse_args(argv)
+  if not command:
+    parser.error('No pybdist options after --')
+  cache_dir = options.cache_dir or os.environ.get('PYBDIST_CACHE_DIR')
+  if cache_dir:
+    os.environ['PYBDIST_CACHE_DIR'] = os.path.abspath(
+        os.path.expanduser(cache_dir))
+  try:
+    projects = find_projects(dirs or ['.'])
+  except BatchException as err:
+    parser.error(str(err))
+  if not projects:
+    print('No setup.py found in %s' % ', '.join(dirs or ['.']))
+    return 2
+  print('Running %s in %d projects, %d at a time' % (
+      ' '.join(command), len(projects), options.jobs))
+  start = time.time()
+  results = run(projects, command, options.jobs)
+  print_report(results, time.time() - start)
+  if options.report:
+    with open(options.report, 'w') as fout:
+      json.dump(dict(command=command, results=results), fout, indent=1)
+  return 1 if any(result['exit'] != 0 for result in results) else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
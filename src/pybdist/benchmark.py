@@ -0,0 +1,320 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmarks for the text parsers and file rewriters.
+
+Generates large RELEASE.rst, debian/changelog, atom feeds and source files
+and times the code that reads or rewrites them.  Also measures how long
+`import pybdist.pybdist` takes with -X importtime, which must stay under
+IMPORT_BUDGETS since every command pays for it.  Results are compared with
+the baselines file and the run fails if anything got slower than the
+tolerance allows.
+
+  python -m pybdist.benchmark              # compare with the baselines
+  python -m pybdist.benchmark --update     # store new baselines
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+__author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
+
+import json
+import optparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BASELINES_FILE = 'benchmark_baselines.json'
+# Fail when 50% slower than the baseline, timings on shared hosts are noisy.
+DEFAULT_TOLERANCE = 0.5
+DEFAULT_ENTRIES = 20000
+
+# Modules whose cumulative -X importtime is tracked, with a hard budget in
+# seconds that fails regardless of the baselines.
+IMPORT_BUDGETS = {
+  'pybdist.pybdist': 0.15,
+}
+
+BENCHMARKS = []
+
+
+def benchmark(name):
+  """Decorator to register a benchmark.
+
+  The decorated function is called as func(tmpdir, entries) and returns the
+  callable to time, so the inputs can be generated outside of the timing.
+  Benchmarks that change their inputs return (prepare, callable) instead,
+  prepare() rewrites the inputs untimed before each timed call so every
+  repeat does the same work.
+  """
+  def _register(func):
+    BENCHMARKS.append((name, func))
+    return func
+  return _register
+
+
+def make_release_rst(entries):
+  """Returns RELEASE.rst text with `entries` releases, newest first."""
+  lines = ['Release Notes', '=============', '']
+  for i in range(entries, 0, -1):
+    title = 'January 1st, 2010 v %d.%d.%d' % (i // 10000, i // 100 % 100, i % 100)
+    lines += [title, '-' * len(title),
+              '* Fixed bug number %d which was very annoying.' % i,
+              '* Added feature %d, now with more options.' % i, '']
+  return '\n'.join(lines) + '\n'
+
+
+def make_changelog(entries, name='pkg'):
+  """Returns debian/changelog text with `entries` versions, newest first."""
+  lines = []
+  for i in range(entries, 0, -1):
+    lines += ['%s (%d.%d.%d-1) unstable; urgency=low' % (
+                  name, i // 10000, i // 100 % 100, i % 100),
+              '',
+              '  * Fixed bug number %d which was very annoying.' % i,
+              '',
+              ' -- Some One <some@example.com>  Fri, 01 Jan 2010 12:00:00 +0000',
+              '']
+  return '\n'.join(lines) + '\n'
+
+
+def make_feed(entries, name='pkg'):
+  """Returns a code.google.com style atom feed of downloads."""
+  parts = ['<?xml version="1.0"?><feed>']
+  for i in range(entries):
+    fname = '%s-%d.%d.tar.gz' % (name, i // 100, i % 100)
+    parts.append(
+        '<entry><updated>2010-01-01T00:00:%02dZ</updated>'
+        '<title> %s </title>'
+        '<content type="html">Labels: Featured Type-Source OpSys-Linux '
+        '&lt;br/&gt;</content>'
+        '<link href="http://code.google.com/p/%s/downloads/detail?name=%s" />'
+        '</entry>' % (i % 60, fname, name, fname))
+  parts.append('</feed>')
+  return '\n'.join(parts)
+
+
+def make_source(entries):
+  """Returns python source with __version__ near the end."""
+  lines = ['x%d = %d' % (i, i) for i in range(entries * 5)]
+  lines.append("__version__ = '0.1'")
+  lines += ['y%d = %d' % (i, i) for i in range(10)]
+  return '\n'.join(lines) + '\n'
+
+
+def _write(tmpdir, fname, text):
+  fname = os.path.join(tmpdir, fname)
+  with open(fname, 'w') as fout:
+    fout.write(text)
+  return fname
+
+
+@benchmark('release.parse_last_release')
+def _bench_parse_last_release(tmpdir, entries):
+  from . import release
+  fname = _write(tmpdir, 'RELEASE.rst', make_release_rst(entries))
+  return lambda: release.parse_last_release(fname)
+
+
+@benchmark('release.parse_deb_changelog')
+def _bench_parse_deb_changelog(tmpdir, entries):
+  from . import release
+  fname = _write(tmpdir, 'changelog', make_changelog(entries))
+  return lambda: release.parse_deb_changelog(fname)
+
+
+@benchmark('googlecode_update.parse_download_list')
+def _bench_parse_download_list(unused_tmpdir, entries):
+  from . import googlecode_update
+  text = make_feed(entries // 10)
+  return lambda: googlecode_update.parse_download_list('pkg', text)
+
+
+@benchmark('update_file.update_lines')
+def _bench_update_lines(tmpdir, entries):
+  from . import update_file
+  text = make_source(entries)
+  fname = os.path.join(tmpdir, 'source.py')
+  return (lambda: _write(tmpdir, 'source.py', text),
+          lambda: update_file.update_lines(
+              fname, r'^__version__\s*=\s*["\']([^"\']+)["\']', '0.2'))
+
+
+@benchmark('update_file.insert_before')
+def _bench_insert_before(tmpdir, entries):
+  from . import update_file
+  changelog = make_changelog(entries)
+  fname = os.path.join(tmpdir, 'changelog')
+  text = make_changelog(1)
+  return (lambda: _write(tmpdir, 'changelog', changelog),
+          lambda: update_file.insert_before(fname, text, 6))
+
+
+@benchmark('pybdist._ver_lines_different')
+def _bench_ver_lines_different(unused_tmpdir, entries):
+  from . import pybdist
+  lines1 = ['  * Fixed bug number %d.' % i for i in range(entries * 5)]
+  lines2 = ['* Fixed bug number %d.  ' % i for i in range(entries * 5)]
+  return lambda: pybdist._ver_lines_different(lines1, lines2)
+
+
+def time_func(func, repeat, prepare=None):
+  """Returns the best of `repeat` timings of func(), in seconds.
+
+  prepare(), if given, runs untimed before each call.
+  """
+  best = None
+  for _ in range(repeat):
+    if prepare:
+      prepare()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    if best is None or elapsed < best:
+      best = elapsed
+  return best
+
+
+def import_time(module, repeat=5):
+  """Returns the best cumulative import time of `module` in a fresh python.
+
+  Uses the -X importtime output so interpreter startup isn't counted.
+  """
+  src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+  env = dict(os.environ)
+  env['PYTHONPATH'] = os.pathsep.join(
+      [src_dir] + [p for p in [env.get('PYTHONPATH')] if p])
+  re_line = re.compile(r'import time:\s*\d+ \|\s*(\d+) \| (\s*)(\S+)$')
+  best = None
+  for _ in range(repeat):
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+        stderr=subprocess.PIPE, env=env, universal_newlines=True, check=True)
+    for line in proc.stderr.splitlines():
+      grps = re_line.match(line)
+      if grps and grps.group(3) == module:
+        elapsed = int(grps.group(1)) / 1e6
+        if best is None or elapsed < best:
+          best = elapsed
+  return best
+
+
+def run_benchmarks(entries=DEFAULT_ENTRIES, repeat=5, names=None):
+  """Returns {name: best seconds}."""
+  results = {}
+  tmpdir = tempfile.mkdtemp(prefix='pybdist-bench')
+  try:
+    for name, func in BENCHMARKS:
+      if names and name not in names:
+        continue
+      timed = func(tmpdir, entries)
+      prepare = None
+      if isinstance(timed, tuple):
+        prepare, timed = timed
+      results[name] = time_func(timed, repeat, prepare)
+  finally:
+    shutil.rmtree(tmpdir, True)
+  for module in sorted(IMPORT_BUDGETS):
+    name = 'import %s' % module
+    if not names or name in names:
+      results[name] = import_time(module, repeat)
+  return results
+
+
+def over_budget(results):
+  """Returns list of imports slower than their IMPORT_BUDGETS entry."""
+  ret = []
+  for module, budget in sorted(IMPORT_BUDGETS.items()):
+    elapsed = results.get('import %s' % module)
+    if elapsed is not None and elapsed > budget:
+      print('** import %s took %.0fms, budget is %.0fms' % (
+          module, elapsed * 1000, budget * 1000))
+      ret.append('import %s' % module)
+  return ret
+
+
+def load_baselines(fname):
+  if not os.path.exists(fname):
+    return {}
+  with open(fname) as fin:
+    return json.load(fin)
+
+
+def save_baselines(fname, baselines):
+  with open(fname, 'w') as fout:
+    json.dump(baselines, fout, indent=2, sort_keys=True)
+    fout.write('\n')
+
+
+def compare(results, baselines, tolerance=DEFAULT_TOLERANCE):
+  """Print results against baselines.
+  Returns:
+    list of names that regressed.
+  """
+  regressed = []
+  print('%-40s %10s %10s %8s' % ('Benchmark', 'Base(ms)', 'Now(ms)', 'Change'))
+  for name in sorted(results):
+    now = results[name]
+    base = baselines.get(name)
+    if base:
+      change = (now - base) / base * 100
+      flag = ''
+      if now > base * (1 + tolerance):
+        flag = ' **'
+        regressed.append(name)
+      print('%-40s %10.2f %10.2f %+7.1f%%%s' % (
+          name, base * 1000, now * 1000, change, flag))
+    else:
+      print('%-40s %10s %10.2f' % (name, '-', now * 1000))
+  return regressed
+
+
+def main(argv=None):
+  parser = optparse.OptionParser()
+  parser.add_option('--baselines', dest='baselines', default=BASELINES_FILE,
+                    help='Baselines file, default %default')
+  parser.add_option('--update', dest='update', action='store_true',
+                    help='Store these timings as the new baselines.')
+  parser.add_option('--tolerance', dest='tolerance', type='float',
+                    default=DEFAULT_TOLERANCE,
+                    help='Allowed slow down, default %default')
+  parser.add_option('--entries', dest='entries', type='int',
+                    default=DEFAULT_ENTRIES,
+                    help='Number of releases to generate, default %default')
+  parser.add_option('--repeat', dest='repeat', type='int', default=5,
+                    help='Best of how many runs, default %default')
+  options, args = parser.parse_args(argv)
+  results = run_benchmarks(options.entries, options.repeat, args)
+  baselines = load_baselines(options.baselines)
+  regressed = compare(results, baselines, options.tolerance)
+  regressed += over_budget(results)
+  if options.update:
+    baselines.update(results)
+    save_baselines(options.baselines, baselines)
+    print('Saved baselines to %r' % options.baselines)
+  elif regressed:
+    print('** %d benchmark(s) regressed: %s' % (len(regressed),
+                                                ', '.join(regressed)))
+    return 1
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,265 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Content addressed cache of build targets.
+
+A target is fingerprinted by hashing the contents of its inputs (files or
+whole directories) plus any extra metadata.  When a target with the same
+fingerprint was built before, its outputs are left alone if they're still
+identical, or copied back from the cache directory otherwise.  Outputs
+can be globs, only the files the build wrote are stored, not older ones
+the globs also match.
+
+The cache lives in ~/.cache/pybdist unless BUILD_CACHE_DIR is set in
+setup.py and is trimmed, least recently used first, to BUILD_CACHE_SIZE
+bytes.  $PYBDIST_CACHE_DIR overrides both, so several projects (see
+batch.py) can share one cache.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+__author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
+
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+DEFAULT_CACHE_DIR = '~/.cache/pybdist'
+DEFAULT_CACHE_SIZE = 1024 * 1024 * 1024
+SKIP_DIRS = ['.svn', '.hg', '.git', '.ropeproject', '__pycache__']
+MANIFEST = 'manifest.json'
+
+class BuildCacheException(Exception):
+  pass
+
+
+def hash_file(fname, hasher=None):
+  """Returns the hex sha1 of the file's contents."""
+  if not hasher:
+    hasher = hashlib.sha1()
+  with open(fname, 'rb') as fin:
+    for chunk in iter(lambda: fin.read(1024 * 1024), b''):
+      hasher.update(chunk)
+  return hasher.hexdigest()
+
+
+def _input_files(path):
+  """Returns a sorted list of files for the file, dir or glob `path`."""
+  if os.path.isdir(path):
+    ret = []
+    for root, dirs, files in os.walk(path):
+      dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+      for fname in files:
+        if not fname.endswith('.pyc'):
+          ret.append(os.path.join(root, fname))
+    return sorted(ret)
+  if os.path.exists(path):
+    return [path]
+  return sorted(glob.glob(path))
+
+
+def _expand_outputs(outputs):
+  ret = []
+  for output in outputs:
+    if os.path.exists(output):
+      ret.append(output)
+    else:
+      ret += sorted(glob.glob(output))
+  return ret
+
+
+def _stat_outputs(outputs):
+  """Returns {fname: (mtime_ns, size)} of the files `outputs` match now."""
+  ret = {}
+  for fname in _expand_outputs(outputs):
+    stat = os.stat(fname)
+    ret[fname] = (stat.st_mtime_ns, stat.st_size)
+  return ret
+
+
+def _produced(outputs, before):
+  """Returns the files of `outputs` the build just wrote.
+
+  `before` is _stat_outputs() from before it ran.  Files named outright
+  always count, glob matches only if they're new or changed, not left over
+  from earlier builds.
+  """
+  ret = []
+  for output in outputs:
+    if os.path.exists(output):
+      fnames = [output]
+    else:
+      fnames = []
+      for fname in sorted(glob.glob(output)):
+        stat = os.stat(fname)
+        if before.get(fname) != (stat.st_mtime_ns, stat.st_size):
+          fnames.append(fname)
+    ret += [fname for fname in fnames if fname not in ret]
+  return ret
+
+
+class BuildCache(object):
+  """A directory of previously built outputs keyed by input fingerprint."""
+
+  def __init__(self, cache_dir=None, max_size=None):
+    self.cache_dir = os.path.expanduser(
+        os.environ.get('PYBDIST_CACHE_DIR') or cache_dir or DEFAULT_CACHE_DIR)
+    self.max_size = max_size or DEFAULT_CACHE_SIZE
+    self._lock = threading.Lock()
+
+  def fingerprint(self, name, inputs, extra=None):
+    """Hash the target name, the inputs' names and contents and `extra`."""
+    hasher = hashlib.sha1()
+    hasher.update(name.encode('utf-8'))
+    hasher.update(repr(extra).encode('utf-8'))
+    for path in inputs:
+      for fname in _input_files(path):
+        hasher.update(b'\0' + fname.encode('utf-8') + b'\0')
+        hash_file(fname, hasher)
+    return hasher.hexdigest()
+
+  def _entry_dir(self, key):
+    return os.path.join(self.cache_dir, key[:2], key)
+
+  def _read_manifest(self, key):
+    fname = os.path.join(self._entry_dir(key), MANIFEST)
+    if not os.path.exists(fname):
+      return None
+    with open(fname) as fin:
+      return json.load(fin)
+
+  def is_current(self, key):
+    """True if the cached outputs for `key` are already in place."""
+    manifest = self._read_manifest(key)
+    if manifest is None:
+      return False
+    for item in manifest:
+      if not os.path.exists(item['path']):
+        return False
+      if hash_file(item['path']) != item['sha1']:
+        return False
+    self._touch(key)
+    return True
+
+  def restore(self, key):
+    """Copy the outputs for `key` back in place, returns False on a miss."""
+    manifest = self._read_manifest(key)
+    if manifest is None:
+      return False
+    entry_dir = self._entry_dir(key)
+    for index, item in enumerate(manifest):
+      dirname = os.path.dirname(item['path'])
+      if dirname and not os.path.isdir(dirname):
+        os.makedirs(dirname, exist_ok=True)
+      try:
+        shutil.copy2(os.path.join(entry_dir, str(index)), item['path'])
+      except FileNotFoundError:
+        return False  # Evicted by another process meanwhile.
+    self._touch(key)
+    return True
+
+  def store(self, key, outputs):
+    """Copy the `outputs` (files or globs) into the cache under `key`."""
+    manifest = []
+    tmpdir = tempfile.mkdtemp(prefix='.tmp', dir=self._ensure_dir())
+    for index, fname in enumerate(_expand_outputs(outputs)):
+      shutil.copy2(fname, os.path.join(tmpdir, str(index)))
+      manifest.append(dict(path=fname, sha1=hash_file(fname)))
+    with open(os.path.join(tmpdir, MANIFEST), 'w') as fout:
+      json.dump(manifest, fout, indent=1)
+    entry_dir = self._entry_dir(key)
+    os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+    try:
+      os.rename(tmpdir, entry_dir)
+    except OSError:
+      if self._read_manifest(key) is not None:
+        # Another process sharing the cache stored the same key, it may be
+        # restoring from it right now, keep it.
+        shutil.rmtree(tmpdir, True)
+      else:
+        # Left half evicted, move it aside in one step before replacing it.
+        trash = tempfile.mkdtemp(prefix='.tmp', dir=self.cache_dir)
+        try:
+          os.rename(entry_dir, os.path.join(trash, key))
+          os.rename(tmpdir, entry_dir)
+        except OSError:
+          shutil.rmtree(tmpdir, True)
+        shutil.rmtree(trash, True)
+    self.evict()
+
+  def _ensure_dir(self):
+    if not os.path.isdir(self.cache_dir):
+      os.makedirs(self.cache_dir, exist_ok=True)
+    return self.cache_dir
+
+  def _touch(self, key):
+    os.utime(os.path.join(self._entry_dir(key), MANIFEST))
+
+  def _entries(self):
+    """Returns list of (last_used, size, entry_dir)."""
+    ret = []
+    if not os.path.isdir(self.cache_dir):
+      return ret
+    for prefix in os.listdir(self.cache_dir):
+      prefix_dir = os.path.join(self.cache_dir, prefix)
+      if len(prefix) != 2 or not os.path.isdir(prefix_dir):
+        continue
+      for key in os.listdir(prefix_dir):
+        entry_dir = os.path.join(prefix_dir, key)
+        manifest = os.path.join(entry_dir, MANIFEST)
+        if not os.path.exists(manifest):
+          continue
+        size = sum(os.path.getsize(os.path.join(entry_dir, fname))
+                   for fname in os.listdir(entry_dir))
+        ret.append((os.path.getmtime(manifest), size, entry_dir))
+    return ret
+
+  def evict(self):
+    """Remove the least recently used entries until under max_size."""
+    with self._lock:
+      entries = sorted(self._entries())
+      total = sum(size for _, size, _ in entries)
+      while entries and total > self.max_size:
+        _, size, entry_dir = entries.pop(0)
+        shutil.rmtree(entry_dir, True)
+        total -= size
+
+  def run(self, name, func, inputs, outputs, extra=None):
+    """Build the target with func() unless it's cached.
+    Args:
+      name: name of the target, ex. 'build_deb'
+      func: callable with no arguments that builds `outputs`.
+      inputs: list of files, directories or globs the target depends on.
+      outputs: list of files or globs the target creates.
+      extra: anything else (with a stable repr) that affects the build.
+    Returns:
+      'current', 'restored' or 'built'
+    """
+    key = self.fingerprint(name, inputs, extra)
+    if self.is_current(key):
+      print('%s is up-to-date' % name)
+      return 'current'
+    if self.restore(key):
+      print('%s restored from cache' % name)
+      return 'restored'
+    before = _stat_outputs(outputs)
+    func()
+    self.store(key, _produced(outputs, before))
+    return 'built'
@@ -0,0 +1,183 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Builds dist/<name>-<ver>.pyz, an executable zipapp of the packages.
+
+Enabled with ZIPAPP_MAIN in setup.py, what the zipapp runs:
+
+  ZIPAPP_MAIN = 'myprog.main:main'    # calls sys.exit(main())
+  ZIPAPP_MAIN = 'scripts/myprog'      # this script is the __main__.py
+
+ZIPAPP_PYTHON (default python3) is both the #! interpreter and the one
+that precompiles the modules.  Members are stored uncompressed and each
+module has its .pyc next to it (where zipimport looks for it) using
+unchecked-hash invalidation, the archive never changes.  If the
+interpreter's version differs zipimport falls back to the .py source.
+
+  python -m pybdist.bundle dist/myprog-1.0.pyz [args]
+
+times the startup of the .pyz against the same modules unzipped, as
+they'd be when installed.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+__author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
+
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+from . import bytecode
+from . import sdist
+
+DEFAULT_PYTHON = 'python3'
+MAIN_TEMPLATE = '''# -*- coding: utf-8 -*-
+import sys
+from %(module)s import %(func)s
+sys.exit(%(func)s())
+'''
+
+
+class BundleException(Exception):
+  pass
+
+
+def main_source(main):
+  """Returns the __main__.py text for ZIPAPP_MAIN."""
+  if ':' in main:
+    module, func = main.split(':', 1)
+    return MAIN_TEMPLATE % dict(module=module, func=func)
+  with open(main) as fin:
+    return fin.read()
+
+
+def _module_files(setup_dict):
+  """Returns [(archive name, file name)] of the packages and modules."""
+  ret = []
+  for fname in sdist._package_files(setup_dict):
+    for package in setup_dict.get('packages', []):
+      pkg_dir = os.path.normpath(sdist._package_dir(setup_dict, package))
+      if os.path.dirname(os.path.normpath(fname)) == pkg_dir or (
+          not fname.endswith('.py') and fname.startswith(pkg_dir + os.sep)):
+        rel = os.path.relpath(fname, pkg_dir)
+        ret.append(('/'.join(package.split('.') + rel.split(os.sep)), fname))
+        break
+  for module in setup_dict.get('py_modules', []):
+    parts = module.split('.')
+    pkg_dir = sdist._package_dir(setup_dict, '.'.join(parts[:-1]))
+    ret.append(('/'.join(parts) + '.py', os.path.join(pkg_dir, parts[-1] + '.py')))
+  return sorted(set(ret))
+
+
+def _legacy_pyc_name(pyc):
+  """pkg/__pycache__/mod.cpython-311.pyc -> pkg/mod.pyc"""
+  dirname, name = os.path.split(pyc)
+  return os.path.join(os.path.dirname(dirname), name.split('.', 1)[0] + '.pyc')
+
+
+def build(setup_dict, main, dist_dir='dist', python=DEFAULT_PYTHON):
+  """Write dist/<name>-<ver>.pyz.
+  Returns:
+    the .pyz's filename
+  """
+  pyz = os.path.join(dist_dir, '%s-%s.pyz' % (setup_dict['name'],
+                                             setup_dict['version']))
+  tmpdir = tempfile.mkdtemp(prefix='pybdist-pyz-')
+  try:
+    for arcname, fname in _module_files(setup_dict):
+      out_name = os.path.join(tmpdir, arcname)
+      os.makedirs(os.path.dirname(out_name), exist_ok=True)
+      shutil.copyfile(fname, out_name)
+    with open(os.path.join(tmpdir, '__main__.py'), 'w') as fout:
+      fout.write(main_source(main))
+    pycs = bytecode.compile_dir(tmpdir, '', python, 'unchecked-hash')
+    for pyc in pycs:
+      os.rename(os.path.join(tmpdir, pyc),
+                os.path.join(tmpdir, _legacy_pyc_name(pyc)))
+    if not os.path.isdir(dist_dir):
+      os.makedirs(dist_dir)
+    count = 0
+    with open(pyz + '.tmp', 'wb') as fout:
+      fout.write(('#!/usr/bin/env %s\n' % python).encode('utf-8'))
+      with zipfile.ZipFile(fout, 'w', zipfile.ZIP_STORED) as zout:
+        for root, dirs, files in os.walk(tmpdir):
+          dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+          for fname in sorted(files):
+            full_name = os.path.join(root, fname)
+            zout.write(full_name, os.path.relpath(full_name, tmpdir))
+            count += 1
+    mode = os.stat(pyz + '.tmp').st_mode
+    os.chmod(pyz + '.tmp', mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    os.rename(pyz + '.tmp', pyz)
+  finally:
+    shutil.rmtree(tmpdir, True)
+  print('Built %r with %d files' % (pyz, count))
+  return pyz
+
+
+def _best_time(args, repeat):
+  subprocess.run(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+  best = None
+  for _ in range(repeat):
+    start = time.perf_counter()
+    subprocess.run(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    elapsed = time.perf_counter() - start
+    if best is None or elapsed < best:
+      best = elapsed
+  return best
+
+
+def compare_startup(pyz, args=None, repeat=10, python=None):
+  """Time running the .pyz and the same files unzipped.
+  Returns:
+    (zipapp seconds, unzipped seconds), best of `repeat` after a warm up.
+  """
+  python = python or sys.executable
+  args = args or ['--help']
+  tmpdir = tempfile.mkdtemp(prefix='pybdist-pyz-')
+  try:
+    with zipfile.ZipFile(pyz) as zin:
+      zin.extractall(tmpdir, [name for name in zin.namelist()
+                              if not name.endswith('.pyc')])
+    zipped = _best_time([python, pyz] + args, repeat)
+    # The warm up run writes __pycache__, like an installed package.
+    unzipped = _best_time([python, tmpdir] + args, repeat)
+  finally:
+    shutil.rmtree(tmpdir, True)
+  print('%-12s %8.1fms' % ('zipapp', zipped * 1000))
+  print('%-12s %8.1fms' % ('unzipped', unzipped * 1000))
+  print('zipapp is %.0f%% of the unzipped start up time' % (
+      100.0 * zipped / max(unzipped, 1e-9)))
+  return zipped, unzipped
+
+
+def main(argv=None):
+  argv = sys.argv[1:] if argv is None else argv
+  if not argv:
+    print('Usage: python -m pybdist.bundle <file.pyz> [args]')
+    return 2
+  compare_startup(argv[0], argv[1:])
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,172 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Precompiles the python modules that go into the .deb.
+
+Enabled with DEB_PRECOMPILE in setup.py:
+
+  DEB_PRECOMPILE = True          # with the python3 on the PATH
+  DEB_PRECOMPILE = 'python3.11'  # with this interpreter
+
+The target interpreter runs `compileall -j 0` (one process per cpu) with
+checked-hash invalidation, so the .pyc files don't depend on the mtimes
+in the package and are reproducible.  File names inside the .pyc files
+are the installed paths.
+
+With debuild the compiling happens inside the build, from a hook added
+to the staged debian/rules, so Installed-Size, the md5sums, the .changes
+and lintian all see the .pyc files.  The package then ships its own
+bytecode, so dh_python3's py3compile/py3clean calls are left out of its
+maintainer scripts.  The hook fails the build if the package has no
+modules in /usr/lib/python3/dist-packages to compile (ex. the rules
+install them elsewhere).
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+__author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
+
+import os
+import shutil
+import tempfile
+
+from . import runner
+
+DEFAULT_INTERPRETER = 'python3'
+HOOK_SCRIPT = 'pybdist-precompile'
+# Run by debian/rules inside debuild, with the target interpreter.
+HOOK_SOURCE = r"""# -*- coding: utf-8 -*-
+# Generated by pybdist: precompile the modules of the package in argv[1]
+# and drop dh_python3's py3compile/py3clean, which would rewrite and
+# remove the .pyc files the package now ships.
+import glob
+import os
+import re
+import subprocess
+import sys
+
+PYTHON_DIR = '%(python_dir)s'
+BLOCK = re.compile(r'# Automatically added by dh_python3.*?'
+                   r'# End automatically added section\n?', re.S)
+
+package = sys.argv[1]
+modules = os.path.join('debian', package, PYTHON_DIR)
+sources = [os.path.join(root, fname)
+           for root, _, files in os.walk(modules)
+           for fname in files if fname.endswith('.py')]
+if not sources:
+  # Ex. the rules install somewhere else, DEB_PYTHON_SYSTEM=pysupport.
+  sys.exit('pybdist-precompile: DEB_PRECOMPILE found no modules in %%r, '
+           'set DEB_PRECOMPILE = False or install them in /%%s'
+           %% (modules, PYTHON_DIR))
+subprocess.check_call([sys.executable, '-m', 'compileall', '-q', '-j', '0',
+                       '--invalidation-mode', 'checked-hash',
+                       '-d', '/' + PYTHON_DIR, modules])
+print('pybdist-precompile: compiled %%d modules in %%s' %% (len(sources),
+                                                           modules))
+for pattern in ['debian/%%s.*.debhelper', 'debian/.debhelper/generated/%%s/*',
+                'debian/%%s/DEBIAN/*']:
+  for fname in glob.glob(pattern %% package):
+    if os.path.isfile(fname):
+      with open(fname) as fin:
+        text = fin.read()
+      if 'py3compile' in text or 'py3clean' in text:
+        with open(fname, 'w') as fout:
+          fout.write(BLOCK.sub('', text))
+"""
+
+
+class BytecodeException(Exception):
+  pass
+
+
+def get_interpreter(setup):
+  """The interpreter named by DEB_PRECOMPILE, or None if disabled."""
+  value = getattr(setup, 'DEB_PRECOMPILE', None)
+  if not value:
+    return None
+  if value is True:
+    return DEFAULT_INTERPRETER
+  return value
+
+
+def compile_dir(dirname, install_dir, interpreter=DEFAULT_INTERPRETER,
+                invalidation='checked-hash'):
+  """Compile every .py below `dirname`, as if it were in `install_dir`.
+  Returns:
+    sorted list of the .pyc files made, relative to `dirname`.
+  """
+  args = [interpreter, '-m', 'compileall', '-q', '-j', '0',
+          '--invalidation-mode', invalidation, '-d', install_dir, dirname]
+  runner.run_or_die(args, BytecodeException, 'Unable to precompile with %r'
+                    % interpreter, echo=False)
+  ret = []
+  for root, _, files in os.walk(dirname):
+    for fname in files:
+      if fname.endswith('.pyc'):
+        ret.append(os.path.relpath(os.path.join(root, fname), dirname))
+  return sorted(ret)
+
+
+def compile_files(files, python_dir, interpreter=DEFAULT_INTERPRETER):
+  """Compile the in memory payload of the native .deb builder.
+  Args:
+    files: {installed path: (bytes, mode)}, see deb_native.payload().
+    python_dir: installed directory of the modules, without the leading /.
+    interpreter: python to compile with.
+  Returns:
+    {installed path: (bytes, mode)} of the .pyc files
+  """
+  tmpdir = tempfile.mkdtemp(prefix='pybdist-pyc-')
+  try:
+    prefix = python_dir.rstrip('/') + '/'
+    for fname, (data, _) in files.items():
+      if fname.startswith(prefix) and fname.endswith('.py'):
+        out_name = os.path.join(tmpdir, fname[len(prefix):])
+        os.makedirs(os.path.dirname(out_name), exist_ok=True)
+        with open(out_name, 'wb') as fout:
+          fout.write(data)
+    ret = {}
+    for pyc in compile_dir(tmpdir, '/' + python_dir, interpreter):
+      with open(os.path.join(tmpdir, pyc), 'rb') as fin:
+        ret[prefix + pyc.replace(os.sep, '/')] = (fin.read(), 0o644)
+    return ret
+  finally:
+    shutil.rmtree(tmpdir, True)
+
+
+def add_debuild_hook(debian_dir, package, python_dir,
+                     interpreter=DEFAULT_INTERPRETER):
+  """Make debuild precompile the package's modules, before the control
+  file, md5sums, .changes and lintian are made.
+
+  Adds debian/pybdist-precompile and a hook calling it to debian/rules,
+  of the staged copy of debian/ only.
+  """
+  script = os.path.join(debian_dir, HOOK_SCRIPT)
+  with open(script, 'w') as fout:
+    fout.write(HOOK_SOURCE % dict(python_dir=python_dir))
+  os.chmod(script, 0o755)
+  rules = os.path.join(debian_dir, 'rules')
+  with open(rules) as fin:
+    uses_cdbs = 'cdbs' in fin.read()
+  # cdbs runs binary-post-install after dh_python3 and before dh_installdeb,
+  # dh's equivalent is execute_before_dh_installdeb (debhelper >= 12.8).
+  target = ('binary-post-install/%s::' % package if uses_cdbs
+            else 'execute_before_dh_installdeb:')
+  with open(rules, 'a') as fout:
+    fout.write('\n# -- added by pybdist for DEB_PRECOMPILE\n%s\n\t%s debian/%s %s\n'
+               % (target, interpreter, HOOK_SCRIPT, package))
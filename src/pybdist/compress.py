@@ -0,0 +1,343 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Multi-threaded compression for the .deb payload and the sdist.
+
+Compression is given as a string, like on the command line:
+
+  DEB_COMPRESSION = 'xz -T0'      # xz on every core, default level
+  DEB_COMPRESSION = 'zstd -19'
+  DEB_COMPRESSION = 'gzip -9'
+  SDIST_COMPRESSION = 6           # gzip level of the sdist
+
+gzip is done here, cut into chunks compressed in parallel.  xz and zstd
+use the xz/zstd programs with -T (threads), or the lzma module (single
+threaded) if xz isn't installed.  debuild gets the same settings through
+dpkg-deb's DPKG_DEB_COMPRESSOR_* variables.
+
+  python -m pybdist.compress      # size/time of each setting on this project
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+__author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
+
+import io
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import time
+import zlib
+
+CHUNK_SIZE = 1024 * 1024
+# The .zip records ParallelZip writes, as in the zip APPNOTE.
+ZIP_LOCAL = struct.Struct('<4s2B4HL2L2H')
+ZIP_CENTRAL = struct.Struct('<4s4B4HL2L5H2L')
+ZIP_END = struct.Struct('<4s4H2LH')
+ZIP_LIMIT = 0xFFFFFFFF
+ALGORITHMS = ['gzip', 'xz', 'zstd', 'none']
+EXTENSIONS = {'gzip': '.gz', 'xz': '.xz', 'zstd': '.zst', 'none': ''}
+DEFAULT_LEVELS = {'gzip': 9, 'xz': 6, 'zstd': 3, 'none': None}
+ALIASES = {'gz': 'gzip', 'lzma': 'xz', 'zst': 'zstd'}
+# What `python -m pybdist.compress` compares.
+REPORT_SPECS = ['gzip -1', 'gzip -6', 'gzip -9', 'xz -0 -T0', 'xz -6 -T0',
+                'xz -9 -T0', 'zstd -3 -T0', 'zstd -10 -T0', 'zstd -19 -T0']
+
+
+class CompressException(Exception):
+  pass
+
+
+class Compression(object):
+  """A parsed compression setting."""
+
+  def __init__(self, algo='gzip', level=None, threads=0):
+    algo = ALIASES.get(algo, algo)
+    if algo not in ALGORITHMS:
+      raise CompressException('Unknown compression %r, use one of %r' % (
+          algo, ALGORITHMS))
+    self.algo = algo
+    self.level = DEFAULT_LEVELS[algo] if level is None else level
+    # 0 means one per cpu.
+    self.threads = threads
+
+  @property
+  def extension(self):
+    return EXTENSIONS[self.algo]
+
+  def thread_count(self):
+    return self.threads or os.cpu_count() or 1
+
+  def __str__(self):
+    if self.algo == 'none':
+      return 'none'
+    return '%s -%d -T%d' % (self.algo, self.level, self.threads)
+
+
+def parse(spec, default='gzip'):
+  """Returns the Compression for 'xz -T0', 'zstd -19', 6, None..."""
+  if isinstance(spec, Compression):
+    return spec
+  if spec is None:
+    spec = default
+  if isinstance(spec, int):
+    return Compression('gzip', spec)
+  words = str(spec).split()
+  level = None
+  threads = 0
+  for word in words[1:]:
+    if word.startswith('-T') and word[2:].isdigit():
+      threads = int(word[2:])
+    elif word.startswith('--threads=') and word[10:].isdigit():
+      threads = int(word[10:])
+    elif word.startswith('-') and word[1:].isdigit():
+      level = int(word[1:])
+    else:
+      raise CompressException('Unknown compression option %r in %r' % (word, spec))
+  return Compression(words[0] if words else default, level, threads)
+
+
+def gzip_chunk(data, level):
+  """One complete gzip member with the compressed `data`."""
+  compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+  return compressor.compress(data) + compressor.flush()
+
+
+class ParallelGzip(io.RawIOBase):
+  """Write only file that gzips CHUNK_SIZE pieces in a thread pool."""
+
+  def __init__(self, fout, pool, level=9, chunk_size=CHUNK_SIZE):
+    io.RawIOBase.__init__(self)
+    self.fout = fout
+    self.pool = pool
+    self.level = level
+    self.chunk_size = chunk_size
+    self.buf = bytearray()
+    self.pending = []
+
+  def writable(self):
+    return True
+
+  def write(self, data):
+    self.buf += data
+    while len(self.buf) >= self.chunk_size:
+      self._submit(bytes(self.buf[:self.chunk_size]))
+      del self.buf[:self.chunk_size]
+    return len(data)
+
+  def _submit(self, chunk):
+    self.pending.append(self.pool.submit(gzip_chunk, chunk, self.level))
+    # Write out finished chunks in order, bounding the memory used.
+    while self.pending and (self.pending[0].done() or len(self.pending) > 16):
+      self.fout.write(self.pending.pop(0).result())
+
+  def close(self):
+    if not self.closed:
+      if self.buf or not self.pending:
+        self._submit(bytes(self.buf))
+        self.buf = bytearray()
+      for future in self.pending:
+        self.fout.write(future.result())
+      self.pending = []
+    io.RawIOBase.close(self)
+
+
+def deflate_member(data, level):
+  """Returns (crc32, raw deflate of `data`) for a .zip member."""
+  compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+  return zlib.crc32(data), compressor.compress(data) + compressor.flush()
+
+
+class ParallelZip(object):
+  """Write only .zip whose members are deflated in a thread pool.
+
+  Members are written in the order they're added, without zip64 (so
+  under 4G and 65535 members, plenty for an sdist).
+  """
+
+  def __init__(self, fout, pool, level=9):
+    self.fout = fout
+    self.pool = pool
+    self.level = level
+    self.pending = []
+    self.central = []
+    self.offset = 0
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, *unused_exc):
+    if exc_type is None:
+      self.close()
+
+  def writestr(self, zinfo, data):
+    """Add `data` as the member `zinfo`, a zipfile.ZipInfo.
+
+    Names ending in / are directories, stored, otherwise members are
+    deflated unless zinfo.compress_type is ZIP_STORED.
+    """
+    import zipfile
+    if zinfo.filename.endswith('/'):
+      zinfo.compress_type = zipfile.ZIP_STORED
+      zinfo.external_attr |= 0x10  # MS-DOS directory
+    if zinfo.compress_type == zipfile.ZIP_STORED:
+      future = self.pool.submit(lambda: (zlib.crc32(data), data))
+    else:
+      future = self.pool.submit(deflate_member, data, self.level)
+    self.pending.append((zinfo, len(data), future))
+    # Write out finished members in order, bounding the memory used.
+    while self.pending and (self.pending[0][2].done() or len(self.pending) > 16):
+      self._write(*self.pending.pop(0))
+
+  def _write(self, zinfo, size, future):
+    crc, packed = future.result()
+    if max(size, len(packed), self.offset) > ZIP_LIMIT:
+      raise CompressException('%r is too big for a zip without zip64'
+                              % zinfo.filename)
+    year, month, day, hour, minute, second = zinfo.date_time
+    dos_date = (year - 1980) << 9 | month << 5 | day
+    dos_time = hour << 11 | minute << 5 | second // 2
+    try:
+      name = zinfo.filename.encode('ascii')
+      flags = 0
+    except UnicodeEncodeError:
+      name = zinfo.filename.encode('utf-8')
+      flags = 0x800
+    self.fout.write(ZIP_LOCAL.pack(
+        b'PK\x03\x04', 20, 0, flags, zinfo.compress_type, dos_time,
+        dos_date, crc, len(packed), size, len(name), 0) + name)
+    self.fout.write(packed)
+    self.central.append(ZIP_CENTRAL.pack(
+        b'PK\x01\x02', 20, 3, 20, 0, flags, zinfo.compress_type, dos_time,
+        dos_date, crc, len(packed), size, len(name), 0, 0, 0, 0,
+        zinfo.external_attr, self.offset) + name)
+    self.offset += ZIP_LOCAL.size + len(name) + len(packed)
+
+  def close(self):
+    """Write the remaining members and the central directory."""
+    if self.central is None:
+      return
+    for pending in self.pending:
+      self._write(*pending)
+    self.pending = []
+    if len(self.central) > 0xFFFF or self.offset > ZIP_LIMIT:
+      raise CompressException('Too many members for a zip without zip64')
+    central = b''.join(self.central)
+    self.fout.write(central)
+    self.fout.write(ZIP_END.pack(b'PK\x05\x06', 0, 0, len(self.central),
+                                 len(self.central), len(central), self.offset,
+                                 0))
+    self.central = None
+
+
+def _gzip(data, comp):
+  from concurrent import futures
+  fout = io.BytesIO()
+  with futures.ThreadPoolExecutor(comp.thread_count()) as pool:
+    with ParallelGzip(fout, pool, comp.level) as gz_out:
+      gz_out.write(data)
+    return fout.getvalue()
+
+
+def _external(data, comp):
+  args = [comp.algo, '-c', '-%d' % comp.level, '-T%d' % comp.threads]
+  if comp.algo == 'zstd' and comp.level > 19:
+    args.append('--ultra')
+  proc = subprocess.run(args, input=data, stdout=subprocess.PIPE,
+                        stderr=subprocess.PIPE)
+  if proc.returncode:
+    raise CompressException('%s failed: %s' % (' '.join(args),
+                                               proc.stderr.decode('utf-8', 'replace')))
+  return proc.stdout
+
+
+def compress(data, spec):
+  """Returns `data` compressed as the `spec` (string or Compression) says."""
+  comp = parse(spec)
+  if comp.algo == 'none':
+    return data
+  if comp.algo == 'gzip':
+    return _gzip(data, comp)
+  if shutil.which(comp.algo):
+    return _external(data, comp)
+  if comp.algo == 'xz':
+    import lzma
+    return lzma.compress(data, preset=comp.level)
+  raise CompressException('%r needs the %s program' % (str(comp), comp.algo))
+
+
+def available(spec):
+  comp = parse(spec)
+  return comp.algo in ['gzip', 'xz', 'none'] or bool(shutil.which(comp.algo))
+
+
+def dpkg_env(spec):
+  """The dpkg-deb environment variables for this compression."""
+  comp = parse(spec)
+  env = dict(DPKG_DEB_COMPRESSOR_TYPE=comp.algo,
+             DPKG_DEB_THREADS_MAX=str(comp.thread_count()))
+  if comp.level is not None:
+    env['DPKG_DEB_COMPRESSOR_LEVEL'] = str(comp.level)
+  return env
+
+
+def project_tar(root='.'):
+  """Returns an uncompressed tar of the project's files, in memory."""
+  import tarfile
+  from . import file_index
+  buf = io.BytesIO()
+  with tarfile.open(fileobj=buf, mode='w') as tar:
+    for fname in file_index.get(root).files():
+      tar.add(os.path.join(root, fname), fname, recursive=False)
+  return buf.getvalue()
+
+
+def report(data, specs=None, out=None):
+  """Print the size and time of compressing `data` with each spec.
+  Returns:
+    list of (spec, size, seconds)
+  """
+  out = out or sys.stdout
+  ret = []
+  out.write('%-16s %12s %7s %9s %10s\n' % (
+      'Compression', 'Size', 'Ratio', 'Time(s)', 'MB/s'))
+  out.write('%-16s %12d %7s\n' % ('(uncompressed)', len(data), '100.0%'))
+  for spec in specs or REPORT_SPECS:
+    if not available(spec):
+      out.write('%-16s %12s\n' % (spec, 'unavailable'))
+      continue
+    start = time.perf_counter()
+    size = len(compress(data, spec))
+    elapsed = time.perf_counter() - start
+    out.write('%-16s %12d %6.1f%% %9.3f %10.1f\n' % (
+        spec, size, 100.0 * size / max(len(data), 1), elapsed,
+        len(data) / 1e6 / max(elapsed, 1e-9)))
+    ret.append((spec, size, elapsed))
+  return ret
+
+
+def main(argv=None):
+  argv = sys.argv[1:] if argv is None else argv
+  root = argv[0] if argv else '.'
+  data = project_tar(root)
+  report(data, argv[1:] or None)
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,375 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Assembles an `Architecture: all` .deb directly, without debuild.
+
+Only for pure python packages.  The payload is read from the sdist in
+dist/ and laid out the way python-distutils.mk installs it:
+
+  packages and py_modules  /usr/lib/python3/dist-packages/
+  scripts                  /usr/bin/ (python shebangs become /usr/bin/python3)
+  data_files               /usr/<dir>/ (or <dir> if absolute)
+  debian/docs, copyright   /usr/share/doc/<deb name>/
+
+The control file comes from debian.control_file(setup).  Every entry is
+owned by root:root with 0755 directories and 0644 files (scripts 0755),
+so no fakeroot is needed.  debuild stays the reference path, select this
+one with DEB_BUILDER = 'native' in setup.py.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+__author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
+
+import fnmatch
+import glob
+import gzip
+import hashlib
+import io
+import os
+import posixpath
+import re
+import tarfile
+import time
+
+from . import bytecode
+from . import compress
+
+PYTHON_DIR = 'usr/lib/python3/dist-packages'
+SCRIPT_PYTHON = b'/usr/bin/python3'
+# distutils' build_scripts pattern, ex. #!/usr/bin/env python3 -u
+_RE_SHEBANG = re.compile(br'^#!.*python[0-9.]*([ \t].*)?$')
+# data.tar's compression unless DEB_COMPRESSION is set, see compress.
+DEFAULT_COMPRESSION = 'xz -T0'
+# What the ${...} substitution variables of debian/control become.
+SUBSTVARS = {
+  'shlibs:Depends': '',
+  'misc:Depends': '',
+  'python:Depends': 'python3',
+}
+BINARY_FIELDS = ['Package', 'Source', 'Version', 'Architecture', 'Maintainer',
+                 'Installed-Size', 'Depends', 'Recommends', 'Suggests',
+                 'Section', 'Priority', 'Homepage', 'Description']
+
+
+class DebNativeException(Exception):
+  pass
+
+
+def deb_version(changelog='debian/changelog'):
+  """The full version (ex. 0.4.1-1) of the last debian/changelog entry."""
+  with open(changelog) as fin:
+    for line in fin:
+      grps = re.match(r'^[\w.+-]+ \(([^)]+)\)', line)
+      if grps:
+        return grps.group(1)
+  raise DebNativeException('No version found in %r' % changelog)
+
+
+def _parse_stanzas(lines):
+  """Returns a list of {field: value} from debian/control lines."""
+  stanzas = [{}]
+  field = None
+  for line in lines:
+    if line.startswith('#'):
+      continue
+    if not line.strip():
+      if stanzas[-1]:
+        stanzas.append({})
+      field = None
+    elif line[0] in ' \t' and field:
+      stanzas[-1][field] += '\n' + line.rstrip()
+    else:
+      field, value = line.split(':', 1)
+      stanzas[-1][field] = value.strip()
+  return [stanza for stanza in stanzas if stanza]
+
+
+def _substitute(value):
+  """Expand ${...} variables and clean up a comma separated relation list."""
+  value = re.sub(r'\$\{([^}]+)\}', lambda grps: SUBSTVARS.get(grps.group(1), ''),
+                 value)
+  ret = []
+  for item in value.replace('\n', ' ').split(','):
+    item = item.strip()
+    if item and item not in ret:
+      ret.append(item)
+  return ', '.join(ret)
+
+
+def binary_control(control_lines, version, installed_size):
+  """Turns the source control file into the binary package's control.
+  Args:
+    control_lines: lines from debian.control_file(setup).
+    version: full debian version.
+    installed_size: in KiB.
+  Returns:
+    text of DEBIAN/control
+  """
+  stanzas = _parse_stanzas(control_lines)
+  if len(stanzas) < 2:
+    raise DebNativeException('Expected a source and a binary stanza')
+  source, binary = stanzas[0], stanzas[1]
+  if binary.get('Architecture') != 'all':
+    raise DebNativeException('Only Architecture: all packages can be built natively')
+  fields = dict(binary)
+  for name in ['Maintainer', 'Section', 'Priority', 'Homepage']:
+    if name not in fields and name in source:
+      fields[name] = source[name]
+  if source.get('Source') != fields['Package']:
+    fields['Source'] = source['Source']
+  fields['Version'] = version
+  fields['Installed-Size'] = str(installed_size)
+  for name in ['Depends', 'Recommends', 'Suggests']:
+    if name in fields:
+      fields[name] = _substitute(fields[name])
+      if not fields[name]:
+        del fields[name]
+  return ''.join('%s: %s\n' % (name, fields[name])
+                 for name in BINARY_FIELDS if name in fields)
+
+
+def _package_dir(setup_dict, package):
+  from . import sdist
+  return sdist._package_dir(setup_dict, package).replace(os.sep, '/')
+
+
+def _member(members, fname):
+  """The bytes of the sdist file `fname` named in setup.py."""
+  try:
+    return members[posixpath.normpath(fname)]
+  except KeyError:
+    raise DebNativeException('%r is in setup.py but not in the sdist' % fname)
+
+
+def fix_shebang(data):
+  """Point a python script's #! line at /usr/bin/python3, like dh_python3."""
+  first, sep, rest = data.partition(b'\n')
+  grps = _RE_SHEBANG.match(first.rstrip(b'\r'))
+  if not grps:
+    return data
+  return b'#!' + SCRIPT_PYTHON + (grps.group(1) or b'') + sep + rest
+
+
+def payload(setup_dict, members):
+  """Maps the sdist files to their installed location.
+  Args:
+    setup_dict: setup.SETUP
+    members: {path relative to the sdist: bytes}
+  Returns:
+    {installed path without the leading '/': (bytes, mode)}
+  """
+  ret = {}
+  package_data = setup_dict.get('package_data', {})
+  for package in setup_dict.get('packages', []):
+    pkg_dir = _package_dir(setup_dict, package)
+    patterns = package_data.get('', []) + package_data.get(package, [])
+    for fname, data in members.items():
+      if posixpath.dirname(fname) == pkg_dir and fname.endswith('.py'):
+        rel = posixpath.basename(fname)
+      elif fname.startswith(pkg_dir + '/'):
+        rel = fname[len(pkg_dir) + 1:]
+        if not any(fnmatch.fnmatch(rel, pattern) for pattern in patterns):
+          continue
+      else:
+        continue
+      install_dir = posixpath.join(PYTHON_DIR, *package.split('.'))
+      ret[posixpath.join(install_dir, rel)] = (data, 0o644)
+  for module in setup_dict.get('py_modules', []):
+    parts = module.split('.')
+    fname = posixpath.join(_package_dir(setup_dict, '.'.join(parts[:-1])),
+                           parts[-1] + '.py')
+    ret[posixpath.join(PYTHON_DIR, *parts) + '.py'] = (
+        _member(members, fname), 0o644)
+  for fname in setup_dict.get('scripts', []):
+    ret['usr/bin/' + posixpath.basename(fname)] = (
+        fix_shebang(_member(members, fname)), 0o755)
+  for item in setup_dict.get('data_files', []):
+    if isinstance(item, str):
+      item = ('', [item])
+    dirname, fnames = item
+    if not dirname.startswith('/'):
+      dirname = posixpath.join('usr', dirname)
+    for fname in fnames:
+      ret[posixpath.join(dirname.lstrip('/'), posixpath.basename(fname))] = (
+          _member(members, fname), 0o644)
+  return ret
+
+
+def doc_files(deb_name, members, project_dir='.'):
+  """The /usr/share/doc files, from the sdist if it has them."""
+  doc_dir = 'usr/share/doc/%s/' % deb_name
+  ret = {}
+  def _exists(fname):
+    return fname in members or os.path.exists(os.path.join(project_dir, fname))
+  def _read(fname):
+    if fname in members:
+      return members[fname]
+    with open(os.path.join(project_dir, fname), 'rb') as fin:
+      return fin.read()
+  if _exists('debian/copyright'):
+    ret[doc_dir + 'copyright'] = (_read('debian/copyright'), 0o644)
+  if _exists('debian/changelog'):
+    ret[doc_dir + 'changelog.Debian.gz'] = (
+        gzip.compress(_read('debian/changelog'), 9, mtime=0), 0o644)
+  if _exists('debian/docs'):
+    for pattern in _read('debian/docs').decode('utf-8').split():
+      for fname in sorted(glob.glob(os.path.join(project_dir, pattern))):
+        if os.path.isfile(fname):
+          fname = os.path.relpath(fname, project_dir)
+          ret[doc_dir + posixpath.basename(fname)] = (_read(fname), 0o644)
+  return ret
+
+
+def read_sdist(tarball):
+  """Returns {path relative to the top directory: bytes} of the sdist."""
+  ret = {}
+  with tarfile.open(tarball) as tar:
+    for info in tar:
+      if not info.isfile():
+        continue
+      name = info.name.split('/', 1)
+      if len(name) == 2:
+        ret[name[1]] = tar.extractfile(info).read()
+  return ret
+
+
+def _tar_entry(tar, name, mode, mtime, data=None):
+  info = tarfile.TarInfo(name)
+  info.mode = mode
+  info.mtime = mtime
+  info.uid = info.gid = 0
+  info.uname = info.gname = 'root'
+  if data is None:
+    info.type = tarfile.DIRTYPE
+    tar.addfile(info)
+  else:
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
+
+
+def _dirs(fnames):
+  dirs = set()
+  for fname in fnames:
+    dirname = posixpath.dirname(fname)
+    while dirname and dirname not in dirs:
+      dirs.add(dirname)
+      dirname = posixpath.dirname(dirname)
+  return sorted(dirs)
+
+
+def data_tar(files, mtime, compression=None):
+  """Returns the compressed data.tar bytes for {path: (bytes, mode)}."""
+  buf = io.BytesIO()
+  with tarfile.open(fileobj=buf, mode='w', format=tarfile.GNU_FORMAT) as tar:
+    _tar_entry(tar, './', 0o755, mtime)
+    for dirname in _dirs(files):
+      _tar_entry(tar, './%s/' % dirname, 0o755, mtime)
+    for fname in sorted(files):
+      data, mode = files[fname]
+      _tar_entry(tar, './' + fname, mode, mtime, data)
+  return compress.compress(buf.getvalue(), compression)
+
+
+def control_tar(control, md5sums, mtime):
+  buf = io.BytesIO()
+  with tarfile.open(fileobj=buf, mode='w:gz', format=tarfile.GNU_FORMAT) as tar:
+    _tar_entry(tar, './', 0o755, mtime)
+    _tar_entry(tar, './control', 0o644, mtime, control.encode('utf-8'))
+    _tar_entry(tar, './md5sums', 0o644, mtime, md5sums.encode('utf-8'))
+  return buf.getvalue()
+
+
+def write_ar(fname, members, mtime):
+  """Write the ar archive `fname` from the list of (name, bytes)."""
+  with open(fname, 'wb') as fout:
+    fout.write(b'!<arch>\n')
+    for name, data in members:
+      header = '%-16s%-12d%-6d%-6d%-8o%-10d`\n' % (
+          name, mtime, 0, 0, 0o100644, len(data))
+      fout.write(header.encode('ascii'))
+      fout.write(data)
+      if len(data) % 2:
+        fout.write(b'\n')
+
+
+def read_ar(fname, prefix=''):
+  """Returns {name: bytes} of the members of the ar archive `fname`.
+
+  Only the members whose name starts with `prefix` are read, the others
+  are skipped over.
+  """
+  ret = {}
+  with open(fname, 'rb') as fin:
+    if fin.read(8) != b'!<arch>\n':
+      raise DebNativeException('%r is not an ar archive' % fname)
+    while True:
+      header = fin.read(60)
+      if len(header) < 60:
+        break
+      name = header[:16].decode('ascii').strip().rstrip('/')
+      size = int(header[48:58])
+      if name.startswith(prefix):
+        ret[name] = fin.read(size)
+        fin.seek(size % 2, os.SEEK_CUR)
+      else:
+        fin.seek(size + size % 2, os.SEEK_CUR)
+  return ret
+
+
+def open_member_tar(name, data):
+  """Returns the tarfile of a control.tar.* or data.tar.* member."""
+  if name.endswith('.zst'):
+    import subprocess
+    data = subprocess.run(['zstd', '-dc'], input=data, check=True,
+                          stdout=subprocess.PIPE).stdout
+  return tarfile.open(fileobj=io.BytesIO(data), mode='r:*')
+
+
+def build(setup, tarball=None, project_dir='.'):
+  """Build dist/<deb name>_<version>_all.deb from the sdist.
+  Returns:
+    the .deb's filename
+  """
+  from . import debian
+  dist_dir = os.path.join(project_dir, 'dist')
+  tarball = tarball or os.path.join(dist_dir, '%s-%s.tar.gz' % (setup.NAME,
+                                                                setup.VER))
+  mtime = int(os.environ.get('SOURCE_DATE_EPOCH') or time.time())
+  members = read_sdist(tarball)
+  files = payload(setup.SETUP, members)
+  files.update(doc_files(setup.DEB_NAME, members, project_dir))
+  interpreter = bytecode.get_interpreter(setup)
+  if interpreter:
+    files.update(bytecode.compile_files(files, PYTHON_DIR, interpreter))
+  installed_size = len(_dirs(files)) + sum(
+      (len(data) + 1023) // 1024 for data, _ in files.values())
+  version = deb_version(os.path.join(project_dir, 'debian/changelog'))
+  control = binary_control(debian.control_file(setup), version, installed_size)
+  md5sums = ''.join('%s  %s\n' % (hashlib.md5(files[fname][0]).hexdigest(), fname)
+                    for fname in sorted(files))
+  # Like dpkg-deb, the epoch stays in the control file but not the file name.
+  deb_name = os.path.join(dist_dir, '%s_%s_all.deb' % (
+      setup.DEB_NAME, version.split(':', 1)[-1]))
+  comp = compress.parse(getattr(setup, 'DEB_COMPRESSION', None), DEFAULT_COMPRESSION)
+  write_ar(deb_name + '.tmp', [
+      ('debian-binary', b'2.0\n'),
+      ('control.tar.gz', control_tar(control, md5sums, mtime)),
+      ('data.tar' + comp.extension, data_tar(files, mtime, comp)),
+  ], mtime)
+  os.rename(deb_name + '.tmp', deb_name)
+  print('Built %r with %d files' % (deb_name, len(files)))
+  return deb_name
@@ -17,9 +17,11 @@
   ./debian/  contains correct debian configuration files
   ./dist/<package>-<ver>-tar.gz has a built source package.
 
-If a there's a ./tmp directory it'll blow it away and create a new one.
+Each build works in its own temporary directory and never changes the
+current directory, so several packages can be built at the same time.
 
-Outputs the final package to ./debian-<debversion>/ (ex. ./debian-squeeze/sid)
+Copies the .deb to ./dist/ and the other debuild outputs to
+./debian-<debversion>/ (ex. ./debian-squeeze/sid)
 
 On any error it exit's.
 
@@ -37,8 +39,12 @@ from __future__ import absolute_import
 from __future__ import print_function
 import os
 import shutil
-import subprocess
 import textwrap
+from . import bytecode
+from . import compress
+from . import lintian
+from . import runner
+from . import staging
 from . import util
 
 class DebianException(Exception):
@@ -47,97 +53,125 @@ class DebianException(Exception):
 def _copy_dir(from_dir, to_dir):
   """Recursively copy all the files from `from_dir` and below to `to_dir`."""
   print(f'Copying from {from_dir!r} to {to_dir!r}')
-  os.makedirs(to_dir)
-  for fname in os.listdir(from_dir):
-    from_name = os.path.join(from_dir, fname)
-    if os.path.isdir(from_name):
-      _copy_dir(from_name, os.path.join(to_dir, fname))
-    else:
-      shutil.copy2(from_name, to_dir)
+  staging.copy_tree(from_dir, to_dir)
 
 
-def _copy_deb_file_to_dist(from_dir):
-  """Copy the only .deb file to dist."""
-  dest_dir = 'dist'
+def _copy_deb_file_to_dist(from_dir, dest_dir='dist'):
+  """Copy the only .deb file to dist.
+  Returns:
+    the copied file's name or None.
+  """
   for fname in os.listdir(from_dir):
     from_name = os.path.join(from_dir, fname)
     if os.path.isfile(from_name) and from_name.endswith('.deb'):
-      shutil.copy(from_name, dest_dir)
+      # tmpdir is removed afterwards, so a hard link is safe.
+      staging.link_or_copy(from_name, dest_dir)
       print(f'Copied {fname!r} to {dest_dir!r}')
-      return
+      return os.path.join(dest_dir, fname)
+  return None
 
 
 def _move_top_files_to_dir(from_dir, to_dir):
-  """Copy top level files (only) in `from_dir` to `to_dir`."""
-  os.makedirs(to_dir)
-  for fname in os.listdir(from_dir):
+  """Move top level files (only) in `from_dir` to `to_dir`, replacing them.
+  Returns:
+    list of moved file names.
+  """
+  os.makedirs(to_dir, exist_ok=True)
+  ret = []
+  for fname in sorted(os.listdir(from_dir)):
     from_name = os.path.join(from_dir, fname)
     if os.path.isfile(from_name):
-      shutil.move(from_name, to_dir)
+      ret.append(staging.move_file(from_name, os.path.join(to_dir, fname)))
   print(f'Moved files from {from_dir!r} to {to_dir!r}')
+  return ret
 
 
-def _run_or_die(args, output=True):
-  """Run the `args` (a list) or dies."""
-  if output:
-    print(' '.join(args))
-  ret = subprocess.call(args)
-  if ret:
-    raise DebianException('Error running: %r' % ' '.join(args))
-
-def _get_deb_dir():
+def _get_deb_dir(project_dir='.'):
   # Move
   if os.path.exists('/etc/debian_version'):
     deb_ver = open('/etc/debian_version').read().rstrip()
   else:
     deb_ver = 'UNKNOWN'
-  return 'debian-%s' % deb_ver
-
-def build_deb(setup):
-  tmpdir = 'tmp'
-  shutil.rmtree(tmpdir, True)
-  dest_dir = '%s-%s' % (setup.NAME, setup.VER)
-  src_tar = '%s-%s' % (setup.NAME, setup.VER)
-  dest_tar = '%s_%s' % (setup.NAME, setup.VER)
-  _copy_dir('debian', os.path.join(tmpdir, dest_dir, 'debian'))
-
-  src_tarname = src_tar + '.tar.gz'
-  dest_tarname = dest_tar + '.tar.gz'
-  print('Linking dist/%r to tmp/%r' % (src_tarname, dest_tarname))
-  os.symlink(os.path.abspath(os.path.join('dist', src_tarname)),
-             os.path.abspath(os.path.join(tmpdir, dest_tarname)))
-
-  dest_tarname = dest_tar + '.orig.tar.gz'
-  print('Linking dist/%r to tmp/%r' % (src_tarname, dest_tarname))
-  os.symlink(os.path.abspath(os.path.join('dist', src_tarname)),
-             os.path.abspath(os.path.join(tmpdir, dest_tarname)))
-
-  args = ['tar', '-zx', '--directory', tmpdir, '-f',
-          os.path.join('dist', dest_dir + '.tar.gz')]
-  _run_or_die(args)
-  old_cwd = os.getcwd()
-  subfolder = os.path.join(tmpdir, dest_dir)
-  print(f'Change to subfolder {subfolder!r}')
-  os.chdir(subfolder)
-  args = ['debuild',
-      '--lintian-opts', '--info', '--display-info', '--display-experimental',
-      '--color', 'always',
-      #'--pedantic'
-      #'--fail-on-warnings',
-      ]
-  _run_or_die(args)
-  os.chdir(old_cwd)
-  debdir = _get_deb_dir()
-
-  # Example removes ./debian-squeeze/sid/ on down.
-  print(f"Removing folder {debdir!r}")
-  shutil.rmtree(debdir, True)
-  _copy_deb_file_to_dist(tmpdir)
-  _move_top_files_to_dir(tmpdir, debdir)
-
-  # Cleanup tmpdir
-  print(f"Removing folder {tmpdir!r}")
-  shutil.rmtree(tmpdir, True)
+  return os.path.join(project_dir, 'debian-%s' % deb_ver)
+
+def _write_orig_tarball(setup, project_dir='.'):
+  """Copy the sdist to the orig tarball debuild would leave, for --git.
+  Returns:
+    the orig tarball's filename
+  """
+  deb_dir = _get_deb_dir(project_dir)
+  if not os.path.isdir(deb_dir):
+    os.makedirs(deb_dir)
+  orig = os.path.join(deb_dir, '%s_%s.orig.tar.gz' % (setup.NAME, setup.VER))
+  staging.copy_file(os.path.join(project_dir, 'dist', '%s-%s.tar.gz' % (
+      setup.NAME, setup.VER)), orig)
+  return orig
+
+def build_deb(setup, project_dir='.'):
+  """Build the .deb from dist/<name>-<ver>.tar.gz.
+  Args:
+    setup: setup file.
+    project_dir: directory with setup.py, debian/ and dist/.
+  Returns:
+    list of files made, the .deb first.
+  """
+  if getattr(setup, 'DEB_BUILDER', None) == 'native':
+    from . import deb_native
+    deb_name = deb_native.build(setup, project_dir=project_dir)
+    lintian.after_build(setup, deb_name, project_dir)
+    return [deb_name, _write_orig_tarball(setup, project_dir)]
+  dist_dir = os.path.join(project_dir, 'dist')
+  tmpdir = staging.make_staging_dir('pybdist-deb-%s-' % setup.NAME,
+                                    getattr(setup, 'STAGING_DIR', None))
+  try:
+    dest_dir = '%s-%s' % (setup.NAME, setup.VER)
+    src_tar = '%s-%s' % (setup.NAME, setup.VER)
+    dest_tar = '%s_%s' % (setup.NAME, setup.VER)
+    _copy_dir(os.path.join(project_dir, 'debian'),
+              os.path.join(tmpdir, dest_dir, 'debian'))
+
+    src_tarname = os.path.abspath(os.path.join(dist_dir, src_tar + '.tar.gz'))
+    for dest_tarname in [dest_tar + '.tar.gz', dest_tar + '.orig.tar.gz']:
+      print('Linking %r to %r' % (src_tarname, dest_tarname))
+      os.symlink(src_tarname, os.path.join(tmpdir, dest_tarname))
+
+    print('Extracting %r to %r' % (src_tarname, tmpdir))
+    staging.extract_tar(src_tarname, tmpdir)
+    subfolder = os.path.join(tmpdir, dest_dir)
+    lintian_mode = lintian.get_mode(setup)
+    if lintian_mode == 'inline':
+      args = ['debuild',
+          '--lintian-opts', '--info', '--display-info', '--display-experimental',
+          '--color', 'always',
+          #'--pedantic'
+          #'--fail-on-warnings',
+          ]
+    else:
+      args = ['debuild', '--no-lintian']
+    if getattr(setup, 'DEB_COMPRESSION', None):
+      env = compress.dpkg_env(setup.DEB_COMPRESSION)
+      # debuild cleans the environment, pass them explicitly.
+      args[1:1] = ['--set-envvar=%s=%s' % item for item in sorted(env.items())]
+    interpreter = bytecode.get_interpreter(setup)
+    if interpreter:
+      from . import deb_native
+      bytecode.add_debuild_hook(os.path.join(subfolder, 'debian'),
+                                setup.DEB_NAME, deb_native.PYTHON_DIR,
+                                interpreter)
+    # Not captured, debsign asks for the GPG passphrase.
+    runner.run_or_die(args, DebianException, cwd=subfolder, capture=False)
+    debdir = _get_deb_dir(project_dir)
+
+    # Example fills ./debian-squeeze/sid/, replacing files of the same name.
+    deb_name = _copy_deb_file_to_dist(tmpdir, dist_dir)
+    if not deb_name:
+      raise DebianException('debuild made no .deb in %r' % tmpdir)
+    if lintian_mode == 'async':
+      lintian.after_build(setup, deb_name, project_dir)
+    return [deb_name] + _move_top_files_to_dir(tmpdir, debdir)
+  finally:
+    print(f"Removing folder {tmpdir!r}")
+    shutil.rmtree(tmpdir, True)
 
 def control_file(setup):
   """Create a simple debian/control file.
@@ -174,19 +208,18 @@ def control_file(setup):
   lines.append('# -- generated by %s' % util.MAGIC_NAME)
   return lines
 
-def git_import_orig(setup):
+def git_import_orig(setup, project_dir='.'):
   """Run git_import_orig in the directory."""
-  old_cwd = os.getcwd()
-  os.chdir(os.path.join(_get_deb_dir(), '..', setup.NAME))
+  git_dir = os.path.join(_get_deb_dir(project_dir), '..', setup.NAME)
   args = ['git-import-orig', '--pristine-tar',
-    '../../%s/%s_%s.orig.tar.gz' % (_get_deb_dir(), setup.NAME, setup.VER),
+    os.path.abspath(os.path.join(_get_deb_dir(project_dir), '%s_%s.orig.tar.gz'
+                                 % (setup.NAME, setup.VER))),
     ]
-  _run_or_die(args)
+  # Not captured, these may prompt (ex. for credentials).
+  runner.run_or_die(args, DebianException, cwd=git_dir, capture=False)
 
   args = ['git', 'push', 'origin', 'master']
-  _run_or_die(args)
+  runner.run_or_die(args, DebianException, cwd=git_dir, capture=False)
 
   args = ['git', 'push', '--tags']
-  _run_or_die(args)
-
-  os.chdir(old_cwd)
+  runner.run_or_die(args, DebianException, cwd=git_dir, capture=False)
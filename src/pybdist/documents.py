@@ -39,6 +39,7 @@ import re
 import textwrap
 import time
 import six.moves.urllib.request, six.moves.urllib.error, six.moves.urllib.parse
+from . import timeline
 from . import util
 
 gettext.install('pybdist')
@@ -73,6 +74,8 @@ LICENSES = {
       '<YEAR>', '<OWNER>'),
 }
 
+_apt_cache = None
+
 class DocumentsException(Exception):
   pass
 
@@ -92,9 +95,16 @@ def _title(word, char='='):
 def _underline(word, char='-'):
   return [word, char * len(word)]
 
+def get_apt_cache():
+  """Returns the apt.Cache(), opened once per process since it's slow."""
+  global _apt_cache
+  if _apt_cache is None:
+    _apt_cache = apt.Cache()
+  return _apt_cache
+
 def _fill_depends(setup):
   lines = []
-  apt_cache = apt.Cache()
+  apt_cache = get_apt_cache()
   longest = 0
   for req in setup.DEPENDS:
     length = len(req)
@@ -214,7 +224,8 @@ def out_license(setup):
     LOG.info('License file already exists as %r' % license_fname)
   url, y_regex, name_regex = to_fetch
   if url.startswith('http'):
-    txt = six.moves.urllib.request.urlopen(url).read()
+    with timeline.span('GET %s' % url, 'http'):
+      txt = six.moves.urllib.request.urlopen(url).read()
   else:
     txt = open(os.path.join(os.path.dirname(__file__), url)).read()
     if url.endswith('rot13'):
@@ -0,0 +1,248 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Index of the files in the project tree.
+
+The tree is scanned with os.scandir() skipping anything the top level
+.gitignore or .hgignore ignores (the last matching .gitignore pattern
+wins, so !pattern re-includes files, but not below an ignored directory).
+The index is saved to .pybdist/index.json and the next run only lists the
+directories whose mtime changed, the others reuse the saved listing.
+Editing a file doesn't change its directory's mtime, so stat() and sha1()
+re-check the one file they're asked about.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+__author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
+
+import fnmatch
+import json
+import os
+import re
+import threading
+
+INDEX_FILE = '.pybdist/index.json'
+ALWAYS_SKIP = ['.git', '.hg', '.svn', '.pybdist', '.ropeproject', '__pycache__']
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+class IgnoreRules(object):
+  """The patterns in a .gitignore or .hgignore at the root."""
+
+  def __init__(self, root):
+    self.globs = []    # (pattern, anchored, dir_only, negated)
+    self.regexes = []
+    self._read_gitignore(os.path.join(root, '.gitignore'))
+    self._read_hgignore(os.path.join(root, '.hgignore'))
+
+  def _read_gitignore(self, fname):
+    if not os.path.exists(fname):
+      return
+    for line in open(fname):
+      line = line.strip()
+      if not line or line.startswith('#'):
+        continue
+      negated = line.startswith('!')
+      if negated:
+        line = line[1:]
+      elif line.startswith('\\!') or line.startswith('\\#'):
+        line = line[1:]
+      dir_only = line.endswith('/')
+      line = line.rstrip('/')
+      anchored = '/' in line
+      self.globs.append((line.lstrip('/'), anchored, dir_only, negated))
+
+  def _read_hgignore(self, fname):
+    if not os.path.exists(fname):
+      return
+    syntax = 'regexp'
+    for line in open(fname):
+      line = line.strip()
+      if not line or line.startswith('#'):
+        continue
+      if line.startswith('syntax:'):
+        syntax = line.split(':', 1)[1].strip()
+        continue
+      if syntax == 'glob':
+        self.globs.append((line, '/' in line, False, False))
+      else:
+        try:
+          self.regexes.append(re.compile(line))
+        except re.error:
+          pass
+
+  def ignored(self, relpath, is_dir):
+    name = os.path.basename(relpath)
+    if name in ALWAYS_SKIP:
+      return True
+    ignored = False
+    for pattern, anchored, dir_only, negated in self.globs:
+      if dir_only and not is_dir:
+        continue
+      if fnmatch.fnmatch(relpath if anchored else name, pattern):
+        ignored = not negated
+    if ignored:
+      return True
+    for regex in self.regexes:
+      if regex.search(relpath):
+        return True
+    return False
+
+
+class FileIndex(object):
+  """Files and directories below `root`, relative paths use '/'."""
+
+  def __init__(self, root='.', index_file=None):
+    self.root = root
+    self.index_file = index_file or os.path.join(root, INDEX_FILE)
+    self.rules = IgnoreRules(root)
+    # relpath -> dict(mtime=, dirs=[names], files={name: [mtime, size, sha1]})
+    self.tree = {}
+    self._lock = threading.Lock()
+
+  def load(self):
+    if os.path.exists(self.index_file):
+      try:
+        with open(self.index_file) as fin:
+          self.tree = json.load(fin)
+      except ValueError:
+        self.tree = {}
+
+  def save(self):
+    dirname = os.path.dirname(self.index_file)
+    if dirname and not os.path.isdir(dirname):
+      os.makedirs(dirname, exist_ok=True)
+    tmp_name = self.index_file + '.tmp'
+    with open(tmp_name, 'w') as fout:
+      json.dump(self.tree, fout)
+    os.rename(tmp_name, self.index_file)
+
+  def _path(self, relpath):
+    if relpath == '.':
+      return self.root
+    return os.path.join(self.root, relpath)
+
+  def _join(self, relpath, name):
+    if relpath == '.':
+      return name
+    return relpath + '/' + name
+
+  def _scan_dir(self, relpath, mtime):
+    entry = dict(mtime=mtime, dirs=[], files={})
+    old_files = self.tree.get(relpath, {}).get('files', {})
+    with os.scandir(self._path(relpath)) as entries:
+      for dir_entry in entries:
+        child = self._join(relpath, dir_entry.name)
+        is_dir = dir_entry.is_dir(follow_symlinks=False)
+        if self.rules.ignored(child, is_dir):
+          continue
+        if is_dir:
+          entry['dirs'].append(dir_entry.name)
+        elif dir_entry.is_file():
+          stat = dir_entry.stat()
+          old = old_files.get(dir_entry.name)
+          sha1 = None
+          if old and old[0] == stat.st_mtime_ns and old[1] == stat.st_size:
+            sha1 = old[2]
+          entry['files'][dir_entry.name] = [stat.st_mtime_ns, stat.st_size,
+                                            sha1]
+    entry['dirs'].sort()
+    return entry
+
+  def refresh(self):
+    """Bring the index up to date, only listing directories that changed."""
+    new_tree = {}
+    todo = ['.']
+    while todo:
+      relpath = todo.pop()
+      try:
+        mtime = os.stat(self._path(relpath)).st_mtime_ns
+      except OSError:
+        continue
+      entry = self.tree.get(relpath)
+      if not entry or entry['mtime'] != mtime:
+        entry = self._scan_dir(relpath, mtime)
+      new_tree[relpath] = entry
+      todo += [self._join(relpath, name) for name in entry['dirs']]
+    self.tree = new_tree
+
+  def _under(self, under):
+    under = os.path.relpath(under, self.root) if under else '.'
+    for relpath in sorted(self.tree):
+      if under == '.' or relpath == under or relpath.startswith(under + '/'):
+        yield relpath
+
+  def dirs(self, under=None):
+    """Returns the sorted directories at or below `under`."""
+    return list(self._under(under))
+
+  def files(self, pattern=None, under=None):
+    """Returns the sorted files at or below `under` matching the glob."""
+    ret = []
+    for relpath in self._under(under):
+      for name in sorted(self.tree[relpath]['files']):
+        if not pattern or fnmatch.fnmatch(name, pattern):
+          ret.append(self._join(relpath, name))
+    return ret
+
+  def stat(self, relpath):
+    """Returns the file's current (mtime_ns, size)."""
+    dirname, name = os.path.split(relpath)
+    info = self.tree[dirname or '.']['files'][name]
+    stat = os.stat(self._path(relpath))
+    with self._lock:
+      if info[0] != stat.st_mtime_ns or info[1] != stat.st_size:
+        info[:] = [stat.st_mtime_ns, stat.st_size, None]
+    return stat.st_mtime_ns, stat.st_size
+
+  def sha1(self, relpath):
+    """Returns the file's sha1, only re-hashed if it changed."""
+    from . import build_cache
+    dirname, name = os.path.split(relpath)
+    info = self.tree[dirname or '.']['files'][name]
+    stat = os.stat(self._path(relpath))
+    with self._lock:
+      if info[2] and info[0] == stat.st_mtime_ns and info[1] == stat.st_size:
+        return info[2]
+      info[:] = [stat.st_mtime_ns, stat.st_size,
+                 build_cache.hash_file(self._path(relpath))]
+      return info[2]
+
+
+def get(root='.'):
+  """Returns the refreshed index of `root`, built once per process."""
+  key = os.path.abspath(root)
+  with _lock:
+    index = _indexes.get(key)
+    if index is None:
+      index = FileIndex(root)
+      index.load()
+      index.refresh()
+      try:
+        index.save()
+      except OSError:
+        pass
+      _indexes[key] = index
+  return index
+
+
+def forget(root='.'):
+  """Drop the in memory index so the next get() refreshes it."""
+  with _lock:
+    _indexes.pop(os.path.abspath(root), None)
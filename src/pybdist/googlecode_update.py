@@ -6,6 +6,7 @@
 from __future__ import absolute_import
 from __future__ import print_function
 from . import googlecode_upload
+from . import timeline
 import hashlib
 import os
 import sys
@@ -24,11 +25,19 @@ def get_download_list(project_name):
   """
   url = 'http://code.google.com/feeds/p/%s/downloads/basic' % project_name
   try:
-    fin = six.moves.urllib.request.urlopen(url)
-    text = fin.read()
-    fin.close()
+    with timeline.span('GET %s' % url, 'http'):
+      fin = six.moves.urllib.request.urlopen(url)
+      text = fin.read()
+      fin.close()
   except six.moves.urllib.error.URLError:
     text = ''
+  return parse_download_list(project_name, text)
+
+
+def parse_download_list(project_name, text):
+  """Parses the atom feed `text`, see get_download_list()."""
+  if isinstance(text, bytes):
+    text = text.decode('utf-8', 'replace')
   re_entry = re.compile(r'<entry>(.+?)</entry>', re.DOTALL)
 
   lst = []
@@ -88,9 +97,10 @@ def get_file_details(project_name, fname):
       project_name, fname)
   print('Checking SHA1 at %r' % url)
   try:
-    fin = six.moves.urllib.request.urlopen(url, timeout=200)
-    text = fin.read()
-    fin.close()
+    with timeline.span('GET %s' % url, 'http'):
+      fin = six.moves.urllib.request.urlopen(url, timeout=200)
+      text = fin.read()
+      fin.close()
   except six.moves.urllib.error.HTTPError:
     text = ''
   sha1 = _safe_search(r'SHA1 Checksum: ([^<]+)', text, re.DOTALL)
@@ -110,9 +120,10 @@ def get_file_details(project_name, fname):
 def download_file(project_name, fname, dist_dir):
   """Downloads to file to distdir."""
   url = 'http://%s.googlecode.com/files/%s' % (project_name, fname)
-  fin = six.moves.urllib.request.urlopen(url, timeout=200)
-  text = fin.read()
-  fin.close()
+  with timeline.span('GET %s' % url, 'http'):
+    fin = six.moves.urllib.request.urlopen(url, timeout=200)
+    text = fin.read()
+    fin.close()
   outfilename = os.path.join(dist_dir, fname)
   if not os.path.exists(dist_dir):
     os.makedirs(dist_dir)
@@ -139,11 +150,13 @@ def maybe_download_file(project_name, fname, dist_dir):
 
 
 def maybe_upload_file(project_name, dist_dir, fname,
-    summary, labels, username, password):
-  """Verify the checksums."""
+    summary, labels, username, password, sha1=None):
+  """Verify the checksums, `sha1` is the file's if already known."""
   details = get_file_details(project_name, fname)
   dist_filename = os.path.join(dist_dir, fname)
-  if details['sha1']:
+  if details['sha1'] and sha1:
+    hex_digest = sha1
+  elif details['sha1']:
     fin = open(dist_filename, 'rb')
     sha1 = hashlib.sha1()
     sha1.update(fin.read())
@@ -156,8 +169,9 @@ def maybe_upload_file(project_name, dist_dir, fname,
       print('SHA1 checksums don\'t match, uploading %r.' % fname)
     else:
       print('File not there, uploading %r.' % fname)
-    status, reason, url= googlecode_upload.upload(
-      os.path.join(dist_dir, fname), project_name, username, password, summary, labels)
+    with timeline.span('upload %s' % fname, 'http'):
+      status, reason, url= googlecode_upload.upload(
+        os.path.join(dist_dir, fname), project_name, username, password, summary, labels)
     if not url:
       print('%r, %r' % (status, reason))
       print('%r, %r, %r, %r' % (os.path.join(dist_dir, fname), project_name, summary, labels))
@@ -179,9 +193,10 @@ def update_file(info, dist_dir, username, password):
     username: username to use
   """
   print('Updating %s' % info['fname'])
-  googlecode_upload.upload(
-      '%s/%s' % (dist_dir, info['fname']),
-      info['project_name'], username, password, info['summary'], info['labels'])
+  with timeline.span('upload %s' % info['fname'], 'http'):
+    googlecode_upload.upload(
+        '%s/%s' % (dist_dir, info['fname']),
+        info['project_name'], username, password, info['summary'], info['labels'])
 
 
 def remove_featured_labels(project_name, user_name, password, except_list=None):
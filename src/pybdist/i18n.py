@@ -22,19 +22,25 @@ try:
   import polib
 except ImportError:
   raise ImportError('You need to install polib, try sudo "apt-get install python3-polib"')
-import subprocess
 import time
 
+from . import runner
+
+_po_cache = {}
+
 class I18nException(Exception):
   pass
 
-def _run_or_die(args, output=True):
-  """Run the `args` (a list) or dies."""
-  if output:
-    print(' '.join(args))
-  ret = subprocess.call(args)
-  if ret:
-    raise I18nException('Error running: %r' % ' '.join(args))
+def load_po(fname):
+  """Returns the parsed polib file, re-parsed only when the file changes."""
+  stat = os.stat(fname)
+  key = (stat.st_mtime, stat.st_size)
+  cached = _po_cache.get(fname)
+  if cached and cached[0] == key:
+    return cached[1]
+  po = polib.pofile(fname)
+  _po_cache[fname] = (key, po)
+  return po
 
 def build_get_text(out_pot, dirs):
   """Creates .pot file from source python files.
@@ -48,7 +54,7 @@ def build_get_text(out_pot, dirs):
       'pygettext',
       '--output', out_pot,
       ] + dirs
-  _run_or_die(args)
+  runner.run_or_die(args, I18nException)
 
 def make_empty_po_file(fname, lang, setup):
   po = polib.POFile()
@@ -93,15 +99,12 @@ def update_po_files(potfile, locale_dir, langs):
         potfile,
         '-o', outfile
         ]
-    _run_or_die(args)
+    runner.run_or_die(args, I18nException)
   return missing
 
-def compile_po_files(locale_dir, langs):
-  """Convert the .po files into binary .mo files.
-  Args:
-    locale_dir: location of the locale dir
-    langs: list of languages, ex. ['pt_BR', 'fr']
-  """
+def po_files(locale_dir, langs):
+  """Returns the list of (.po, .mo) filenames for the `langs`."""
+  ret = []
   for lang in langs:
     curdir = os.path.join(locale_dir, lang, 'LC_MESSAGES')
     if not os.path.exists(curdir):
@@ -110,12 +113,27 @@ def compile_po_files(locale_dir, langs):
     for fname in files:
       if fname.endswith('.po'):
         fname_mo = fname.replace('.po', '.mo')
-        args = [
-            'msgfmt',
-            os.path.join(curdir, fname),
-            '-o', os.path.join(curdir, fname_mo)
-            ]
-        _run_or_die(args)
+        ret.append((os.path.join(curdir, fname),
+                    os.path.join(curdir, fname_mo)))
+  return ret
+
+def compile_po_file(fname_po, fname_mo):
+  """Convert one .po file into a binary .mo file."""
+  args = [
+      'msgfmt',
+      fname_po,
+      '-o', fname_mo
+      ]
+  runner.run_or_die(args, I18nException)
+
+def compile_po_files(locale_dir, langs):
+  """Convert the .po files into binary .mo files.
+  Args:
+    locale_dir: location of the locale dir
+    langs: list of languages, ex. ['pt_BR', 'fr']
+  """
+  for fname_po, fname_mo in po_files(locale_dir, langs):
+    compile_po_file(fname_po, fname_mo)
 
 def count_untranslated(locale_dir, langs):
   for lang in langs:
@@ -125,8 +143,10 @@ def count_untranslated(locale_dir, langs):
     files = os.listdir(curdir)
     for fname in files:
       if fname.endswith('.po'):
-        pofilename = os.path.join(curdir, fname)
-        po = polib.pofile(pofilename)
-        un = po.untranslated_entries()
-        if un:
-          print('%r has %d untranslated entries' % (pofilename, len(un)))
+        count_untranslated_file(os.path.join(curdir, fname))
+
+def count_untranslated_file(pofilename):
+  un = load_po(pofilename).untranslated_entries()
+  if un:
+    print('%r has %d untranslated entries' % (pofilename, len(un)))
+  return len(un)
@@ -0,0 +1,151 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Journal of the finished steps, so a failed command can be resumed.
+
+Each command (--dist, --upload, ...) records its finished steps, build
+targets and uploaded files in .pybdist/journal.json under the project's
+name and version, with a fingerprint of what the step depended on (the
+names, sizes and mtimes of its files).  Running the command again with
+--resume skips what was finished with the same fingerprint and carries
+on at the step or file that failed.  Without --resume the command's
+entries are cleared and it starts over.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+__author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+JOURNAL_FILE = '.pybdist/journal.json'
+
+_journal = None
+
+
+class Journal(object):
+  """The entries of one command for one project and version."""
+
+  def __init__(self, project, version, command, fname=JOURNAL_FILE):
+    self.key = '%s %s' % (project, version)
+    self.project = project
+    self.command = command
+    self.fname = fname
+    self.resume = False
+    self.skipped = 0
+    self._data = {}
+    self._lock = threading.Lock()
+
+  def load(self):
+    if os.path.exists(self.fname):
+      try:
+        with open(self.fname) as fin:
+          self._data = json.load(fin)
+      except ValueError:
+        self._data = {}
+    # Only keep the current version of this project.
+    for key in list(self._data):
+      if key.split(' ')[0] == self.project and key != self.key:
+        del self._data[key]
+
+  def _save(self):
+    dirname = os.path.dirname(self.fname)
+    if dirname and not os.path.isdir(dirname):
+      os.makedirs(dirname, exist_ok=True)
+    with open(self.fname + '.tmp', 'w') as fout:
+      json.dump(self._data, fout, indent=1, sort_keys=True)
+    os.rename(self.fname + '.tmp', self.fname)
+
+  def _entries(self):
+    return self._data.setdefault(self.key, {}).setdefault(self.command, {})
+
+  def start(self, resume):
+    """Start the command, clearing its old entries unless resuming."""
+    self.resume = resume
+    with self._lock:
+      if not resume:
+        self._data.setdefault(self.key, {})[self.command] = {}
+        self._save()
+      elif self._entries():
+        print('Resuming %s, %d steps already done' % (self.command,
+                                                      len(self._entries())))
+
+  def is_done(self, name, fingerprint):
+    """True if resuming and `name` finished with the same fingerprint."""
+    if not self.resume:
+      return False
+    with self._lock:
+      entry = self._entries().get(name)
+    if entry and entry['fingerprint'] == fingerprint:
+      self.skipped += 1
+      return True
+    return False
+
+  def done(self, name, fingerprint):
+    with self._lock:
+      self._entries()[name] = dict(fingerprint=fingerprint, time=time.time())
+      self._save()
+
+  def call(self, name, fingerprint, func, *args):
+    """Run func(*args) unless it's done, record it when it returns."""
+    if self.is_done(name, fingerprint):
+      print('%s already done, skipped' % name)
+      return None
+    try:
+      ret = func(*args)
+    except BaseException:
+      print('** %s failed, rerun with --resume to continue from there' % name)
+      raise
+    self.done(name, fingerprint)
+    return ret
+
+
+def fingerprint(paths, extra=None):
+  """Hash of `extra` and the names, sizes and mtimes of the files in `paths`.
+
+  `paths` are files, directories or globs, like build_cache inputs.
+  """
+  from . import build_cache
+  hasher = hashlib.sha1(repr(extra).encode('utf-8'))
+  for path in paths:
+    for fname in build_cache._input_files(path):
+      stat = os.stat(fname)
+      hasher.update(('\0%s\0%d\0%d' % (fname, stat.st_size,
+                                       stat.st_mtime_ns)).encode('utf-8'))
+  return hasher.hexdigest()
+
+
+def start(setup, command, resume=False, fname=JOURNAL_FILE):
+  """Start the journal of `command` for this project, see current()."""
+  global _journal
+  _journal = Journal(setup.NAME, setup.VER, command, fname)
+  _journal.load()
+  _journal.start(resume)
+  return _journal
+
+
+def current():
+  """The journal of the running command, or None."""
+  return _journal
+
+
+def stop():
+  global _journal
+  _journal = None
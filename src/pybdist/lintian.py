@@ -0,0 +1,220 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Runs lintian on built .deb files, in the background if asked.
+
+LINTIAN in setup.py chooses when:
+  'inline'  debuild runs lintian itself (the default).
+  'async'   debuild runs with --no-lintian, lintian checks the .deb in a
+            background thread while the other steps go on.
+  'off'     no lintian at all.
+
+Findings are written to .pybdist/lintian/<deb>.txt and cached in
+<build cache dir>/lintian by the .deb's sha1, lintian's version and
+LINTIAN_ARGS, an identical .deb isn't checked twice by the same lintian.
+The cached findings are trimmed to CACHE_SIZE bytes, least recently used
+first.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+__author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
+
+import hashlib
+import os
+import threading
+
+from . import runner
+
+LINTIAN_ARGS = ['lintian', '--info', '--display-info', '--display-experimental']
+REPORT_DIR = '.pybdist/lintian'
+MODES = ['inline', 'async', 'off']
+CACHE_SIZE = 16 * 1024 * 1024
+
+_pending = []
+_lock = threading.Lock()
+_version = None
+
+
+class LintianException(Exception):
+  pass
+
+
+def get_mode(setup):
+  mode = getattr(setup, 'LINTIAN', None) or 'inline'
+  if mode not in MODES:
+    raise LintianException('LINTIAN must be one of %r, not %r' % (MODES, mode))
+  return mode
+
+
+def _cache_dir(build_cache_dir=None):
+  from . import build_cache
+  return os.path.join(build_cache.BuildCache(build_cache_dir).cache_dir,
+                      'lintian')
+
+
+def lintian_version():
+  """Returns `lintian --version`, run once."""
+  global _version
+  # Not under _lock, start() shouldn't wait for it.  Two threads may both
+  # run it the first time, which is harmless.
+  if _version is None:
+    result = runner.run(['lintian', '--version'], False, echo=False)
+    if result.returncode:
+      raise LintianException('lintian --version failed with code %r' %
+                             result.returncode)
+    _version = '\n'.join(result.lines).strip()
+  return _version
+
+
+def _cache_key(deb_name):
+  """The .deb's sha1, with the lintian version and arguments that check it."""
+  from . import build_cache
+  hasher = hashlib.sha1(repr((lintian_version(), LINTIAN_ARGS)).encode('utf-8'))
+  hasher.update(build_cache.hash_file(deb_name).encode('utf-8'))
+  return hasher.hexdigest()
+
+
+def _evict(cache_dir, max_size=None):
+  """Remove the least recently used findings until under `max_size`."""
+  max_size = max_size or CACHE_SIZE
+  entries = []
+  with os.scandir(cache_dir) as dir_entries:
+    for entry in dir_entries:
+      if entry.name.endswith('.txt') and entry.is_file():
+        stat = entry.stat()
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+  entries.sort()
+  total = sum(size for _, size, _ in entries)
+  while entries and total > max_size:
+    _, size, fname = entries.pop(0)
+    try:
+      os.unlink(fname)
+    except OSError:
+      pass
+    total -= size
+
+
+def report_name(deb_name, report_dir=REPORT_DIR):
+  return os.path.join(report_dir, os.path.basename(deb_name) + '.txt')
+
+
+def _write(fname, lines):
+  dirname = os.path.dirname(fname)
+  if dirname:
+    os.makedirs(dirname, exist_ok=True)
+  with open(fname + '.tmp', 'w') as fout:
+    fout.write(''.join(line + '\n' for line in lines))
+  os.rename(fname + '.tmp', fname)
+
+
+def check(deb_name, build_cache_dir=None, report_dir=REPORT_DIR):
+  """Run lintian on `deb_name`, unless this exact .deb was checked before.
+  Returns:
+    (list of lintian's lines, True if they came from the cache)
+  """
+  cached = os.path.join(_cache_dir(build_cache_dir),
+                        _cache_key(deb_name) + '.txt')
+  try:
+    with open(cached) as fin:
+      lines = fin.read().splitlines()
+  except FileNotFoundError:
+    pass
+  else:
+    os.utime(cached)  # last used, see _evict()
+    _write(report_name(deb_name, report_dir), lines)
+    return lines, True
+  result = runner.run(LINTIAN_ARGS + [deb_name], echo=False, step='lintian')
+  # 1 means it found errors, anything else is lintian itself failing.
+  if result.returncode not in (0, 1):
+    raise LintianException('lintian failed with code %r on %r:\n%s' % (
+        result.returncode, deb_name, '\n'.join(result.lines[-20:])))
+  _write(cached, result.lines)
+  _evict(os.path.dirname(cached))
+  _write(report_name(deb_name, report_dir), result.lines)
+  return result.lines, False
+
+
+def _summary(deb_name, lines, from_cache, report_dir):
+  counts = {}
+  for line in lines:
+    kind = line.split(':', 1)[0]
+    if len(kind) == 1:
+      counts[kind] = counts.get(kind, 0) + 1
+  print('%s lintian %s: %d error(s), %d warning(s)%s, see %r' % (
+      '**' if counts.get('E') else '  ', os.path.basename(deb_name),
+      counts.get('E', 0), counts.get('W', 0),
+      ' (cached)' if from_cache else '', report_name(deb_name, report_dir)))
+  return counts.get('E', 0)
+
+
+def run(deb_name, build_cache_dir=None, report_dir=REPORT_DIR):
+  """Check `deb_name` now and print the summary.
+  Returns:
+    number of errors
+  """
+  lines, from_cache = check(deb_name, build_cache_dir, report_dir)
+  return _summary(deb_name, lines, from_cache, report_dir)
+
+
+def start(deb_name, build_cache_dir=None, report_dir=REPORT_DIR):
+  """Check `deb_name` in a background thread, see wait()."""
+  job = dict(deb_name=deb_name, report_dir=report_dir, lines=None,
+             from_cache=False, error=None)
+  def _check():
+    try:
+      job['lines'], job['from_cache'] = check(deb_name, build_cache_dir,
+                                              report_dir)
+    except (OSError, LintianException) as err:
+      job['error'] = err
+  job['thread'] = threading.Thread(target=_check, name='lintian')
+  job['thread'].daemon = True
+  job['thread'].start()
+  with _lock:
+    _pending.append(job)
+
+
+def wait():
+  """Wait for the background checks and print their summaries.
+  Returns:
+    number of errors found
+  """
+  with _lock:
+    jobs = list(_pending)
+    del _pending[:]
+  errors = 0
+  for job in jobs:
+    job['thread'].join()
+    if job['error']:
+      print('** lintian on %r failed: %s' % (job['deb_name'], job['error']))
+      continue
+    errors += _summary(job['deb_name'], job['lines'], job['from_cache'],
+                       job['report_dir'])
+  return errors
+
+
+def after_build(setup, deb_name, project_dir='.'):
+  """Run lintian on a .deb that was built without it, as LINTIAN says."""
+  mode = get_mode(setup)
+  cache_dir = getattr(setup, 'BUILD_CACHE_DIR', None)
+  report_dir = os.path.join(project_dir, REPORT_DIR)
+  if mode == 'async':
+    start(deb_name, cache_dir, report_dir)
+  elif mode == 'inline':
+    try:
+      run(deb_name, cache_dir, report_dir)
+    except OSError as err:
+      print('** Unable to run lintian: %s' % err)
@@ -24,7 +24,7 @@ import netrc
 import re
 import smtplib
 
-from . import release
+from . import metadata
 
 gettext.install('pybdist')
 logging.basicConfig()
@@ -49,12 +49,7 @@ Thanks,
 """)
 
 def create_message(setup):
-  if hasattr(setup, 'RELEASE_FORMAT'):
-    release_regex = setup.RELEASE_FORMAT
-  else:
-    release_regex = None
-  rel_ver, rel_date, rel_lines = release.parse_last_release(
-      setup.RELEASE_FILE, release_regex)
+  rel_ver, rel_date, rel_lines = metadata.get(setup).release
   urls = [
     'Homepage: %s' % setup.SETUP['url'],
     ]
@@ -0,0 +1,252 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Writes man pages straight from an optparse.OptionParser.
+
+A replacement for running help2man on the program once per language.
+MAN_PARSER in setup.py says where the parser comes from:
+
+  MAN_PARSER = 'standard'         # the parser of add_standard_options()
+  MAN_PARSER = myprog.make_parser # a function returning an OptionParser
+
+The help texts are translated with the project's .mo files, so build the
+parser with the untranslated strings.  The .include files use help2man's
+format ([SECTION] followed by text, [<SECTION] to prepend and [>SECTION]
+to append to a generated section).
+
+Each page starts with a comment holding a signature of the parser, the
+include file and the translations; unchanged pages aren't rewritten.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+__author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
+
+import gettext
+import hashlib
+import optparse
+import os
+import re
+import time
+
+SIGNATURE_PREFIX = '.\\" pybdist-signature: '
+# help2man's order, sections not listed go before AUTHOR.
+SECTION_ORDER = ['NAME', 'SYNOPSIS', 'DESCRIPTION', 'OPTIONS', 'ENVIRONMENT',
+                 'FILES', 'EXAMPLES', '*', 'AUTHOR', 'REPORTING BUGS',
+                 'COPYRIGHT', 'SEE ALSO']
+
+
+class ManPageException(Exception):
+  pass
+
+
+def get_parser(setup):
+  """Returns the OptionParser MAN_PARSER points to, or None."""
+  source = getattr(setup, 'MAN_PARSER', None)
+  if not source:
+    return None
+  if source == 'standard':
+    from . import pybdist
+    parser = optparse.OptionParser(prog=setup.NAME)
+    pybdist.add_standard_options(parser, setup)
+    return parser
+  if isinstance(source, optparse.OptionParser):
+    return source
+  if callable(source):
+    return source()
+  raise ManPageException('MAN_PARSER should be \'standard\', an OptionParser '
+                         'or a function returning one, not %r' % source)
+
+
+def roff_escape(text):
+  """Escape text for roff, keeping line starts from being requests."""
+  text = text.replace('\\', '\\e').replace('-', '\\-')
+  return re.sub(r'(?m)^([.\'])', r'\\&\1', text)
+
+
+def _option_names(option):
+  names = []
+  for opt in option._short_opts + option._long_opts:
+    name = '\\fB%s\\fR' % roff_escape(opt)
+    if option.takes_value():
+      metavar = option.metavar or option.dest.upper()
+      sep = ' ' if opt in option._short_opts else '='
+      name += '%s\\fI%s\\fR' % (sep, roff_escape(metavar))
+    names.append(name)
+  return ', '.join(names)
+
+
+def _option_help(parser, option, translate):
+  text = translate(option.help or '')
+  if '%default' in text:
+    default = parser.defaults.get(option.dest)
+    text = text.replace('%default', str(default))
+  return roff_escape(text)
+
+
+def _options_section(parser, translate):
+  lines = []
+  def _add(options):
+    for option in options:
+      if option.help == optparse.SUPPRESS_HELP:
+        continue
+      lines.extend(['.TP', _option_names(option),
+                    _option_help(parser, option, translate)])
+  _add(parser.option_list)
+  for group in parser.option_groups:
+    lines.append('.SS "%s"' % roff_escape(translate(group.title)))
+    if group.description:
+      lines.append(roff_escape(translate(group.description)))
+    _add(group.option_list)
+  return '\n'.join(lines)
+
+
+def parse_include(text):
+  """Returns [(mode, SECTION, text)] from a help2man include file.
+
+  mode is '' to replace, '<' to prepend or '>' to append.
+  """
+  ret = []
+  for line in text.splitlines():
+    grps = re.match(r'^\[([<>=]?)\s*([^\]]+?)\s*\]\s*$', line)
+    if grps:
+      ret.append([grps.group(1).replace('=', ''), grps.group(2).upper(), []])
+    elif ret:
+      ret[-1][2].append(line)
+  return [(mode, name, '\n'.join(lines).strip('\n')) for mode, name, lines in ret]
+
+
+def _order(name):
+  if name in SECTION_ORDER:
+    return SECTION_ORDER.index(name)
+  return SECTION_ORDER.index('*')
+
+
+def render(parser, setup, lang='', include_text=''):
+  """Returns the man page text, without the signature line."""
+  translate = _translator(setup, lang)
+  prog = parser.prog or setup.NAME
+  usage = parser.usage or '%prog [options]'
+  usage = re.sub(r'^[Uu]sage:\s*', '', translate(usage).replace('%prog', prog))
+  description = parser.description or setup.SETUP.get('description', '')
+  sections = {
+    'NAME': '%s \\- %s' % (roff_escape(prog), roff_escape(
+        translate(setup.SETUP.get('description', '')))),
+    'SYNOPSIS': '.B %s\n%s' % (roff_escape(prog), roff_escape(
+        usage[len(prog):].strip() if usage.startswith(prog) else usage)),
+    'DESCRIPTION': roff_escape(translate(description)),
+    'OPTIONS': _options_section(parser, translate),
+  }
+  if setup.SETUP.get('author'):
+    sections['AUTHOR'] = 'Written by %s.' % roff_escape(setup.SETUP['author'])
+  for mode, name, text in parse_include(include_text):
+    old = sections.get(name, '')
+    if mode == '<' and old:
+      text = text + '\n.PP\n' + old
+    elif mode == '>' and old:
+      text = old + '\n.PP\n' + text
+    sections[name] = text
+  date = time.strftime('%B %Y', time.gmtime(
+      int(os.environ.get('SOURCE_DATE_EPOCH') or time.time())))
+  lines = ['.TH %s "1" "%s" "%s %s" "User Commands"' % (
+      prog.upper(), date, prog, setup.VER)]
+  for name in sorted(sections, key=_order):
+    if sections[name]:
+      lines.append('.SH %s' % name)
+      lines.append(sections[name])
+  return '\n'.join(lines) + '\n'
+
+
+def _mo_file(setup, lang):
+  if not lang:
+    return None
+  return os.path.join(setup.DIR, 'locale', lang, 'LC_MESSAGES',
+                      '%s.mo' % setup.NAME)
+
+
+def _translator(setup, lang):
+  if not lang:
+    return lambda text: text
+  trans = gettext.translation(setup.NAME, os.path.join(setup.DIR, 'locale'),
+                              [lang], fallback=True)
+  return lambda text: trans.gettext(text) if text else text
+
+
+def signature(parser, setup, lang, include_text):
+  """A hash of everything that goes into the page, except the date."""
+  hasher = hashlib.sha1()
+  def _add(value):
+    hasher.update(repr(value).encode('utf-8'))
+    hasher.update(b'\0')
+  _add((parser.prog, parser.usage, parser.description, setup.NAME, setup.VER,
+        setup.SETUP.get('description'), setup.SETUP.get('author'), lang,
+        include_text, sorted(parser.defaults.items(), key=repr)))
+  options = list(parser.option_list)
+  for group in parser.option_groups:
+    _add((group.title, group.description))
+    options += group.option_list
+  for option in options:
+    _add((option._short_opts, option._long_opts, option.metavar, option.help,
+          option.dest, option.takes_value()))
+  mo_file = _mo_file(setup, lang)
+  if mo_file and os.path.exists(mo_file):
+    with open(mo_file, 'rb') as fin:
+      hasher.update(fin.read())
+  return hasher.hexdigest()
+
+
+def _current_signature(manfile):
+  if not os.path.exists(manfile):
+    return None
+  with open(manfile) as fin:
+    first = fin.readline().rstrip('\n')
+  if first.startswith(SIGNATURE_PREFIX):
+    return first[len(SIGNATURE_PREFIX):]
+  return None
+
+
+def write_page(parser, setup, lang, manfile, include_file=None):
+  """Write `manfile` unless it's already up to date.
+  Returns:
+    True if the file was written.
+  """
+  include_text = ''
+  if include_file and os.path.exists(include_file):
+    with open(include_file) as fin:
+      include_text = fin.read()
+  sig = signature(parser, setup, lang, include_text)
+  if _current_signature(manfile) == sig:
+    print('   %s is up to date' % manfile)
+    return False
+  text = SIGNATURE_PREFIX + sig + '\n' + render(parser, setup, lang,
+                                                 include_text)
+  with open(manfile + '.tmp', 'w') as fout:
+    fout.write(text)
+  os.rename(manfile + '.tmp', manfile)
+  print('Wrote %s' % manfile)
+  return True
+
+
+def write_pages(parser, setup, pages, jobs=None):
+  """Write the [(lang, manfile, include_file)] pages concurrently.
+  Returns:
+    number of pages written
+  """
+  from concurrent import futures
+  with futures.ThreadPoolExecutor(jobs or len(pages) or 1) as pool:
+    results = [pool.submit(write_page, parser, setup, lang, manfile, include)
+               for lang, manfile, include in pages]
+    return sum(1 for result in results if result.result())
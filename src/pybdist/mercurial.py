@@ -19,7 +19,7 @@ from __future__ import absolute_import
 from __future__ import print_function
 __author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
 
-import subprocess
+from . import runner
 
 def _run_ret(args, output=True):
   """Run the `args` (a list)
@@ -32,13 +32,10 @@ def _run_ret(args, output=True):
     retcode, lines
   """
   lines = []
-  if output:
-    print(' '.join(args))
   try:
-    p = subprocess.Popen(args, stdout=subprocess.PIPE)
-    text = p.communicate()[0]
-    lines = str(text).split('\n')
-    ret = p.returncode
+    result = runner.run(args, output, echo=False)
+    lines = result.lines
+    ret = result.returncode
   except OSError as oserr:
     ret = -999
   return (ret, lines)
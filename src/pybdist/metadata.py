@@ -0,0 +1,102 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Snapshot of the project's version information.
+
+The version and release notes are spread over setup.py, the source's
+__version__, RELEASE.rst and debian/changelog.  ProjectMetadata reads and
+parses each of these once and only reads them again if the file's mtime or
+size changes (ex. after _fix_versions_notes() rewrote it).
+
+Use get(setup) to get the snapshot shared by every step.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+__author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
+
+import os
+import re
+import threading
+
+from . import release
+
+CHANGELOG_FILE = 'debian/changelog'
+_RE_PY_VER = re.compile(r'__version__\s*=\s*[\'"](.*)[\'"]')
+
+
+def _stat_key(fname):
+  stat = os.stat(fname)
+  return (stat.st_mtime_ns, stat.st_size)
+
+
+def parse_py_version(fname):
+  """Returns the __version__ found in the python file or None."""
+  with open(fname) as fin:
+    grps = _RE_PY_VER.search(fin.read())
+  if not grps:
+    return None
+  return grps.group(1)
+
+
+class ProjectMetadata(object):
+  """Parsed version information, re-parsed only when a file changes."""
+
+  def __init__(self, setup):
+    self.setup = setup
+    self._cache = {}
+    self._lock = threading.Lock()
+
+  def _get(self, fname, parser, *args):
+    """Returns parser(fname, *args) from the cache if fname is unchanged."""
+    key = _stat_key(fname)
+    with self._lock:
+      cached = self._cache.get(fname)
+      if cached and cached[0] == key:
+        return cached[1]
+      value = parser(fname, *args)
+      self._cache[fname] = (key, value)
+      return value
+
+  @property
+  def source_file(self):
+    return os.path.join(self.setup.DIR, self.setup.PY_SRC)
+
+  @property
+  def source_version(self):
+    """The __version__ in the main source file, or None."""
+    return self._get(self.source_file, parse_py_version)
+
+  @property
+  def release(self):
+    """(version, date, lines) of the last release in RELEASE_FILE."""
+    return self._get(self.setup.RELEASE_FILE, release.parse_last_release,
+                     getattr(self.setup, 'RELEASE_FORMAT', None))
+
+  @property
+  def changelog(self):
+    """(version, date, lines) of the last entry in debian/changelog."""
+    return self._get(CHANGELOG_FILE, release.parse_deb_changelog)
+
+
+def get(setup):
+  """Returns the ProjectMetadata for this setup module, made once."""
+  # Private name, setup.py may well have its own `metadata`.
+  snapshot = getattr(setup, '_pybdist_metadata', None)
+  if snapshot is None or snapshot.setup is not setup:
+    snapshot = ProjectMetadata(setup)
+    setup._pybdist_metadata = snapshot
+  return snapshot
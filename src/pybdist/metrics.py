@@ -0,0 +1,167 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Keeps a history of how long each pipeline run took.
+
+After each run one JSON line is appended to .pybdist/metrics.jsonl with the
+duration of every step, the resource usage of every command and the size
+of every artifact in dist/.  report() compares the latest run of each
+step against the median of the runs before it.  Steps served by the build
+cache (or skipped by --resume) are kept in their own '<step> (cached)'
+series, so a cache hit doesn't lower the median real builds are held to.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+__author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
+
+import glob
+import json
+import os
+import time
+
+from . import runner
+from . import timeline
+
+METRICS_FILE = '.pybdist/metrics.jsonl'
+# Flag steps this much slower than the median, 0.25 is 25%.
+DEFAULT_THRESHOLD = 0.25
+# How many earlier runs make up the rolling median.
+WINDOW = 10
+
+
+def _median(values):
+  values = sorted(values)
+  mid = len(values) // 2
+  if len(values) % 2:
+    return values[mid]
+  return (values[mid - 1] + values[mid]) / 2.0
+
+
+def make_record(setup, command, success):
+  """Collect this run's timings from the timeline and runner."""
+  steps = {}
+  cache = {}
+  for span in timeline.SPANS:
+    if span.cat in ('step', 'http'):
+      steps[span.name] = steps.get(span.name, 0.0) + span.duration
+    elif span.cat == 'cache':
+      cache[span.name] = span.args.get('outcome')
+  commands = []
+  for result in runner.RESULTS:
+    commands.append(dict(
+        cmd=' '.join(result.args), step=result.step,
+        wall=round(result.wall_time, 3), cpu=round(result.cpu_time, 3),
+        max_rss=result.max_rss, returncode=result.returncode))
+  artifacts = {}
+  for pattern in ('dist/%s-%s.*' % (setup.NAME, setup.VER),
+                  'dist/%s_%s*.deb' % (setup.DEB_NAME, setup.VER)):
+    for fname in glob.glob(pattern):
+      artifacts[os.path.basename(fname)] = os.path.getsize(fname)
+  return dict(time=time.time(), name=setup.NAME, version=setup.VER,
+              command=command, success=success,
+              steps=dict((key, round(val, 3)) for key, val in steps.items()),
+              cache=cache,
+              commands=commands, artifacts=artifacts)
+
+
+def append(record, fname=None):
+  fname = fname or METRICS_FILE
+  dirname = os.path.dirname(fname)
+  if dirname and not os.path.isdir(dirname):
+    os.makedirs(dirname, exist_ok=True)
+  with open(fname, 'a') as fout:
+    fout.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+def load(fname=None):
+  """Returns the list of records, oldest first."""
+  fname = fname or METRICS_FILE
+  records = []
+  if not os.path.exists(fname):
+    return records
+  for line in open(fname):
+    line = line.strip()
+    if not line:
+      continue
+    try:
+      records.append(json.loads(line))
+    except ValueError:
+      print('Skipping bad line in %r' % fname)
+  return records
+
+
+def _step_series(records):
+  """Returns {step: [seconds oldest first]}, cached runs as '<step> (cached)'."""
+  ret = {}
+  for record in records:
+    if not record.get('success', True):
+      continue
+    cache = record.get('cache', {})
+    for name, value in record.get('steps', {}).items():
+      if cache.get(name, 'built') != 'built':
+        name += ' (cached)'
+      ret.setdefault(name, []).append(value)
+  return ret
+
+
+def find_regressions(records, threshold=DEFAULT_THRESHOLD, window=WINDOW):
+  """Returns list of (name, last, median) for steps slower than median."""
+  ret = []
+  for name, values in sorted(_step_series(records).items()):
+    if len(values) < 2:
+      continue
+    median = _median(values[-window - 1:-1])
+    if median > 0 and values[-1] > median * (1 + threshold):
+      ret.append((name, values[-1], median))
+  return ret
+
+
+def report(setup, threshold=None, fname=None):
+  """Print trends per step and artifact.
+  Returns:
+    list of regressions, see find_regressions()
+  """
+  if threshold is None:
+    threshold = DEFAULT_THRESHOLD
+  records = [rec for rec in load(fname) if rec.get('name') == setup.NAME]
+  if not records:
+    print('No metrics recorded yet in %r' % (fname or METRICS_FILE))
+    return []
+  print('%-40s %5s %9s %9s %8s' % ('Step', 'Runs', 'Median(s)', 'Last(s)',
+                                   'Change'))
+  for name, values in sorted(_step_series(records).items()):
+    median = _median(values[-WINDOW - 1:-1] or values)
+    change = (values[-1] - median) / median * 100 if median else 0.0
+    print('%-40s %5d %9.2f %9.2f %+7.1f%%' % (
+        name[:40], len(values), median, values[-1], change))
+  print()
+  print('%-40s %12s %12s' % ('Artifact', 'Previous', 'Last'))
+  sizes = {}
+  for record in records:
+    for name, size in record.get('artifacts', {}).items():
+      name = name.replace(record['version'], '<ver>')
+      sizes.setdefault(name, []).append(size)
+  for name, values in sorted(sizes.items()):
+    prev = values[-2] if len(values) > 1 else values[-1]
+    print('%-40s %12d %12d' % (name[:40], prev, values[-1]))
+  regressions = find_regressions(records, threshold)
+  print()
+  for name, last, median in regressions:
+    print('** %s slowed to %.2fs from a median of %.2fs' % (name, last, median))
+  if not regressions:
+    print('   No step slowed more than %d%%' % (threshold * 100))
+  return regressions
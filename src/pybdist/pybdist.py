@@ -24,38 +24,43 @@ You'll also need ~/.netrc ~/.ssh/<fname>
 
 from __future__ import absolute_import
 from __future__ import print_function
-from six.moves import zip
-from six.moves import input
 __author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
 __version__ = '0.3.1'
 
 import codecs
+import functools
 import getpass
 import glob
-import six.moves.http_client
 import netrc
 import os
-import re
 from . import release
 import shutil
-import simplejson
-import subprocess
-import twitter
+import time
 
+# Heavy modules (twitter, http, apt, polib, ...) are imported by the
+# functions that need them so small commands start quickly.
 from . import debian
-from . import documents
-from . import googlecode_update
-from . import i18n
-from . import mailinglist
+from . import file_index
+from . import journal
 from . import mercurial
-from . import pypi_list
+from . import metadata
+from . import metrics
 from . import rst_check
+from . import runner
+from . import scheduler
 from . import spell_check
+from . import timeline
 from . import update_file
 
 class PyBdistException(Exception):
   pass
 
+_build_cache = None
+# Steps with side effects that --resume skips once done.
+JOURNAL_STEPS = ['update_apt_repo', 'git_import_orig', 'upload_to_google_code',
+                 'upload_to_pypi', 'mail', 'announce_on_freshmeat',
+                 'announce_on_twitter']
+
 
 def fixup_setup(setup):
   """Fill in any missing pieces from setup."""
@@ -69,35 +74,15 @@ def fixup_setup(setup):
     setup.AUTHOR_NAME = setup.SETUP['author']
   if not hasattr(setup, 'GOOGLE_CODE_EMAIL'):
     setup.GOOGLE_CODE_EMAIL = setup.SETUP['author_email']
+  runner.configure(_get_var(setup, 'LOG_DIR'), _get_var(setup, 'COMMAND_TIMEOUT'))
+  metadata.get(setup)
   return setup
 
-def _run_or_die(args, err_mess=None, output=True):
-  """Run the `args` (a list) or die.
-  Args:
-    args: list of arguments to pass to call
-    err_mess: Extra hint what went wrong.
-    output: output the command before running
-  """
-  if output:
-    print((' '.join(args)))
-  try:
-    ret = subprocess.call(args)
-  except OSError as oserr:
-    mess = 'Error running: %r: %r' % (' '.join(args), oserr)
-    if err_mess:
-      mess += '\n' + err_mess
-    raise PyBdistException(err_mess)
-  if ret:
-    raise PyBdistException('Error running: code %r\n%r' % (ret, ' '.join(args)))
-
-
 def _get_py_source_version(setup):
-  fname = os.path.join(setup.DIR, setup.PY_SRC)
-  re_py_ver = re.compile(r'__version__\s*=\s*[\'"](.*)[\'"]')
-  grps = re_py_ver.search(open(fname).read())
-  if not grps:
-    raise PyBdistException('Unable to find __version__ in %r' % fname)
-  source_ver = grps.group(1)
+  source_ver = metadata.get(setup).source_version
+  if not source_ver:
+    raise PyBdistException('Unable to find __version__ in %r' %
+                           os.path.join(setup.DIR, setup.PY_SRC))
   return source_ver
 
 
@@ -108,8 +93,7 @@ def get_and_verify_versions(setup):
 
   rel_ver, _, _ = _parse_last_release(setup)
 
-  changelog_ver, _, _ = release.parse_deb_changelog(
-      'debian/changelog')
+  changelog_ver, _, _ = metadata.get(setup).changelog
 
   if (setup_ver != source_ver or setup_ver != rel_ver
       or setup_ver != changelog_ver):
@@ -124,6 +108,7 @@ def get_and_verify_versions(setup):
 
 def verify_remote_versions(setup):
   """Examine the remote versions."""
+  from . import pypi_list
   setup_ver = setup.VER
   gc_ver, _, _ = release.get_last_google_code_version(setup.NAME)
   pypi_ver, _, _ = pypi_list.get_latest_version(setup.NAME)
@@ -143,9 +128,7 @@ def _parse_last_release(setup):
   Returns:
     rel_ver, relase_date, rel_lines
   """
-  release_regex = _get_var(setup, 'RELEASE_FORMAT')
-  return release.parse_last_release(
-      setup.RELEASE_FILE, release_regex)
+  return metadata.get(setup).release
 
 
 def parse_last_release(setup):
@@ -153,33 +136,51 @@ def parse_last_release(setup):
   return rel_date, rel_lines
 
 
-def build_zip_tar(unused_setup):
-  args = [
-    'python', 'setup.py', 'sdist', '--formats=gztar,zip']
-  _run_or_die(args, 'Error building sdist')
+def build_zip_tar(setup):
+  if _get_var(setup, 'SDIST_BUILDER') == 'builtin':
+    from . import sdist
+    sdist.build(setup.SETUP,
+                compression=_get_var(setup, 'SDIST_COMPRESSION'))
+  else:
+    args = [
+      'python', 'setup.py', 'sdist', '--formats=gztar,zip']
+    runner.run_or_die(args, PyBdistException, 'Error building sdist')
   print('Built zip and tar')
 
 
-def upload_to_pypi(unused_setup):
-  args = [
-    'python', 'setup.py', 'sdist', '--formats=zip', 'upload',]
-  _run_or_die(args, '\n'.join([
+def build_zipapp(setup):
+  from . import bundle
+  return bundle.build(setup.SETUP, setup.ZIPAPP_MAIN,
+                      python=_get_var(setup, 'ZIPAPP_PYTHON') or
+                      bundle.DEFAULT_PYTHON)
+
+
+def upload_to_pypi(setup):
+  if _get_var(setup, 'SDIST_BUILDER') == 'builtin':
+    # Upload the zip --dist already built instead of building it again.
+    zip_name = 'dist/%s-%s.zip' % (setup.NAME, setup.VER)
+    if not os.path.exists(zip_name):
+      build_zip_tar(setup)
+    args = ['twine', 'upload', zip_name]
+  else:
+    args = [
+      'python', 'setup.py', 'sdist', '--formats=zip', 'upload',]
+  # Not captured, twine and upload prompt for the password.
+  runner.run_or_die(args, PyBdistException, '\n'.join([
       'Error uploading to pypi',
-      'If it\'s the first time, run "python setup.py register"']))
+      'If it\'s the first time, run "python setup.py register"']),
+      capture=False)
   print('Upload to pypi')
 
 
-def build_man(setup):
+def _man_pages(setup):
+  """Returns the list of (lang, manfile, include_file) to build."""
   if not hasattr(setup, 'MAN_FILE') or not setup.MAN_FILE:
-    return
-
-  dest_dir = os.path.dirname(setup.MAN_FILE)
-  if not os.path.isdir(dest_dir):
-    print('Making directory %r' % dest_dir)
-    os.makedirs(dest_dir)
+    return []
   langs = ['']
   if hasattr(setup, 'LANGS'):
     langs += setup.LANGS
+  ret = []
   for lang in langs:
     if not lang:
       lang_dot = ''
@@ -187,20 +188,52 @@ def build_man(setup):
       lang_dot = '%s.' % lang
     cur_manfile = setup.MAN_FILE.replace('.1', '.%s1' % lang_dot)
     include_file = cur_manfile.replace('.1', '.include')
-    if not lang:
-      locale = 'C'
-    else:
-      locale = lang
-    args = [
-      'help2man',
-      f'{setup.MAN_HELP}',
-      '--locale', locale,
-      '-N', # no pointer to TextInfo
-      '-i', include_file,
-      '-o', cur_manfile]
-    _run_or_die(args, '\n'.join([
-        'Failed to build manfile',
-        'You may need to install help2man']))
+    ret.append((lang, cur_manfile, include_file))
+  return ret
+
+
+def _make_man_dir(setup):
+  dest_dir = os.path.dirname(setup.MAN_FILE)
+  if not os.path.isdir(dest_dir):
+    print('Making directory %r' % dest_dir)
+    os.makedirs(dest_dir, exist_ok=True)
+
+
+def build_man_page(setup, lang, cur_manfile, include_file):
+  """Build one man page, from MAN_PARSER if set, otherwise with help2man."""
+  from . import manpage
+  parser = manpage.get_parser(setup)
+  if parser:
+    manpage.write_page(parser, setup, lang, cur_manfile, include_file)
+    return
+  if not lang:
+    locale = 'C'
+  else:
+    locale = lang
+  args = [
+    'help2man',
+    f'{setup.MAN_HELP}',
+    '--locale', locale,
+    '-N', # no pointer to TextInfo
+    '-i', include_file,
+    '-o', cur_manfile]
+  runner.run_or_die(args, PyBdistException, '\n'.join([
+      'Failed to build manfile',
+      'You may need to install help2man']))
+
+
+def build_man(setup):
+  pages = _man_pages(setup)
+  if not pages:
+    return
+  _make_man_dir(setup)
+  from . import manpage
+  parser = manpage.get_parser(setup)
+  if parser:
+    manpage.write_pages(parser, setup, pages)
+  else:
+    for lang, cur_manfile, include_file in pages:
+      build_man_page(setup, lang, cur_manfile, include_file)
 
   print('Built %s.1' % setup.NAME)
 
@@ -211,8 +244,148 @@ def _get_var(setup, var):
   return None
 
 
+def _get_build_cache(setup):
+  """Returns the BuildCache for this setup, or None if disabled."""
+  global _build_cache
+  from . import build_cache
+  if _get_var(setup, 'BUILD_CACHE') is False:
+    return None
+  if _build_cache is None:
+    _build_cache = build_cache.BuildCache(
+        _get_var(setup, 'BUILD_CACHE_DIR'), _get_var(setup, 'BUILD_CACHE_SIZE'))
+  return _build_cache
+
+
+def _setup_metadata(setup):
+  """Everything from setup.py that can change what gets built."""
+  return (setup.NAME, setup.VER, setup.DEB_NAME,
+          sorted((key, repr(val)) for key, val in setup.SETUP.items()))
+
+
+def _record_outcome(name, outcome):
+  """Note whether step `name` was built, for the metrics, see _cached()."""
+  timeline.add_span(name, 'cache', time.time(), 0.0, dict(outcome=outcome))
+
+
+def _cached(setup, name, func, inputs, outputs, extra=None):
+  """Run func() unless the build cache has `outputs` for these `inputs`."""
+  cur_journal = journal.current()
+  paths = ['setup.py'] + inputs + outputs
+  if cur_journal and cur_journal.resume and cur_journal.is_done(
+      name, journal.fingerprint(paths, (_setup_metadata(setup), extra))):
+    print('%s already done, skipped' % name)
+    _record_outcome(name, 'skipped')
+    return
+  cache = _get_build_cache(setup)
+  if not cache:
+    func()
+    outcome = 'built'
+  else:
+    outcome = cache.run(name, func, ['setup.py'] + inputs, outputs,
+                        (_setup_metadata(setup), extra))
+  _record_outcome(name, outcome)
+  if cur_journal:
+    cur_journal.done(name, journal.fingerprint(
+        paths, (_setup_metadata(setup), extra)))
+
+
+def _cached_and_published(setup, name, func, inputs, outputs, extra=None):
+  """_cached(), then publish the outputs in dist/ to the artifact stream."""
+  from . import artifacts
+  _cached(setup, name, func, inputs, outputs, extra)
+  stream = artifacts.current()
+  if stream:
+    from . import build_cache
+    for fname in build_cache._expand_outputs(outputs):
+      fname = os.path.normpath(fname)
+      if os.path.dirname(fname) == 'dist':
+        stream.publish(fname)
+
+
+def _release_fingerprint(setup):
+  """Fingerprint of setup.py and this version's files in dist/."""
+  return journal.fingerprint(
+      ['setup.py', 'dist/%s-%s.*' % (setup.NAME, setup.VER),
+       'dist/%s_%s*' % (setup.DEB_NAME, setup.VER)], _setup_metadata(setup))
+
+
+def _sdist_inputs(setup):
+  """The files that go into the sdist."""
+  inputs = [setup.DIR, 'MANIFEST.in', 'README*', '*.rst', '*.txt']
+  inputs += setup.SETUP.get('scripts', [])
+  for _, files in setup.SETUP.get('data_files', []):
+    inputs += files
+  return inputs
+
+
+def _deb_inputs(setup):
+  """The files that go into the .deb, not counting the sdist's extras."""
+  inputs = [setup.DIR, 'debian', '/etc/debian_version']
+  inputs += setup.SETUP.get('scripts', [])
+  for _, files in setup.SETUP.get('data_files', []):
+    inputs += files
+  if os.path.exists('debian/docs'):
+    inputs += [line.strip() for line in open('debian/docs') if line.strip()]
+  return inputs
+
+
 def build_deb(setup):
-  debian.build_deb(setup)
+  return debian.build_deb(setup)
+
+
+def _sdist_includes_man(setup):
+  """True if the man pages may end up inside the sdist."""
+  man_dir = os.path.dirname(setup.MAN_FILE)
+  if man_dir:
+    for _, files in setup.SETUP.get('data_files', []):
+      for fname in files:
+        if os.path.dirname(os.path.normpath(fname)) == os.path.normpath(man_dir):
+          return True
+  if os.path.exists('MANIFEST.in'):
+    manifest = open('MANIFEST.in').read()
+    return bool(man_dir) and man_dir in manifest
+  return False
+
+
+def add_dist_tasks(sched, setup):
+  """Add the --dist steps to the scheduler `sched`.
+
+  Each man page is its own step so they build alongside the sdist, unless
+  the sdist packages the man pages.
+  """
+  pages = _man_pages(setup)
+  man_files = [manfile for _, manfile, _ in pages]
+  if pages:
+    _make_man_dir(setup)
+  for lang, cur_manfile, include_file in pages:
+    name = 'build_man %s' % (lang or 'C')
+    sched.add(name, _cached, setup, name,
+              functools.partial(build_man_page, setup, lang, cur_manfile,
+                                include_file),
+              [include_file, setup.DIR], [cur_manfile],
+              inputs=[include_file], outputs=[cur_manfile])
+  tarball = 'dist/%s-%s.tar.gz' % (setup.NAME, setup.VER)
+  zip_name = 'dist/%s-%s.zip' % (setup.NAME, setup.VER)
+  sdist_inputs = []
+  if pages and _sdist_includes_man(setup):
+    sdist_inputs = man_files
+  sched.add('build_zip_tar', _cached_and_published, setup, 'build_zip_tar',
+            functools.partial(build_zip_tar, setup),
+            _sdist_inputs(setup) + sdist_inputs, [tarball, zip_name],
+            inputs=sdist_inputs, outputs=[tarball, zip_name])
+  if _get_var(setup, 'ZIPAPP_MAIN'):
+    pyz = 'dist/%s-%s.pyz' % (setup.NAME, setup.VER)
+    sched.add('build_zipapp', _cached, setup, 'build_zipapp',
+              functools.partial(build_zipapp, setup), _sdist_inputs(setup),
+              [pyz], outputs=[pyz])
+  debs = 'dist/%s_%s*.deb' % (setup.DEB_NAME, setup.VER)
+  # debuild's .changes, .dsc, .debian.tar.* and .orig.tar.gz, which --git
+  # and dput need, are restored from the cache with the .deb.
+  deb_files = os.path.join(os.path.relpath(debian._get_deb_dir()),
+                           '%s_%s*' % (setup.NAME, setup.VER))
+  sched.add('build_deb', _cached_and_published, setup, 'build_deb',
+            functools.partial(build_deb, setup), _deb_inputs(setup),
+            [debs, deb_files], inputs=[tarball], outputs=[debs, deb_files])
 
 def get_deb_filenames(setup):
   """Returns the list of debian files found in dist/ folder.
@@ -229,6 +402,15 @@ def get_deb_filenames(setup):
   return ret
 
 
+def update_apt_repo(setup):
+  """Add this version's debs to the local repository APT_REPO."""
+  from . import apt_repo
+  debs = [os.path.join('dist', deb) for deb in get_deb_filenames(setup)]
+  if not debs:
+    raise PyBdistException('No .deb files in dist/ for version %r' % setup.VER)
+  return apt_repo.update(os.path.expanduser(setup.APT_REPO), debs)
+
+
 def clean_config(setup):
   config_file = os.path.expanduser('~/.config/%s/config' % setup.NAME)
   if os.path.exists(config_file):
@@ -313,12 +495,7 @@ def print_release_info(setup):
 
 def test_code(setup):
   """Run tests with nosetests."""
-  dirs = [setup.DIR]
-  for root, cur_dirs, unused_files in os.walk(setup.DIR):
-    for dirname in cur_dirs:
-      if dirname in ['.svn', '.hg', '.ropeproject']:
-        continue
-      dirs.append(os.path.join(root, dirname))
+  dirs = file_index.get().dirs(setup.DIR)
   fname = '.noserc'
   if os.path.exists(fname):
     noserc = os.path.abspath(fname)
@@ -328,7 +505,7 @@ def test_code(setup):
   if noserc:
     args += ['--config', noserc]
   args += dirs
-  _run_or_die(args, 'You may need to install python3-nose')
+  runner.run_or_die(args, PyBdistException, 'You may need to install python3-nose')
 
 def check_code(setup):
   """Check the source code for errors."""
@@ -336,18 +513,17 @@ def check_code(setup):
     pycheckrc = os.path.abspath('.pycheckrc')
   else:
     pycheckrc = None
-  olddir = os.getcwd()
-  os.chdir(setup.DIR)
-  files = glob.glob('*.py') + glob.glob('*/*.py') + glob.glob('*/*/*.py')
+  files = [os.path.relpath(fname, setup.DIR)
+           for fname in file_index.get().files('*.py', setup.DIR)]
 
   args = ['pylint']
   if pycheckrc:
     args += ['--config', pycheckrc]
 
   args += files
-  _run_or_die(args, 'You may need to install pylint')
+  runner.run_or_die(args, PyBdistException, 'You may need to install pylint',
+                    cwd=setup.DIR)
   print('Passed pylint')
-  os.chdir(olddir)
 
 def check_rst(setup):
   """Check the release reStructuredText for errors."""
@@ -386,7 +562,7 @@ def _fix_versions_notes(setup):
   setup_file = 'setup.py'
   release_file = setup.RELEASE_FILE
   changelog_file = 'debian/changelog'
-  changelog_ver, _, cl_lines = release.parse_deb_changelog(changelog_file)
+  changelog_ver, _, cl_lines = metadata.get(setup).changelog
 
   STRING_GROUP = '["\']([^"\']+)["\']'
   EQ = '\s*=\s*'
@@ -409,18 +585,44 @@ def _fix_versions_notes(setup):
         ver, r'^\s*__version__' + EQ + STRING_GROUP)
 
 
-def check_for_errors(setup):
-  _fix_versions_notes(setup)
-  #check_code(setup)
-  check_rst(setup)
-  check_spelling(setup)
+def _check_mercurial(unused_setup):
   if mercurial.needs_hg_commit(verbose=False):
     print('** Mercurial needs commit')
   elif mercurial.needs_hg_push(verbose=False):
     print('** Mercurial needs push')
-  get_and_verify_versions(setup)
+
+
+def _count_untranslated(setup):
+  from . import i18n
+  i18n.count_untranslated(_get_locale_dir(setup), setup.LANGS)
+
+
+def _version_files(setup):
+  return ['setup.py', os.path.join(setup.DIR, setup.PY_SRC),
+          setup.RELEASE_FILE, 'debian/changelog']
+
+
+def add_check_tasks(sched, setup):
+  """Add the --check steps to the scheduler `sched`."""
+  version_files = _version_files(setup)
+  sched.add('fix_versions_notes', _fix_versions_notes, setup,
+            inputs=version_files, outputs=version_files, exclusive=True)
+  #sched.add('check_code', check_code, setup)
+  sched.add('check_rst', check_rst, setup, inputs=[setup.RELEASE_FILE])
+  sched.add('check_spelling', check_spelling, setup,
+            inputs=[setup.RELEASE_FILE, 'setup.py'],
+            outputs=[setup.RELEASE_FILE, 'setup.py'], exclusive=True)
+  sched.add('check_mercurial', _check_mercurial, setup, inputs=version_files)
+  sched.add('verify_versions', get_and_verify_versions, setup,
+            inputs=version_files)
   if hasattr(setup, 'LANGS'):
-    i18n.count_untranslated(_get_locale_dir(setup), setup.LANGS)
+    sched.add('count_untranslated', _count_untranslated, setup)
+
+
+def check_for_errors(setup, jobs=1):
+  sched = scheduler.Scheduler(jobs)
+  add_check_tasks(sched, setup)
+  sched.run()
 
 def get_pass_from(fname):
   """Retrieves the password from this file.
@@ -447,7 +649,8 @@ def get_pass_from(fname):
   return None
 
 
-def upload_to_google_code(setup):
+def _google_code_login(setup):
+  """Returns the (username, password) for uploading to googlecode.com."""
   print('Using user %r' % setup.GOOGLE_CODE_EMAIL)
   password = get_pass_from('~/.ssh/%s' % setup.GOOGLE_CODE_EMAIL)
   if not password:
@@ -457,29 +660,102 @@ def upload_to_google_code(setup):
     print('It is the password you use to access repositories,')
     print('and can be found here: http://code.google.com/hosting/settings')
     password = getpass.getpass()
-  username = setup.GOOGLE_CODE_EMAIL
-  files = [
+  return setup.GOOGLE_CODE_EMAIL, password
+
+
+def _journal_step(name, fingerprint, func, *args):
+  cur_journal = journal.current()
+  if cur_journal:
+    return cur_journal.call(name, fingerprint, func, *args)
+  return func(*args)
+
+
+def _remove_featured_labels(setup, username, password, files):
+  from . import googlecode_update
+  # removes all 'Featured' downloads that aren't in my list of `files`
+  _journal_step('remove_featured_labels', repr(files),
+                googlecode_update.remove_featured_labels,
+                setup.NAME, username, password, files)
+
+
+def _upload_file(setup, username, password, fname, sha1=None):
+  """Upload dist/`fname` unless googlecode.com already has it."""
+  from . import googlecode_update
+  if fname.endswith('.zip') or fname.endswith('.tar.gz'):
+    labels = ['Type-Source', 'OpSys-Linux', 'Featured']
+  elif fname.endswith('.deb'):
+    labels = ['Type-Package', 'OpSys-Linux', 'Featured']
+  else:
+    labels = None
+  summary = fname
+  _journal_step('upload %s' % fname,
+                journal.fingerprint([os.path.join('dist', fname)]),
+                googlecode_update.maybe_upload_file,
+                setup.NAME, 'dist', fname, summary, labels, username, password,
+                sha1)
+
+
+def _upload_files(setup):
+  return [
     '%s-%s.zip' % (setup.NAME, setup.VER),
     '%s-%s.tar.gz' % (setup.NAME, setup.VER),
   ] + get_deb_filenames(setup)
-  # removes all 'Featured' downloads that aren't in my list of `files`
-  googlecode_update.remove_featured_labels(
-      setup.NAME, username, password, files)
 
+
+def upload_to_google_code(setup):
+  username, password = _google_code_login(setup)
+  files = _upload_files(setup)
+  _remove_featured_labels(setup, username, password, files)
   for fname in files:
-    if fname.endswith('.zip') or fname.endswith('.tar.gz'):
-      labels = ['Type-Source', 'OpSys-Linux', 'Featured']
-    elif fname.endswith('.deb'):
-      labels = ['Type-Package', 'OpSys-Linux', 'Featured']
-    else:
-      labels = None
-    summary = fname
-    googlecode_update.maybe_upload_file(
-        setup.NAME, 'dist', fname, summary, labels, username, password)
+    _upload_file(setup, username, password, fname)
+
+
+def dist_and_upload(setup, jobs=1):
+  """--dist --upload, each file uploads as soon as it's built."""
+  from . import artifacts
+  from . import size_report
+  username, password = _google_code_login(setup)
+  budgets = _get_var(setup, 'SIZE_BUDGETS')
+  def _check_budget(artifact):
+    size_report.check_file(setup, artifact.fname)
+    return artifact
+  def _upload(artifact):
+    _upload_file(setup, username, password, artifact.name, artifact.sha1)
+    return artifact
+  stream = artifacts.start()
+  if budgets:
+    # Nothing over budget gets to the upload stage.
+    stream.add_stage('budget', _check_budget)
+  stream.add_stage('sha1', artifacts.add_sha1)
+  stream.add_stage('upload', _upload)
+  sched = scheduler.Scheduler(jobs)
+  add_dist_tasks(sched, setup)
+  try:
+    try:
+      sched.run()
+    except BaseException:
+      stream.close(cancel=True)
+      raise
+    stream.close()
+  finally:
+    artifacts.stop()
+  # Anything built outside the stream, ex. a deb from an earlier run.
+  files = _upload_files(setup)
+  rest = [fname for fname in files
+          if os.path.join('dist', fname) not in stream.published]
+  if budgets:
+    for fname in rest:
+      size_report.check_file(setup, os.path.join('dist', fname))
+  for fname in rest:
+    _upload_file(setup, username, password, fname)
+  # Last, the deb names are only known once it's built.
+  _remove_featured_labels(setup, username, password, files)
 
 
 def announce_on_freshmeat(setup):
   """Announce launch on freshmeat."""
+  import simplejson
+  import six.moves.http_client
   print('Announcing on Freshmeat...')
 
   _, _, rel_lines = _parse_last_release(setup)
@@ -501,9 +777,10 @@ def announce_on_freshmeat(setup):
   release_dict = dict(version=setup.VER, changelog='\n'.join(changelog), tag_list=tag)
   path = '/projects/%s/releases.json' % name
   body = codecs.encode(simplejson.dumps(dict(auth_code=auth_code, release=release_dict)))
-  connection = six.moves.http_client.HTTPConnection('freshmeat.net')
-  connection.request('POST', path, body, {'Content-Type': 'application/json'})
-  response = connection.getresponse()
+  with timeline.span('POST freshmeat.net%s' % path, 'http'):
+    connection = six.moves.http_client.HTTPConnection('freshmeat.net')
+    connection.request('POST', path, body, {'Content-Type': 'application/json'})
+    response = connection.getresponse()
   if response.status == 404:
     print('Project %r not found, may have to add FRESHMEAT to setup.py' % name)
     raise PyBdistException('Freshmeat project not found, please register.')
@@ -514,6 +791,7 @@ def announce_on_freshmeat(setup):
 
 
 def announce_on_twitter(setup):
+  import twitter
   print('Announcing on twitter...')
   rcinfo = netrc.netrc(os.path.expanduser('~/.netrc'))
   auth = rcinfo.authenticators('twitter')
@@ -521,7 +799,8 @@ def announce_on_twitter(setup):
   password = auth[2]
   metadata = dict(version=setup.VER, name=setup.NAME, url=setup.SETUP['url'])
   api = twitter.Api(username=username, password=password)
-  api.PostUpdate('Release %(version)s of %(name)s is available from %(url)s' % metadata)
+  with timeline.span('POST twitter', 'http'):
+    api.PostUpdate('Release %(version)s of %(name)s is available from %(url)s' % metadata)
   print('Done announcing on twitter.')
 
 def _get_pot_filename(setup):
@@ -531,18 +810,23 @@ def _get_locale_dir(setup):
   return '%s/locale' % setup.DIR
 
 def build_get_text(setup):
-  # TODO(scottkirkwood): sub-directories
-  dirs = [ 'setup.py', os.path.join(setup.DIR, '*.py')]
+  from . import i18n
+  dirs = ['setup.py'] + file_index.get().files('*.py', setup.DIR)
   i18n.build_get_text(_get_pot_filename(setup), dirs)
 
 def update_po_files(setup):
+  from . import i18n
   missing = i18n.update_po_files(_get_pot_filename(setup), _get_locale_dir(setup), setup.LANGS)
   for lang, fname in missing:
     print('Creating %r' % fname)
     i18n.make_empty_po_file(fname, lang, setup)
 
 def compile_po_files(setup):
-  i18n.compile_po_files(_get_locale_dir(setup), setup.LANGS)
+  from . import i18n
+  for fname_po, fname_mo in i18n.po_files(_get_locale_dir(setup), setup.LANGS):
+    _cached(setup, 'msgfmt %s' % fname_po,
+            functools.partial(i18n.compile_po_file, fname_po, fname_mo),
+            [fname_po], [fname_mo])
 
 def handle_standard_options(options, setup):
   """Handle options added by add_standard_options().
@@ -552,56 +836,139 @@ def handle_standard_options(options, setup):
   Returns:
     True if handled, false otherwise."""
   fixup_setup(setup)
-  if options.doclean:
-    clean_all(setup)
+  profile = getattr(options, 'profile', None)
+  handled = None
+  command = _command_name(options)
+  if command:
+    journal.start(setup, command, getattr(options, 'resume', False))
+  try:
+    handled = _handle_options(options, setup)
+    return handled
+  finally:
+    journal.stop()
+    if profile:
+      timeline.write_profile(profile)
+    if handled is not False:
+      _record_metrics(options, setup, handled is not None)
+
+
+def _command_name(options):
+  if getattr(options, 'dist', False) and getattr(options, 'upload', False):
+    return 'dist_upload'
+  for name in ['doclean', 'check', 'check_remote', 'test', 'git', 'dist',
+               'upload', 'pypi', 'mail', 'freshmeat', 'twitter',
+               'missing_docs', 'gettext', 'size_report']:
+    if getattr(options, name, False):
+      return name
+  return None
+
+
+def _record_metrics(options, setup, success):
+  """Append this run to the metrics history, unless METRICS is False."""
+  command = _command_name(options)
+  if not command or _get_var(setup, 'METRICS') is False:
+    return
+  metrics.append(metrics.make_record(setup, command, success),
+                 _get_var(setup, 'METRICS_FILE'))
+
+
+def _handle_options(options, setup):
+  jobs = getattr(options, 'jobs', 1)
+  if getattr(options, 'no_cache', False):
+    setup.BUILD_CACHE = False
+  def step(func, *args):
+    cur_journal = journal.current()
+    if cur_journal and func.__name__ in JOURNAL_STEPS:
+      return cur_journal.call(func.__name__, _release_fingerprint(setup),
+                              timeline.call, func, *args)
+    return timeline.call(func, *args)
+  if getattr(options, 'perf_report', False):
+    metrics.report(setup, _get_var(setup, 'PERF_THRESHOLD'),
+                   _get_var(setup, 'METRICS_FILE'))
+  elif options.doclean:
+    step(clean_all, setup)
   elif options.check:
-    check_for_errors(setup)
+    step(check_for_errors, setup, jobs)
     print()
-    print_release_info(setup)
+    step(print_release_info, setup)
+  elif getattr(options, 'watch', False):
+    from . import watch
+    watch.watch(setup)
   elif options.check_remote:
-    verify_remote_versions(setup)
+    step(verify_remote_versions, setup)
   elif options.test:
-    test_code(setup)
+    step(test_code, setup)
   elif options.git:
-    debian.git_import_orig(setup)
+    step(debian.git_import_orig, setup)
+  elif options.dist and options.upload:
+    step(dist_and_upload, setup, jobs)
+    if _get_var(setup, 'APT_REPO'):
+      step(update_apt_repo, setup)
+    step(print_release_info, setup)
+    from . import lintian
+    step(lintian.wait)
   elif options.dist:
-    build_man(setup)
-    build_zip_tar(setup)
-    build_deb(setup)
-    print_release_info(setup)
+    sched = scheduler.Scheduler(jobs)
+    add_dist_tasks(sched, setup)
+    sched.run()
+    if _get_var(setup, 'SIZE_BUDGETS'):
+      from . import size_report
+      step(size_report.report, setup)
+    if _get_var(setup, 'APT_REPO'):
+      step(update_apt_repo, setup)
+    step(print_release_info, setup)
+    from . import lintian
+    step(lintian.wait)
+  elif getattr(options, 'size_report', False):
+    from . import size_report
+    step(size_report.report, setup)
   elif options.upload:
-    print_release_info(setup)
-    upload_to_google_code(setup)
+    step(print_release_info, setup)
+    step(upload_to_google_code, setup)
   elif options.pypi:
-    print_release_info(setup)
-    upload_to_pypi(setup)
+    step(print_release_info, setup)
+    step(upload_to_pypi, setup)
   elif options.mail:
-    mailinglist.mail(setup)
+    from . import mailinglist
+    step(mailinglist.mail, setup)
   elif options.freshmeat:
-    print_release_info(setup)
-    announce_on_freshmeat(setup)
+    step(print_release_info, setup)
+    step(announce_on_freshmeat, setup)
   elif options.twitter:
-    print_release_info(setup)
-    announce_on_twitter(setup)
+    step(print_release_info, setup)
+    step(announce_on_twitter, setup)
   elif options.missing_docs:
-    documents.out_license(setup)
-    documents.out_readme(setup)
-    documents.out_install(setup)
+    from . import documents
+    step(documents.out_license, setup)
+    step(documents.out_readme, setup)
+    step(documents.out_install, setup)
   elif options.gettext:
-    build_get_text(setup)
-    update_po_files(setup)
-    compile_po_files(setup)
+    step(build_get_text, setup)
+    step(update_po_files, setup)
+    step(compile_po_files, setup)
   else:
     return False
   return True
 
 def add_standard_options(parser, setup=None):
+  parser.add_option('--jobs', dest='jobs', type='int', default=1,
+                    help='Number of steps to run at the same time.')
+  parser.add_option('--resume', dest='resume', action='store_true',
+                    help='Skip the steps a failed run already finished.')
+  parser.add_option('--no-cache', dest='no_cache', action='store_true',
+                    help='Rebuild everything, ignoring the build cache.')
+  parser.add_option('--profile', dest='profile', metavar='FILE',
+                    help='Write a Chrome trace of every step to FILE.')
+  parser.add_option('--perf-report', dest='perf_report', action='store_true',
+                    help='Show step timings and flag slow downs.')
   parser.add_option('--clean', dest='doclean', action='store_true',
                     help='Uninstall things')
   parser.add_option('--missing-docs', dest='missing_docs', action='store_true',
                     help='Create missing docs.')
   parser.add_option('--check', dest='check', action='store_true',
                     help='Check for errors.')
+  parser.add_option('--watch', dest='watch', action='store_true',
+                    help='Rerun the affected checks when files are saved.')
   parser.add_option('--check-remote', dest='check_remote', action='store_true',
                     help='Check remote versions.')
   parser.add_option('--test', dest='test', action='store_true',
@@ -610,8 +977,11 @@ def add_standard_options(parser, setup=None):
                     help='Push to git using gimp-import-orig.')
   parser.add_option('--dist', dest='dist', action='store_true',
                     help='Only build distributions.')
+  parser.add_option('--size-report', dest='size_report', action='store_true',
+                    help='Show what takes space in the dist/ archives.')
   parser.add_option('--upload', dest='upload', action='store_true',
-                    help='Only upload to google code.')
+                    help='Only upload to google code, with --dist upload '
+                    'each file as soon as it\'s built.')
   parser.add_option('--pypi', dest='pypi', action='store_true',
                     help='Only upload to pypi')
   if setup and hasattr(setup, 'MAILING_LIST'):
@@ -21,6 +21,8 @@ __author__ = 'scott@forusers.com (Scott Kirkwood)'
 import re
 import six.moves.urllib.request, six.moves.urllib.error, six.moves.urllib.parse
 
+from . import timeline
+
 def get_latest_version(project_name):
   """Get the version, download fname, and md5 hash.
 
@@ -34,9 +36,10 @@ def get_latest_version(project_name):
 
   url = 'http://pypi.python.org/pypi/%s/' % project_name
   try:
-    fin = six.moves.urllib.request.urlopen(url)
-    text = fin.read()
-    fin.close()
+    with timeline.span('GET %s' % url, 'http'):
+      fin = six.moves.urllib.request.urlopen(url)
+      text = fin.read()
+      fin.close()
   except six.moves.urllib.error.URLError:
     text = ''
   # The following url should always exist.
@@ -21,7 +21,6 @@ And sections are separated by ======== or --------
 
 from __future__ import absolute_import
 from __future__ import print_function
-from . import googlecode_update
 import re
 import sys
 import time
@@ -108,6 +107,7 @@ def out_debian_changelog(settings, lines):
   return ret
 
 def _get_last_versions(project_name):
+  from . import googlecode_update
   versions = []
   re_version = re.compile(r'%s-(.*).tar.gz' % project_name)
   for info in googlecode_update.get_download_list(project_name):
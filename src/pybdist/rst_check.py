@@ -20,35 +20,17 @@ from __future__ import print_function
 __author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
 
 import os
-import subprocess
 import tempfile
 
+from . import runner
+
 class RstCheckException(Exception):
   pass
 
-def _run_or_die(args, err_mess=None, output=True):
-  """Run the `args` (a list) or die.
-  Args:
-    args: list of arguments to pass to call
-    err_mess: Extra hint what went wrong.
-    output: output the command before running
-  """
-  if output:
-    print(' '.join(args))
-  try:
-    ret = subprocess.call(args)
-  except OSError as oserr:
-    mess = 'Error running: %r: %r' % (' '.join(args), oserr)
-    if err_mess:
-      mess += '\n' + err_mess
-    raise RstCheckException(err_mess)
-  if ret:
-    raise RstCheckException('Error running: code %r\n%r' % (ret, ' '.join(args)))
-
-
 def check_file(fname):
   args = ['rst2html', '--strict', fname, '/dev/null']
-  _run_or_die(args, 'You may need to run "sudo apt-get install python3-docutils')
+  runner.run_or_die(args, RstCheckException,
+      'You may need to run "sudo apt-get install python3-docutils')
 
 
 def check_text(rst_text):
@@ -56,5 +38,6 @@ def check_text(rst_text):
   os.write(t_out, bytes(rst_text, 'utf-8'))
   os.close(t_out)
   args = ['rst2html', '--strict', fname_tmp, '/dev/null']
-  _run_or_die(args, 'Note: left a tempfile at %r' % fname_tmp)
+  runner.run_or_die(args, RstCheckException,
+      'Note: left a tempfile at %r' % fname_tmp)
   os.unlink(fname_tmp)
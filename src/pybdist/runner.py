@@ -0,0 +1,302 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Runs external commands for all of pybdist.
+
+Every command runs in its own process group so a timeout can kill the
+whole tree.  stdout and stderr are read line by line, echoed and appended
+to a log file per step (.pybdist/logs/<step>.log).  The child is reaped
+with wait4() so we know the wall time, CPU time and peak RSS of each
+command; they're kept in RESULTS.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+__author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
+
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from . import timeline
+
+LOG_DIR = '.pybdist/logs'
+# Seconds to wait before killing a command, None waits forever.
+TIMEOUT = None
+# Seconds between SIGTERM and SIGKILL.
+KILL_GRACE = 5
+
+RESULTS = []
+_results_lock = threading.Lock()
+_log_lock = threading.Lock()
+_local = threading.local()
+
+class RunnerException(Exception):
+  pass
+
+
+class Result(object):
+  """What happened when running one command."""
+
+  def __init__(self, args, step):
+    self.args = args
+    self.step = step
+    self.returncode = None
+    self.start_time = None
+    self.wall_time = 0.0
+    self.user_time = 0.0
+    self.sys_time = 0.0
+    self.max_rss = 0  # in KiB
+    self.timed_out = False
+    self.lines = []
+
+  @property
+  def cpu_time(self):
+    return self.user_time + self.sys_time
+
+  def __repr__(self):
+    return 'Result(%r, code=%r, wall=%.2fs, cpu=%.2fs, rss=%dK)' % (
+        ' '.join(self.args), self.returncode, self.wall_time, self.cpu_time,
+        self.max_rss)
+
+
+def configure(log_dir=None, timeout=None):
+  """Override LOG_DIR and TIMEOUT, ex. from setup.py."""
+  global LOG_DIR, TIMEOUT
+  if log_dir is not None:
+    LOG_DIR = log_dir
+  if timeout is not None:
+    TIMEOUT = timeout
+
+
+def reset():
+  """Forget the results of earlier commands."""
+  with _results_lock:
+    del RESULTS[:]
+
+
+def set_step(name):
+  """Name the step running in this thread, used for the log file name."""
+  _local.step = name
+
+
+def get_step():
+  return getattr(_local, 'step', None)
+
+
+def _log_name(step, args):
+  name = step or os.path.basename(args[0])
+  return re.sub(r'[^\w.-]+', '_', name) + '.log'
+
+
+class Process(object):
+  """A running command, see start()."""
+
+  def __init__(self, args, capture=True, echo=True, timeout=None, cwd=None,
+               env=None, stdin=None, step=None):
+    self.result = Result(args, step or get_step())
+    self.echo = echo
+    self.timeout = timeout if timeout is not None else TIMEOUT
+    self._log = None
+    self._readers = []
+    if capture and LOG_DIR:
+      os.makedirs(LOG_DIR, exist_ok=True)
+      self._log = open(os.path.join(
+          LOG_DIR, _log_name(self.result.step, args)), 'a')
+      self._log.write('$ %s\n' % ' '.join(args))
+    pipe = subprocess.PIPE if capture else None
+    # Captured commands get their own process group so kill() gets their
+    # children too.  The others (ex. aspell check) stay in the terminal's
+    # foreground group, for the keyboard and Ctrl-C.
+    self._own_group = capture
+    self.result.start_time = time.time()
+    self._start = time.monotonic()
+    try:
+      self.popen = subprocess.Popen(args, stdout=pipe, stderr=pipe, cwd=cwd,
+                                    env=env, stdin=stdin,
+                                    start_new_session=capture)
+    except OSError:
+      if self._log:
+        self._log.close()
+      raise
+    if capture:
+      for stream, out in ((self.popen.stdout, sys.stdout),
+                          (self.popen.stderr, sys.stderr)):
+        reader = threading.Thread(target=self._read, args=(stream, out))
+        reader.daemon = True
+        reader.start()
+        self._readers.append(reader)
+    self._status = None
+    self._waiter = threading.Thread(target=self._wait4)
+    self._waiter.daemon = True
+    self._waiter.start()
+
+  def _read(self, stream, out):
+    for raw in iter(stream.readline, b''):
+      line = raw.decode('utf-8', 'replace')
+      self.result.lines.append(line.rstrip('\n'))
+      if self.echo:
+        out.write(line)
+        out.flush()
+      if self._log:
+        with _log_lock:
+          self._log.write(line)
+    stream.close()
+
+  def _wait4(self):
+    try:
+      _, status, rusage = os.wait4(self.popen.pid, 0)
+    except OSError:
+      # wait() gets the exit code from Popen instead, without the rusage.
+      self.result.wall_time = time.monotonic() - self._start
+      return
+    self.result.wall_time = time.monotonic() - self._start
+    self.result.user_time = rusage.ru_utime
+    self.result.sys_time = rusage.ru_stime
+    self.result.max_rss = rusage.ru_maxrss
+    self._status = status
+
+  def kill(self):
+    """Kill the command, and all of its children if it has its own group."""
+    for sig, grace in ((signal.SIGTERM, KILL_GRACE), (signal.SIGKILL, None)):
+      try:
+        if self._own_group:
+          os.killpg(self.popen.pid, sig)
+        else:
+          os.kill(self.popen.pid, sig)
+      except OSError:
+        return
+      self._waiter.join(grace)
+      if not self._waiter.is_alive():
+        return
+
+  def wait(self):
+    """Wait for the command to end, killing it after `timeout` seconds.
+    Returns:
+      Result
+    """
+    try:
+      self._waiter.join(self.timeout)
+      if self._waiter.is_alive():
+        self.result.timed_out = True
+        print('** Timeout after %ss: %s' % (self.timeout,
+                                            ' '.join(self.result.args)))
+        self.kill()
+        self._waiter.join()
+    except BaseException:
+      # Ex. Ctrl-C, which the command in its own session didn't get.
+      self.kill()
+      if self._log:
+        self._log.close()
+      raise
+    for reader in self._readers:
+      reader.join()
+    if self._status is None:
+      self.result.returncode = self.popen.wait()
+    else:
+      self.result.returncode = os.waitstatus_to_exitcode(self._status)
+      # We reaped the child ourselves, tell Popen not to try.
+      self.popen.returncode = self.result.returncode
+    if self._log:
+      self._log.write('# exit %r, wall %.2fs, cpu %.2fs, max rss %dK\n' % (
+          self.result.returncode, self.result.wall_time,
+          self.result.cpu_time, self.result.max_rss))
+      self._log.close()
+    with _results_lock:
+      RESULTS.append(self.result)
+    timeline.add_span(
+        os.path.basename(self.result.args[0]), 'command',
+        self.result.start_time, self.result.wall_time,
+        dict(cmd=' '.join(self.result.args), step=self.result.step,
+             returncode=self.result.returncode, cpu=self.result.cpu_time,
+             max_rss=self.result.max_rss))
+    return self.result
+
+
+def start(args, output=True, **kwargs):
+  """Start `args` (a list) running, see Process for the keyword args.
+
+  Raises OSError if the command can't be run.
+  """
+  if output:
+    print(' '.join(args))
+  return Process(args, **kwargs)
+
+
+def run(args, output=True, **kwargs):
+  """Run `args` (a list) and return its Result.
+  Args:
+    args: list of arguments.
+    output: print the command before running.
+    capture: False to let the command use the terminal directly.
+    echo: False to not copy the command's output to ours.
+    timeout: seconds before killing the command.
+    cwd, env, stdin: as for subprocess.Popen.
+  """
+  return start(args, output, **kwargs).wait()
+
+
+def run_many(list_of_args, jobs=None, **kwargs):
+  """Run several commands at the same time.
+  Args:
+    list_of_args: list of argument lists.
+    jobs: maximum commands at once, default all of them.
+  Returns:
+    list of Result, in the same order.
+  """
+  import concurrent.futures
+  if not list_of_args:
+    return []
+  jobs = jobs or len(list_of_args)
+  step = get_step()
+
+  def _run(args):
+    set_step(step)
+    return run(args, **kwargs)
+
+  with concurrent.futures.ThreadPoolExecutor(jobs) as pool:
+    return list(pool.map(_run, list_of_args))
+
+
+def run_or_die(args, exception=RunnerException, err_mess=None, **kwargs):
+  """Run the `args` (a list) or die.
+  Args:
+    args: list of arguments to pass to call
+    exception: the exception class to raise.
+    err_mess: Extra hint what went wrong.
+    kwargs: see run().
+  Returns:
+    Result
+  """
+  try:
+    result = run(args, **kwargs)
+  except OSError as oserr:
+    mess = 'Error running: %r: %r' % (' '.join(args), oserr)
+    if err_mess:
+      mess += '\n' + err_mess
+    raise exception(mess)
+  if result.returncode:
+    mess = 'Error running: code %r\n%r' % (result.returncode, ' '.join(args))
+    if result.timed_out:
+      mess += '\nTimed out'
+    if err_mess:
+      mess += '\n' + err_mess
+    raise exception(mess)
+  return result
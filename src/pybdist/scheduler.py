@@ -0,0 +1,135 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Runs a graph of build steps on a bounded pool of worker threads.
+
+Each step declares the files it reads (`inputs`) and writes (`outputs`).
+A step waits for every earlier step that writes something it reads, reads
+something it writes or writes the same thing.  Everything else may run at
+the same time.
+
+Steps marked `exclusive` need the terminal (they prompt the user or run an
+interactive program) and never run at the same time as each other.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+__author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
+
+import threading
+
+from . import runner
+from . import timeline
+
+class SchedulerException(Exception):
+  pass
+
+
+class Task(object):
+  """One step in the graph."""
+
+  def __init__(self, name, func, args=(), inputs=(), outputs=(),
+               exclusive=False):
+    self.name = name
+    self.func = func
+    self.args = args
+    self.inputs = set(inputs)
+    self.outputs = set(outputs)
+    self.exclusive = exclusive
+    self.depends = set()
+
+  def conflicts_with(self, other):
+    """True if this task must wait for `other` which was added earlier."""
+    return bool(other.outputs & self.inputs or other.inputs & self.outputs
+                or other.outputs & self.outputs)
+
+  def __repr__(self):
+    return 'Task(%r)' % self.name
+
+
+class Scheduler(object):
+  """Collects tasks, then runs them with at most `jobs` at a time."""
+
+  def __init__(self, jobs=1):
+    self.jobs = max(1, jobs or 1)
+    self.tasks = []
+    self._names = set()
+    self._console = threading.Lock()
+
+  def add(self, name, func, *args, **kwargs):
+    """Add a task.
+    Args:
+      name: unique name of the step.
+      func: callable, called as func(*args).
+      inputs: list of files (or other tokens) the step reads.
+      outputs: list of files (or other tokens) the step writes.
+      exclusive: True if the step uses the terminal.
+    Returns:
+      the new Task
+    """
+    if name in self._names:
+      raise SchedulerException('Duplicate task %r' % name)
+    task = Task(name, func, args, kwargs.get('inputs', ()),
+                kwargs.get('outputs', ()), kwargs.get('exclusive', False))
+    for earlier in self.tasks:
+      if task.conflicts_with(earlier):
+        task.depends.add(earlier.name)
+    self._names.add(name)
+    self.tasks.append(task)
+    return task
+
+  def _call(self, task):
+    runner.set_step(task.name)
+    if task.exclusive:
+      with self._console, timeline.span(task.name):
+        return task.func(*task.args)
+    with timeline.span(task.name):
+      return task.func(*task.args)
+
+  def run(self):
+    """Run all the tasks, raises the first failure once running ones end."""
+    if self.jobs == 1:
+      for task in self.tasks:
+        self._call(task)
+      return
+
+    import concurrent.futures
+    done = set()
+    pending = list(self.tasks)
+    running = {}
+    failure = None
+    with concurrent.futures.ThreadPoolExecutor(self.jobs) as pool:
+      while pending or running:
+        if not failure:
+          for task in list(pending):
+            if len(running) >= self.jobs:
+              break
+            if task.depends <= done:
+              pending.remove(task)
+              running[pool.submit(self._call, task)] = task
+        if not running:
+          break
+        finished, _ = concurrent.futures.wait(
+            running, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in finished:
+          task = running.pop(future)
+          if future.exception() and not failure:
+            failure = future.exception()
+          done.add(task.name)
+    if failure:
+      raise failure
+    if pending:
+      raise SchedulerException('Unable to run %r' % pending)
@@ -0,0 +1,295 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Builds the source distributions without running `setup.py sdist`.
+
+The file list follows the distutils rules: README, setup.py, the packages'
+modules and package_data, py_modules, scripts, data_files and then the
+MANIFEST.in commands.  Each file is read once and written to both
+dist/<name>-<ver>.tar.gz and dist/<name>-<ver>.zip.
+
+The tar is gzipped pigz style: it's cut into chunks that are compressed
+in parallel as separate gzip members (see compress.ParallelGzip).  A
+multi-member gzip file is a regular .tar.gz for tar, gzip and python's
+tarfile.  The zip's members are deflated in the same thread pool and
+written in order (see compress.ParallelZip).
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+__author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
+
+import fnmatch
+import glob
+import io
+import os
+import stat
+import tarfile
+import time
+import zipfile
+
+from . import compress
+
+COMPRESS_LEVEL = 9
+README_NAMES = ['README', 'README.txt', 'README.rst']
+SKIP_DIRS = ['.svn', '.hg', '.git', '.ropeproject', '__pycache__', 'CVS']
+
+
+class SdistException(Exception):
+  pass
+
+
+def _package_dir(setup_dict, package):
+  """Returns the directory of `package` using the package_dir mapping."""
+  package_dir = setup_dict.get('package_dir', {})
+  parts = package.split('.')
+  tail = []
+  while parts:
+    name = '.'.join(parts)
+    if name in package_dir:
+      return os.path.join(package_dir[name], *tail)
+    tail.insert(0, parts.pop())
+  if '' in package_dir:
+    return os.path.join(package_dir[''], *tail)
+  return os.path.join(*tail)
+
+
+def _package_files(setup_dict):
+  ret = []
+  package_data = setup_dict.get('package_data', {})
+  for package in setup_dict.get('packages', []):
+    pkg_dir = _package_dir(setup_dict, package)
+    ret += sorted(glob.glob(os.path.join(pkg_dir, '*.py')))
+    for pattern in package_data.get('', []) + package_data.get(package, []):
+      ret += sorted(fname for fname in glob.glob(os.path.join(pkg_dir, pattern))
+                    if os.path.isfile(fname))
+  for module in setup_dict.get('py_modules', []):
+    parts = module.split('.')
+    pkg_dir = _package_dir(setup_dict, '.'.join(parts[:-1]))
+    ret.append(os.path.join(pkg_dir, parts[-1] + '.py'))
+  return ret
+
+
+def _data_files(setup_dict):
+  ret = []
+  for item in setup_dict.get('data_files', []):
+    if isinstance(item, str):
+      ret.append(item)
+    else:
+      ret += item[1]
+  return ret
+
+
+def _walk(dirname='.'):
+  """All the files below `dirname`, without the VCS directories."""
+  ret = []
+  for root, dirs, files in os.walk(dirname):
+    dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+    for fname in sorted(files):
+      ret.append(os.path.normpath(os.path.join(root, fname)))
+  return ret
+
+
+def _match(fnames, patterns, under=None):
+  """The `fnames` whose basename matches one of the glob `patterns`."""
+  ret = []
+  for fname in fnames:
+    if under and not (fname + '/').startswith(os.path.normpath(under) + '/'):
+      continue
+    rel = fname if not under else os.path.relpath(fname, under)
+    for pattern in patterns:
+      if fnmatch.fnmatch(os.path.basename(fname), pattern) or (
+          '/' in pattern and fnmatch.fnmatch(rel, pattern)):
+        ret.append(fname)
+        break
+  return ret
+
+
+def apply_manifest(fnames, manifest_lines, all_files=None):
+  """Apply the MANIFEST.in commands to the list `fnames`.
+  Args:
+    fnames: starting list of files, relative to the project.
+    manifest_lines: lines of MANIFEST.in
+    all_files: every file in the project, defaults to walking '.'.
+  Returns:
+    new list of files
+  """
+  fnames = list(fnames)
+  if all_files is None:
+    all_files = _walk()
+  for line in manifest_lines:
+    words = line.split()
+    if not words or words[0].startswith('#'):
+      continue
+    cmd, args = words[0], words[1:]
+    if cmd == 'include':
+      for pattern in args:
+        fnames += sorted(fname for fname in glob.glob(pattern)
+                         if os.path.isfile(fname))
+    elif cmd == 'exclude':
+      fnames = [fname for fname in fnames
+                if not any(fnmatch.fnmatch(fname, pattern) for pattern in args)]
+    elif cmd == 'global-include':
+      fnames += _match(all_files, args)
+    elif cmd == 'global-exclude':
+      remove = set(_match(fnames, args))
+      fnames = [fname for fname in fnames if fname not in remove]
+    elif cmd == 'recursive-include' and args:
+      fnames += _match(all_files, args[1:], args[0])
+    elif cmd == 'recursive-exclude' and args:
+      remove = set(_match(fnames, args[1:], args[0]))
+      fnames = [fname for fname in fnames if fname not in remove]
+    elif cmd == 'graft':
+      for dirname in args:
+        fnames += _match(all_files, ['*'], dirname)
+    elif cmd == 'prune':
+      for dirname in args:
+        prefix = os.path.normpath(dirname) + '/'
+        fnames = [fname for fname in fnames if not fname.startswith(prefix)]
+    else:
+      raise SdistException('Unknown MANIFEST.in line %r' % line)
+  return fnames
+
+
+def source_files(setup_dict, manifest='MANIFEST.in'):
+  """Returns the sorted list of files that make up the sdist."""
+  fnames = [fname for fname in README_NAMES if os.path.exists(fname)]
+  fnames.append('setup.py')
+  fnames += _package_files(setup_dict)
+  fnames += setup_dict.get('scripts', [])
+  fnames += _data_files(setup_dict)
+  if os.path.exists(manifest):
+    with open(manifest) as fin:
+      fnames = apply_manifest(fnames, fin.readlines())
+  ret = set()
+  for fname in fnames:
+    fname = os.path.normpath(fname)
+    if not os.path.isfile(fname):
+      print('** Warning: %r is missing from the sdist' % fname)
+      continue
+    ret.add(fname)
+  return sorted(ret)
+
+
+def pkg_info(setup_dict):
+  """Returns the PKG-INFO text, as distutils writes it."""
+  def _field(name, key, default='UNKNOWN'):
+    return '%s: %s\n' % (name, setup_dict.get(key) or default)
+  text = 'Metadata-Version: 1.0\n'
+  text += _field('Name', 'name')
+  text += _field('Version', 'version')
+  text += _field('Summary', 'description')
+  text += _field('Home-page', 'url')
+  text += _field('Author', 'author')
+  text += _field('Author-email', 'author_email')
+  text += _field('License', 'license')
+  if setup_dict.get('download_url'):
+    text += _field('Download-URL', 'download_url')
+  description = str(setup_dict.get('long_description') or 'UNKNOWN')
+  text += 'Description: %s\n' % '\n        '.join(description.split('\n'))
+  if setup_dict.get('keywords'):
+    text += 'Keywords: %s\n' % ','.join(setup_dict['keywords'])
+  for platform in setup_dict.get('platforms') or ['UNKNOWN']:
+    text += 'Platform: %s\n' % platform
+  for classifier in setup_dict.get('classifiers', []):
+    text += 'Classifier: %s\n' % classifier
+  return text
+
+
+def _tar_info(arcname, st):
+  info = tarfile.TarInfo(arcname)
+  info.size = st.st_size
+  info.mtime = int(st.st_mtime)
+  info.mode = stat.S_IMODE(st.st_mode)
+  return info
+
+
+def _zip_info(arcname, st):
+  date_time = time.localtime(max(st.st_mtime, 315532800))[:6]
+  info = zipfile.ZipInfo(arcname, date_time)
+  info.external_attr = (st.st_mode & 0xFFFF) << 16
+  info.compress_type = zipfile.ZIP_DEFLATED
+  return info
+
+
+def _dir_entries(fnames):
+  """The parent directories of all `fnames`, parents first."""
+  dirs = set()
+  for fname in fnames:
+    dirname = os.path.dirname(fname)
+    while dirname and dirname not in dirs:
+      dirs.add(dirname)
+      dirname = os.path.dirname(dirname)
+  return sorted(dirs)
+
+
+def build(setup_dict, dist_dir='dist', compression=COMPRESS_LEVEL):
+  """Write dist/<name>-<ver>.tar.gz and .zip in a single pass.
+  Args:
+    setup_dict: setup.SETUP
+    dist_dir: where to write them.
+    compression: gzip level or 'gzip -<level> -T<threads>', see compress.
+  Returns:
+    (tarball, zip filename)
+  """
+  from concurrent import futures
+  comp = compress.parse(compression, 'gzip -%d' % COMPRESS_LEVEL)
+  if comp.algo != 'gzip':
+    raise SdistException('The sdist is a .tar.gz and .zip, %r isn\'t gzip'
+                         % str(comp))
+  level = comp.level
+  base = '%s-%s' % (setup_dict['name'], setup_dict['version'])
+  fnames = source_files(setup_dict)
+  if not os.path.isdir(dist_dir):
+    os.makedirs(dist_dir)
+  tarball = os.path.join(dist_dir, base + '.tar.gz')
+  zip_name = os.path.join(dist_dir, base + '.zip')
+  now = time.time()
+  with futures.ThreadPoolExecutor(comp.thread_count()) as pool:
+    with open(tarball + '.tmp', 'wb') as fout, \
+        compress.ParallelGzip(fout, pool, level) as gz_out, \
+        tarfile.open(fileobj=gz_out, mode='w|', format=tarfile.GNU_FORMAT) as tar, \
+        open(zip_name + '.tmp', 'wb') as zip_fout, \
+        compress.ParallelZip(zip_fout, pool, level) as zout:
+      for dirname in [''] + _dir_entries(fnames):
+        arcname = base + ('/' + dirname if dirname else '')
+        st = os.stat(dirname or '.')
+        info = _tar_info(arcname, st)
+        info.type = tarfile.DIRTYPE
+        info.size = 0
+        tar.addfile(info)
+        zout.writestr(_zip_info(arcname + '/', st), b'')
+      for fname in fnames:
+        with open(fname, 'rb') as fin:
+          data = fin.read()
+        st = os.stat(fname)
+        arcname = '%s/%s' % (base, fname)
+        tar.addfile(_tar_info(arcname, st), io.BytesIO(data))
+        zout.writestr(_zip_info(arcname, st), data)
+      data = pkg_info(setup_dict).encode('utf-8')
+      info = tarfile.TarInfo('%s/PKG-INFO' % base)
+      info.size = len(data)
+      info.mtime = int(now)
+      info.mode = 0o644
+      tar.addfile(info, io.BytesIO(data))
+      info = zipfile.ZipInfo('%s/PKG-INFO' % base, time.localtime(now)[:6])
+      info.external_attr = (stat.S_IFREG | 0o644) << 16
+      info.compress_type = zipfile.ZIP_DEFLATED
+      zout.writestr(info, data)
+  os.rename(tarball + '.tmp', tarball)
+  os.rename(zip_name + '.tmp', zip_name)
+  print('Wrote %r and %r with %d files' % (tarball, zip_name, len(fnames) + 1))
+  return tarball, zip_name
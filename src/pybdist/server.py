@@ -0,0 +1,229 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Optional long lived pybdist server and its thin client.
+
+The server keeps the pybdist modules, the apt cache, parsed .po files and
+compiled regular expressions loaded between commands.  The client sends the
+current directory and the standard options (see add_standard_options) over
+a Unix socket, and prints the output as it is streamed back.
+
+  python -m pybdist.server --start &    # start the server
+  python -m pybdist.server --check      # run `--check` in the current dir
+  python -m pybdist.server --stop
+
+Commands run one at a time.  Without a terminal, questions are answered
+with 'no' and spelling mistakes are listed instead of fixed interactively.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+__author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
+
+import json
+import os
+import socket
+import sys
+
+SOCKET_NAME = 'pybdist.sock'
+
+
+class ServerException(Exception):
+  pass
+
+
+def socket_path():
+  """$PYBDIST_SOCKET, or pybdist.sock in $XDG_RUNTIME_DIR or ~/.cache/pybdist."""
+  if os.environ.get('PYBDIST_SOCKET'):
+    return os.environ['PYBDIST_SOCKET']
+  dirname = os.environ.get('XDG_RUNTIME_DIR') or os.path.expanduser(
+      '~/.cache/pybdist')
+  return os.path.join(dirname, SOCKET_NAME)
+
+
+def _send(conn, **msg):
+  conn.sendall((json.dumps(msg) + '\n').encode('utf-8'))
+
+
+class _SocketWriter(object):
+  """File like object that streams writes back to the client."""
+
+  def __init__(self, conn, lock):
+    self.conn = conn
+    self.lock = lock
+
+  def write(self, text):
+    if text:
+      with self.lock:
+        _send(self.conn, out=text)
+    return len(text)
+
+  def flush(self):
+    pass
+
+  def isatty(self):
+    return False
+
+
+class _NoStdin(object):
+  """Answers every question with an empty line, meaning 'no'."""
+
+  def readline(self, *unused_args):
+    return '\n'
+
+  def isatty(self):
+    return False
+
+
+def _load_setup(cwd):
+  """Load (again) the setup.py found in `cwd`."""
+  import importlib.util
+  fname = os.path.join(cwd, 'setup.py')
+  if not os.path.exists(fname):
+    raise ServerException('No setup.py in %r' % cwd)
+  spec = importlib.util.spec_from_file_location('setup', fname)
+  module = importlib.util.module_from_spec(spec)
+  if cwd not in sys.path:
+    sys.path.insert(0, cwd)
+  spec.loader.exec_module(module)
+  return module
+
+
+def run_request(request, out):
+  """Run one client request, writing the output to `out`.
+  Returns:
+    exit code
+  """
+  import contextlib
+  import optparse
+  import traceback
+  from . import file_index
+  from . import pybdist
+  from . import runner
+  from . import timeline
+
+  runner.reset()
+  timeline.reset()
+  pybdist._build_cache = None
+  old_stdin = sys.stdin
+  sys.stdin = _NoStdin()
+  try:
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+      try:
+        os.chdir(request['cwd'])
+        file_index.forget()
+        setup = _load_setup(request['cwd'])
+        parser = optparse.OptionParser(prog='pybdist')
+        pybdist.add_standard_options(parser, setup)
+        options, _ = parser.parse_args(request['argv'])
+        if not pybdist.handle_standard_options(options, setup):
+          parser.print_help()
+          return 2
+        return 0
+      except SystemExit as err:
+        return err.code or 0
+      except Exception:
+        traceback.print_exc()
+        return 1
+  finally:
+    sys.stdin = old_stdin
+
+
+def serve(path=None):
+  """Serve requests until asked to stop."""
+  import socketserver
+  import threading
+  from . import pybdist  # the whole point is to load this once.
+
+  path = path or socket_path()
+  dirname = os.path.dirname(path)
+  if dirname and not os.path.isdir(dirname):
+    os.makedirs(dirname, mode=0o700)
+  if os.path.exists(path):
+    os.unlink(path)
+  busy = threading.Lock()
+
+  class Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+      request = json.loads(self.rfile.readline().decode('utf-8'))
+      if request.get('stop'):
+        _send(self.connection, exit=0)
+        threading.Thread(target=self.server.shutdown).start()
+        return
+      with busy:
+        old_cwd = os.getcwd()
+        try:
+          code = run_request(request, _SocketWriter(self.connection,
+                                                    threading.Lock()))
+        finally:
+          os.chdir(old_cwd)
+      _send(self.connection, exit=code)
+
+  server = socketserver.ThreadingUnixStreamServer(path, Handler)
+  os.chmod(path, 0o600)
+  print('pybdist server listening on %r' % path)
+  try:
+    server.serve_forever()
+  finally:
+    server.server_close()
+    if os.path.exists(path):
+      os.unlink(path)
+
+
+def send(request, path=None, out=None):
+  """Send the request to the server and print what comes back.
+  Returns:
+    exit code
+  """
+  out = out or sys.stdout
+  conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  try:
+    conn.connect(path or socket_path())
+  except (OSError, socket.error) as err:
+    raise ServerException('pybdist server not running (%s), start it with '
+                          '"python -m pybdist.server --start"' % err)
+  _send(conn, **request)
+  code = 1
+  with conn.makefile('rb') as fin:
+    for line in fin:
+      msg = json.loads(line.decode('utf-8'))
+      if 'out' in msg:
+        out.write(msg['out'])
+        out.flush()
+      if 'exit' in msg:
+        code = msg['exit']
+        break
+  conn.close()
+  return code
+
+
+def main(argv=None):
+  argv = sys.argv[1:] if argv is None else argv
+  if argv == ['--start']:
+    serve()
+    return 0
+  try:
+    if argv == ['--stop']:
+      return send(dict(stop=True))
+    return send(dict(cwd=os.getcwd(), argv=argv))
+  except ServerException as err:
+    print(err, file=sys.stderr)
+    return 2
+
+
+if __name__ == '__main__':
+  sys.exit(main())
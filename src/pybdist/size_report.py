@@ -0,0 +1,252 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""What takes up the space in the dist/ archives.
+
+For the sdist (.tar.gz and .zip), the .deb and the .pyz of this version
+it lists the largest members, the size and compression ratio per file
+type and the growth since the previous version found in dist/.
+
+SIZE_BUDGETS in setup.py fails --dist and --size-report when exceeded,
+in bytes per kind of archive and 'growth' as a fraction of the previous
+version.  --dist checks them before updating APT_REPO, --dist --upload
+checks each file before uploading it (see check_file()):
+
+  SIZE_BUDGETS = {'tar.gz': 200 * 1024, 'deb': 150 * 1024, 'growth': 0.10}
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+__author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
+
+import glob
+import os
+import re
+import tarfile
+import zipfile
+import zlib
+
+TOP_MEMBERS = 10
+
+
+class SizeException(Exception):
+  pass
+
+
+class Member(object):
+  """One file inside an archive."""
+
+  def __init__(self, name, size, packed=None):
+    self.name = name
+    self.size = size
+    # Compressed size, estimated with zlib if the archive doesn't say.
+    self.packed = packed
+
+  @property
+  def kind(self):
+    name = os.path.basename(self.name)
+    if '.' not in name.lstrip('.'):
+      return '(none)'
+    return '.' + name.rsplit('.', 1)[1]
+
+
+def _estimate(data):
+  return len(zlib.compress(data, 6))
+
+
+def _tar_members(tar):
+  ret = []
+  for info in tar:
+    if info.isfile():
+      data = tar.extractfile(info).read()
+      ret.append(Member(info.name, info.size, _estimate(data)))
+  return ret
+
+
+def _zip_members(fname):
+  with zipfile.ZipFile(fname) as zin:
+    return [Member(info.filename, info.file_size, info.compress_size)
+            for info in zin.infolist() if not info.is_dir()]
+
+
+def _deb_members(fname):
+  from . import deb_native
+  for name, data in deb_native.read_ar(fname, 'data.tar').items():
+    with deb_native.open_member_tar(name, data) as tar:
+      return _tar_members(tar)
+  raise SizeException('No data.tar in %r' % fname)
+
+
+def members(fname):
+  """Returns the list of Member of the archive `fname`."""
+  if fname.endswith('.deb'):
+    return _deb_members(fname)
+  if fname.endswith('.zip') or fname.endswith('.pyz'):
+    return _zip_members(fname)
+  with tarfile.open(fname) as tar:
+    return _tar_members(tar)
+
+
+def _version_key(version):
+  return [int(part) if part.isdigit() else part
+          for part in re.split(r'(\d+)', version)]
+
+
+def artifacts(setup, dist_dir='dist'):
+  """Returns [(kind, pattern prefix, suffix)] of the archives to look at."""
+  return [
+    ('tar.gz', os.path.join(dist_dir, '%s-' % setup.NAME), '.tar.gz'),
+    ('zip', os.path.join(dist_dir, '%s-' % setup.NAME), '.zip'),
+    ('pyz', os.path.join(dist_dir, '%s-' % setup.NAME), '.pyz'),
+    ('deb', os.path.join(dist_dir, '%s_' % setup.DEB_NAME), '_all.deb'),
+  ]
+
+
+def find_versions(prefix, suffix):
+  """Returns {version: filename} of the archives in dist/."""
+  ret = {}
+  for fname in glob.glob(glob.escape(prefix) + '*' + glob.escape(suffix)):
+    version = fname[len(prefix):-len(suffix)]
+    if re.match(r'^\d[\w.+~:-]*$', version):
+      ret[version] = fname
+  return ret
+
+
+def _current_and_previous(setup, prefix, suffix):
+  versions = find_versions(prefix, suffix)
+  current = [ver for ver in versions
+             if ver == setup.VER or ver.startswith(setup.VER + '-')]
+  if not current:
+    return None, None
+  current = max(current, key=_version_key)
+  older = [ver for ver in versions
+           if _version_key(ver) < _version_key(current)
+           and not ver.startswith(setup.VER + '-')]
+  previous = max(older, key=_version_key) if older else None
+  return versions[current], previous and versions[previous]
+
+
+def _human(size):
+  for unit in ['B', 'K', 'M']:
+    if abs(size) < 1024:
+      return '%d%s' % (size, unit) if unit == 'B' else '%.1f%s' % (size, unit)
+    size /= 1024.0
+  return '%.1fG' % size
+
+
+def report_archive(fname, previous=None, top=TOP_MEMBERS):
+  """Print the report for one archive.
+  Returns:
+    (size, growth as a fraction of the previous size or None)
+  """
+  size = os.path.getsize(fname)
+  items = members(fname)
+  total = sum(item.size for item in items)
+  print('%s: %s (%d files, %s uncompressed)' % (
+      fname, _human(size), len(items), _human(total)))
+  print('  Largest files:')
+  for item in sorted(items, key=lambda item: -item.size)[:top]:
+    print('  %9s %5.1f%%  %s' % (_human(item.size),
+                                 100.0 * item.size / max(total, 1), item.name))
+  kinds = {}
+  for item in items:
+    count, kind_size, packed = kinds.get(item.kind, (0, 0, 0))
+    kinds[item.kind] = (count + 1, kind_size + item.size,
+                        packed + (item.packed or item.size))
+  print('  %-10s %6s %10s %10s %6s' % ('Type', 'Files', 'Size', 'Packed',
+                                       'Ratio'))
+  for kind, (count, kind_size, packed) in sorted(
+      kinds.items(), key=lambda item: -item[1][1]):
+    print('  %-10s %6d %10s %10s %5.0f%%' % (
+        kind, count, _human(kind_size), _human(packed),
+        100.0 * packed / max(kind_size, 1)))
+  growth = None
+  if previous:
+    old_size = os.path.getsize(previous)
+    growth = (size - old_size) / float(max(old_size, 1))
+    print('  Was %s in %s, %+.1f%%' % (_human(old_size),
+                                      os.path.basename(previous), growth * 100))
+    old_items = dict((item.name.split('/', 1)[-1], item.size)
+                     for item in members(previous))
+    grew = []
+    for item in items:
+      delta = item.size - old_items.get(item.name.split('/', 1)[-1], 0)
+      if delta > 0:
+        grew.append((delta, item.name))
+    for delta, name in sorted(grew, reverse=True)[:top // 2]:
+      print('  %+9s  %s' % ('+' + _human(delta), name))
+  return size, growth
+
+
+def check_budgets(results, budgets):
+  """Returns a list of messages for the exceeded SIZE_BUDGETS."""
+  ret = []
+  budgets = budgets or {}
+  for kind, fname, size, growth in results:
+    if kind in budgets and size > budgets[kind]:
+      ret.append('%s is %s, budget is %s' % (fname, _human(size),
+                                            _human(budgets[kind])))
+    if 'growth' in budgets and growth is not None and growth > budgets['growth']:
+      ret.append('%s grew %.1f%%, budget is %.1f%%' % (
+          fname, growth * 100, budgets['growth'] * 100))
+  return ret
+
+
+def report(setup, dist_dir='dist'):
+  """Print the size report of this version's archives and check budgets."""
+  results = []
+  for kind, prefix, suffix in artifacts(setup, dist_dir):
+    current, previous = _current_and_previous(setup, prefix, suffix)
+    if not current:
+      continue
+    size, growth = report_archive(current, previous)
+    results.append((kind, current, size, growth))
+    print()
+  if not results:
+    print('** No archives for version %r in %r, run --dist first' % (
+        setup.VER, dist_dir))
+  over = check_budgets(results, getattr(setup, 'SIZE_BUDGETS', None))
+  for mess in over:
+    print('** Over budget: %s' % mess)
+  if over:
+    raise SizeException('%d size budget(s) exceeded' % len(over))
+  return results
+
+
+def check_file(setup, fname, dist_dir='dist'):
+  """Check the archive `fname` of this version against SIZE_BUDGETS.
+
+  Raises SizeException if it's over budget, files that aren't archives
+  of this project pass.
+  """
+  budgets = getattr(setup, 'SIZE_BUDGETS', None)
+  fname = os.path.normpath(fname)
+  for kind, prefix, suffix in artifacts(setup, dist_dir):
+    prefix = os.path.normpath(prefix)
+    if not fname.startswith(prefix) or not fname.endswith(suffix):
+      continue
+    _, previous = _current_and_previous(setup, prefix, suffix)
+    size = os.path.getsize(fname)
+    growth = None
+    if previous and os.path.normpath(previous) != fname:
+      old_size = os.path.getsize(previous)
+      growth = (size - old_size) / float(max(old_size, 1))
+    over = check_budgets([(kind, fname, size, growth)], budgets)
+    for mess in over:
+      print('** Over budget: %s' % mess)
+    if over:
+      raise SizeException('%s exceeds %d size budget(s)' % (fname, len(over)))
+    return
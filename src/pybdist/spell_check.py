@@ -17,7 +17,8 @@
 """Spell check a file or a piece of text.
 
 Uses the aspell command which must be installed and on the path.
-May open a spell check window.
+May open a spell check window, without a terminal (or with
+interactive=False) it lists unknown words.
 
 Creates or uses a spell check file given.
 """
@@ -26,33 +27,35 @@ from __future__ import print_function
 __author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
 
 import os
-import subprocess
+import sys
 import tempfile
 
+from . import runner
+
 class SpellCheckException(Exception):
   pass
 
-def _run_or_die(args, err_mess=None, output=True):
-  """Run the `args` (a list) or die.
-  Args:
-    args: list of arguments to pass to call
-    err_mess: Extra hint what went wrong.
-    output: output the command before running
-  """
-  if output:
-    print(' '.join(args))
-  try:
-    ret = subprocess.call(args)
-  except OSError as oserr:
-    mess = 'Error running: %r: %r' % (' '.join(args), oserr)
-    if err_mess:
-      mess += '\n' + err_mess
-    raise SpellCheckException(err_mess)
-  if ret:
-    raise SpellCheckException('Error running: code %r\n%r' % (ret, ' '.join(args)))
+def _aspell(args, fname, interactive=None):
+  """Spell check interactively, or just list unknown words.
 
+  interactive None checks interactively when there's a tty.
+  """
+  if interactive is None:
+    interactive = sys.stdin.isatty()
+  if interactive:
+    runner.run_or_die(args + ['-c', fname], SpellCheckException,
+                      'You may need to install aspell', capture=False)
+    return
+  with open(fname) as fin:
+    result = runner.run_or_die(args + ['list'], SpellCheckException,
+                               'You may need to install aspell', stdin=fin,
+                               echo=False)
+  words = sorted(set(line for line in result.lines if line))
+  if words:
+    print('** %r has %d unknown words: %s' % (fname, len(words),
+                                              ', '.join(words)))
 
-def check_file(fname, dictionary):
+def check_file(fname, dictionary, interactive=None):
   """Check the file given with and update the dictionary given."""
   if os.path.exists(fname):
     home_dir = os.path.dirname(os.path.abspath(dictionary))
@@ -61,10 +64,9 @@ def check_file(fname, dictionary):
   args = ['aspell', '--lang', 'en']
   if home_dir:
     args += ['--home-dir', home_dir]
-  args += ['-c', fname]
-  _run_or_die(args, 'You may need to install aspell')
+  _aspell(args, fname, interactive)
 
-def check_code_file(fname, dictionary):
+def check_code_file(fname, dictionary, interactive=None):
   """Check the file given with and update the dictionary given."""
   if os.path.exists(fname):
     home_dir = os.path.dirname(os.path.abspath(dictionary))
@@ -73,8 +75,7 @@ def check_code_file(fname, dictionary):
   args = ['aspell', '--mode', 'perl', '--lang', 'en']
   if home_dir:
     args += ['--home-dir', home_dir]
-  args += ['-c', fname]
-  _run_or_die(args, 'You may need to install aspell')
+  _aspell(args, fname, interactive)
 
 def check_text(text, dictionary):
   t_out, fname_tmp = tempfile.mkstemp('txt')
@@ -0,0 +1,155 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Cheap file copies for the build directories.
+
+Copies try, in order, a reflink (FICLONE, btrfs/xfs), os.copy_file_range()
+(done in the kernel, server side on NFS 4.2) and finally a plain copy.
+Files that won't be modified are hard linked when possible.
+
+The staging area is a temporary directory in STAGING_DIR from setup.py;
+STAGING_DIR = 'tmpfs' puts it in memory (/dev/shm).
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+__author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
+
+import errno
+import os
+import shutil
+import tarfile
+import tempfile
+
+FICLONE = 0x40049409   # _IOW(0x94, 9, int) from linux/fs.h
+TMPFS_DIRS = ['/dev/shm', '/run/shm']
+# errnos meaning "not supported here", try the next method.
+_FALLBACK_ERRNOS = set([errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP,
+                        errno.ENOTTY, errno.EINVAL, errno.EPERM])
+
+
+def _clone(fin, fout):
+  import fcntl
+  fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+
+
+def _copy_file_range(fin, fout, size):
+  offset = 0
+  while offset < size:
+    copied = os.copy_file_range(fin.fileno(), fout.fileno(), size - offset)
+    if not copied:
+      break
+    offset += copied
+  if offset < size:
+    raise OSError(errno.EINVAL, 'copy_file_range stopped early')
+
+
+def copy_file(src, dst):
+  """Copy `src` to the file `dst`, with its mode and times.
+  Returns:
+    'clone', 'copy_file_range' or 'copy'
+  """
+  size = os.stat(src).st_size
+  method = 'copy'
+  with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+    for name, func, args in [
+        ('clone', _clone, (fin, fout)),
+        ('copy_file_range', _copy_file_range, (fin, fout, size))]:
+      if name == 'copy_file_range' and not hasattr(os, 'copy_file_range'):
+        continue
+      try:
+        func(*args)
+        method = name
+        break
+      except OSError as err:
+        if err.errno not in _FALLBACK_ERRNOS:
+          raise
+        fout.seek(0)
+        fout.truncate()
+    if method == 'copy':
+      shutil.copyfileobj(fin, fout, 1024 * 1024)
+  shutil.copystat(src, dst)
+  return method
+
+
+def link_or_copy(src, dst):
+  """Hard link `src` to `dst`, or copy it.  Only for files nobody
+  modifies in place afterwards."""
+  if os.path.isdir(dst):
+    dst = os.path.join(dst, os.path.basename(src))
+  if os.path.lexists(dst):
+    os.remove(dst)
+  try:
+    os.link(src, dst)
+  except OSError as err:
+    if err.errno not in _FALLBACK_ERRNOS and err.errno != errno.EMLINK:
+      raise
+    copy_file(src, dst)
+  return dst
+
+
+def move_file(src, dst):
+  """Move `src` to `dst`, replacing it, copying across file systems."""
+  try:
+    os.replace(src, dst)
+  except OSError as err:
+    if err.errno != errno.EXDEV:
+      raise
+    copy_file(src, dst)
+    os.remove(src)
+  return dst
+
+
+def copy_tree(src, dst):
+  """Copy the directory `src` to the new directory `dst`."""
+  os.makedirs(dst)
+  with os.scandir(src) as entries:
+    for entry in entries:
+      to_name = os.path.join(dst, entry.name)
+      if entry.is_symlink():
+        os.symlink(os.readlink(entry.path), to_name)
+      elif entry.is_dir():
+        copy_tree(entry.path, to_name)
+      else:
+        copy_file(entry.path, to_name)
+  shutil.copystat(src, dst)
+
+
+def extract_tar(tarball, dest_dir):
+  """Stream the (compressed) tarball into `dest_dir`."""
+  with tarfile.open(tarball, 'r|*') as tar:
+    if hasattr(tarfile, 'data_filter'):
+      tar.extractall(dest_dir, filter='data')
+    else:
+      tar.extractall(dest_dir)
+
+
+def staging_root(staging_dir=None):
+  """The directory to make staging areas in, None for the default."""
+  if staging_dir != 'tmpfs':
+    return staging_dir
+  for dirname in TMPFS_DIRS + [os.environ.get('XDG_RUNTIME_DIR')]:
+    if dirname and os.path.isdir(dirname) and os.access(dirname, os.W_OK):
+      return dirname
+  return None
+
+
+def make_staging_dir(prefix, staging_dir=None):
+  """Returns a new, empty, private directory for one build."""
+  root = staging_root(staging_dir)
+  if root and not os.path.isdir(root):
+    os.makedirs(root)
+  return tempfile.mkdtemp(prefix=prefix, dir=root)
@@ -0,0 +1,123 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Records timed spans for pipeline steps, commands and HTTP requests.
+
+Spans are always recorded (it's cheap), --profile writes them out as a
+Chrome trace-event file (load it in chrome://tracing or Perfetto) and a
+plain text summary.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+__author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+START = time.time()
+SPANS = []
+_lock = threading.Lock()
+
+
+class Span(object):
+  """One timed piece of work."""
+
+  def __init__(self, name, cat, start, duration, args=None, tid=None):
+    self.name = name
+    self.cat = cat
+    self.start = start
+    self.duration = duration
+    self.args = args or {}
+    self.tid = tid or threading.get_ident()
+
+  def to_event(self):
+    """Returns the Chrome trace 'complete' event for this span."""
+    return dict(name=self.name, cat=self.cat, ph='X', pid=os.getpid(),
+                tid=self.tid, ts=int((self.start - START) * 1e6),
+                dur=int(self.duration * 1e6), args=self.args)
+
+
+def add_span(name, cat, start, duration, args=None):
+  """Record a span that already happened, `start` is from time.time()."""
+  span = Span(name, cat, start, duration, args)
+  with _lock:
+    SPANS.append(span)
+  return span
+
+
+@contextlib.contextmanager
+def span(name, cat='step', **args):
+  """Time the body of the with statement."""
+  start = time.time()
+  try:
+    yield args
+  finally:
+    add_span(name, cat, start, time.time() - start, args)
+
+
+def call(func, *args):
+  """Call func(*args) inside a span named after the function."""
+  with span(func.__name__):
+    return func(*args)
+
+
+def reset():
+  """Forget all spans and restart the clock."""
+  global START
+  with _lock:
+    del SPANS[:]
+    START = time.time()
+
+
+def write_chrome_trace(fname):
+  with _lock:
+    events = [cur.to_event() for cur in SPANS]
+  with open(fname, 'w') as fout:
+    json.dump(dict(traceEvents=events, displayTimeUnit='ms'), fout)
+
+
+def summary_lines():
+  """Returns a table of total time per span name, slowest first."""
+  totals = {}
+  with _lock:
+    spans = list(SPANS)
+  for cur in spans:
+    key = (cur.cat, cur.name)
+    count, total, longest = totals.get(key, (0, 0.0, 0.0))
+    totals[key] = (count + 1, total + cur.duration, max(longest, cur.duration))
+  elapsed = max(time.time() - START, 1e-6)
+  lines = ['%-8s %-40s %5s %9s %9s %6s' % (
+      'Kind', 'Name', 'Count', 'Total(s)', 'Max(s)', '%Run')]
+  for (cat, name), (count, total, longest) in sorted(
+      totals.items(), key=lambda item: -item[1][1]):
+    lines.append('%-8s %-40s %5d %9.2f %9.2f %5.1f%%' % (
+        cat, name[:40], count, total, longest, 100.0 * total / elapsed))
+  lines.append('Total run time %.2fs' % elapsed)
+  return lines
+
+
+def write_profile(fname):
+  """Write the trace to `fname` and the summary to `fname`.txt."""
+  write_chrome_trace(fname)
+  lines = summary_lines()
+  with open(fname + '.txt', 'w') as fout:
+    fout.write('\n'.join(lines) + '\n')
+  print('\n'.join(lines))
+  print('Wrote profile to %r and %r' % (fname, fname + '.txt'))
@@ -19,7 +19,6 @@
 
 from __future__ import absolute_import
 from __future__ import print_function
-from six.moves import input
 MAGIC_NAME = '`pybdist`'
 
 __author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
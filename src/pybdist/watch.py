@@ -0,0 +1,262 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""--watch, reruns the parts of --check affected by each saved file.
+
+  RELEASE.rst         check_rst, spelling and the versions
+  setup.py            reloaded, then long_description (if changed),
+                      spelling and the versions
+  __version__ source  the versions
+  debian/changelog    the versions
+  other *.rst         spelling
+  locale/*/*.po       untranslated entries of that .po
+
+The directories are watched with inotify (through ctypes), or polled
+every second where inotify isn't available.  The modules, the docutils
+parser, the parsed version files and the .po files stay loaded between
+runs.  The interactive parts of --check (fixing the versions, mercurial,
+aspell -c) aren't rerun, the spelling only lists the unknown words.  Stop with Ctrl-C.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+__author__ = 'Scott Kirkwood (scott+pybdist@forusers.com)'
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct('iIII')
+# Editors save in several writes and renames, wait for them to settle.
+DEBOUNCE = 0.2
+POLL_INTERVAL = 1.0
+ALL = '*'
+
+
+class WatchException(Exception):
+  pass
+
+
+class InotifyWatcher(object):
+  """Reports files closed after writing or renamed into `dirs`."""
+
+  def __init__(self, dirs):
+    libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                       use_errno=True)
+    if not hasattr(libc, 'inotify_init1'):
+      raise WatchException('No inotify in libc')
+    self._libc = libc
+    self.fd = libc.inotify_init1(IN_CLOEXEC)
+    if self.fd < 0:
+      raise WatchException('inotify_init1: %s' % os.strerror(ctypes.get_errno()))
+    self._dirs = {}
+    for dirname in dirs:
+      wd = libc.inotify_add_watch(self.fd, dirname.encode('utf-8'),
+                                  IN_CLOSE_WRITE | IN_MOVED_TO)
+      if wd < 0:
+        os.close(self.fd)
+        raise WatchException('inotify_add_watch %r: %s' % (
+            dirname, os.strerror(ctypes.get_errno())))
+      self._dirs[wd] = dirname
+
+  def _read(self):
+    changed = set()
+    data = os.read(self.fd, 64 * 1024)
+    pos = 0
+    while pos < len(data):
+      wd, mask, _, length = EVENT_HEADER.unpack_from(data, pos)
+      pos += EVENT_HEADER.size
+      name = data[pos:pos + length].rstrip(b'\0').decode('utf-8', 'replace')
+      pos += length
+      if mask & IN_Q_OVERFLOW:
+        changed.add(ALL)
+      elif wd in self._dirs and name:
+        changed.add(os.path.normpath(os.path.join(self._dirs[wd], name)))
+    return changed
+
+  def wait(self):
+    """Block until something changes, returns the changed paths."""
+    select.select([self.fd], [], [])
+    changed = self._read()
+    while select.select([self.fd], [], [], DEBOUNCE)[0]:
+      changed |= self._read()
+    return changed
+
+  def close(self):
+    os.close(self.fd)
+
+
+class PollingWatcher(object):
+  """Reports changes in the mtime or size of the files in `dirs`."""
+
+  def __init__(self, dirs):
+    self.dirs = dirs
+    self._stats = self._scan()
+
+  def _scan(self):
+    ret = {}
+    for dirname in self.dirs:
+      with os.scandir(dirname) as entries:
+        for entry in entries:
+          if entry.is_file():
+            stat = entry.stat()
+            ret[os.path.normpath(os.path.join(dirname, entry.name))] = (
+                stat.st_mtime_ns, stat.st_size)
+    return ret
+
+  def wait(self):
+    while True:
+      time.sleep(POLL_INTERVAL)
+      stats = self._scan()
+      changed = set(fname for fname, stat in stats.items()
+                    if self._stats.get(fname) != stat)
+      self._stats = stats
+      if changed:
+        return changed
+
+  def close(self):
+    pass
+
+
+def make_watcher(dirs):
+  """An InotifyWatcher for `dirs`, or a PollingWatcher without inotify."""
+  try:
+    return InotifyWatcher(dirs)
+  except (WatchException, OSError, AttributeError) as err:
+    print('Polling for changes, %s' % err)
+    return PollingWatcher(dirs)
+
+
+class Watch(object):
+  """The loaded project and what to rerun when its files change."""
+
+  def __init__(self, setup):
+    self.setup = setup
+    self.long_description = None
+
+  def _locale_dirs(self):
+    from . import pybdist
+    ret = []
+    for lang in getattr(self.setup, 'LANGS', []):
+      dirname = os.path.join(pybdist._get_locale_dir(self.setup), lang,
+                             'LC_MESSAGES')
+      if os.path.isdir(dirname):
+        ret.append(os.path.normpath(dirname))
+    return ret
+
+  def dirs(self):
+    """The directories holding the files the checks read."""
+    ret = ['.', 'debian', self.setup.DIR,
+           os.path.dirname(self.setup.RELEASE_FILE) or '.']
+    ret += self._locale_dirs()
+    return sorted(set(os.path.normpath(dirname) for dirname in ret
+                      if os.path.isdir(dirname)))
+
+  def _reload_setup(self):
+    from . import pybdist
+    from . import server
+    try:
+      setup = pybdist.fixup_setup(server._load_setup(os.getcwd()))
+    except Exception as err:
+      print('** Unable to reload setup.py: %s' % err)
+      return False
+    self.setup = setup
+    return True
+
+  def checks(self, changed, reload_setup=True):
+    """Returns the [(name, function, args)] to run for the `changed` paths."""
+    from . import i18n
+    from . import pybdist
+    from . import rst_check
+    from . import spell_check
+    setup = self.setup
+    if ALL in changed:
+      changed = set([setup.RELEASE_FILE, 'setup.py'])
+    dictionary = '.aspell.en.pws'
+    ret = []
+    if 'setup.py' in changed and (not reload_setup or self._reload_setup()):
+      setup = self.setup
+      long_description = setup.SETUP.get('long_description', '')
+      if long_description != self.long_description:
+        self.long_description = long_description
+        ret.append(('long_description', rst_check.check_text,
+                    (long_description,)))
+      ret.append(('spelling setup.py', spell_check.check_code_file,
+                  ('setup.py', dictionary, False)))
+    release_file = os.path.normpath(setup.RELEASE_FILE)
+    version_files = set(os.path.normpath(fname)
+                        for fname in pybdist._version_files(setup))
+    if release_file in changed:
+      ret.append(('check_rst', rst_check.check_file, (setup.RELEASE_FILE,)))
+    for fname in sorted(changed):
+      if fname.endswith('.rst') and os.path.exists(fname):
+        ret.append(('spelling %s' % fname, spell_check.check_file,
+                    (fname, dictionary, False)))
+    if changed & version_files:
+      ret.append(('verify_versions', pybdist.get_and_verify_versions, (setup,)))
+    for fname in sorted(changed):
+      if fname.endswith('.po') and os.path.exists(fname):
+        ret.append(('untranslated %s' % fname, i18n.count_untranslated_file,
+                    (fname,)))
+    return ret
+
+  def run(self, changed, reload_setup=True):
+    """Run the checks for `changed`, returns how many failed."""
+    checks = self.checks(changed, reload_setup)
+    if not checks:
+      return 0
+    print('--- %s: %s' % (time.strftime('%H:%M:%S'), ', '.join(
+        sorted(fname for fname in changed if os.path.exists(fname)))))
+    failed = 0
+    for name, func, args in checks:
+      start = time.time()
+      try:
+        func(*args)
+      except Exception as err:
+        failed += 1
+        print('** %s: %s' % (name, err))
+      else:
+        print('   %s ok (%.2fs)' % (name, time.time() - start))
+    return failed
+
+  def first_run(self):
+    changed = set(['setup.py', os.path.normpath(self.setup.RELEASE_FILE)])
+    for dirname in self._locale_dirs():
+      changed |= set(os.path.join(dirname, fname)
+                     for fname in os.listdir(dirname) if fname.endswith('.po'))
+    return self.run(changed, reload_setup=False)
+
+
+def watch(setup):
+  """Rerun the affected checks whenever a file is saved, until Ctrl-C."""
+  cur_watch = Watch(setup)
+  cur_watch.first_run()
+  watcher = make_watcher(cur_watch.dirs())
+  print('Watching %s, Ctrl-C to stop' % ', '.join(cur_watch.dirs()))
+  try:
+    while True:
+      cur_watch.run(watcher.wait())
+  except KeyboardInterrupt:
+    print()
+  finally:
+    watcher.close()